@@ -0,0 +1,152 @@
+import frappe
+
+# proctor/evaluator round robin
+# > EXAMINER_LOAD:<schedule>:<role> sorted set of examiner -> assigned count
+# > picking an examiner is a ZRANGE 0 0 + ZINCRBY inside one lua script, so
+#   concurrent registrations never read the same minimum
+# > seeded from the Examiner rows on first use, counts are written back to
+#   the Examiner rows by a background job
+EXAMINER_LOAD_CACHE = "examiner_load"
+EXAMINER_LOAD_TTL = 7 * 24 * 60 * 60
+ROLE_COUNT_FIELDS = {
+	"proctor": ("can_proctor", "proctoring_count"),
+	"evaluator": ("can_evaluate", "evaluation_count")
+}
+
+# KEYS[1] load set, ARGV[1] count, ARGV[2] ttl, ARGV[3..] examiner, count pairs to seed
+# returns nil if the set is missing and no seed is given
+ALLOCATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+	if #ARGV == 2 then
+		return false
+	end
+	for i = 3, #ARGV, 2 do
+		redis.call('ZADD', KEYS[1], ARGV[i + 1], ARGV[i])
+	end
+end
+local picked = {}
+for i = 1, tonumber(ARGV[1]) do
+	local examiner = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+	if not examiner then
+		break
+	end
+	redis.call('ZINCRBY', KEYS[1], 1, examiner)
+	table.insert(picked, examiner)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return picked
+"""
+
+
+def _load_key(exam_schedule, role):
+	return frappe.cache().make_key("{}:{}:{}".format(EXAMINER_LOAD_CACHE, exam_schedule, role))
+
+
+def _get_script():
+	if not getattr(frappe.local, "examiner_allocate_script", None):
+		frappe.local.examiner_allocate_script = frappe.cache().register_script(ALLOCATE_SCRIPT)
+
+	return frappe.local.examiner_allocate_script
+
+
+def get_examiner_counts(exam_schedule, role):
+	"""
+	Examiners of a schedule for a role with the counts saved in the Examiner rows
+	"""
+	can_field, count_field = ROLE_COUNT_FIELDS[role]
+	rows = frappe.get_all(
+		"Examiner",
+		filters={"parent": exam_schedule, "parenttype": "Exam Schedule", can_field: 1},
+		fields=["examiner", count_field]
+	)
+	return {row["examiner"]: row[count_field] or 0 for row in rows}
+
+
+def _allocate(exam_schedule, role, count):
+	key = _load_key(exam_schedule, role)
+	script = _get_script()
+	picked = script(keys=[key], args=[count, EXAMINER_LOAD_TTL])
+	if picked is None:
+		seed = []
+		for examiner, assigned in get_examiner_counts(exam_schedule, role).items():
+			seed.extend([examiner, assigned])
+		if not seed:
+			return [None] * count
+		picked = script(keys=[key], args=[count, EXAMINER_LOAD_TTL] + seed)
+
+	picked = [frappe.safe_decode(examiner) for examiner in picked]
+	return picked + [None] * (count - len(picked))
+
+
+def allocate_examiners(exam_schedule, count=1, proctor=True, evaluator=True):
+	"""
+	Pick the least loaded proctor and evaluator for `count` submissions.
+	returns list of (proctor, evaluator), None where the schedule has no examiner for the role
+	"""
+	proctors = _allocate(exam_schedule, "proctor", count) if proctor else [None] * count
+	evaluators = _allocate(exam_schedule, "evaluator", count) if evaluator else [None] * count
+	if any(proctors) or any(evaluators):
+		enqueue_reconcile(exam_schedule)
+
+	return list(zip(proctors, evaluators))
+
+
+def refresh_examiner_pool(exam_schedule):
+	"""
+	Examiner list of a schedule changed, drop removed examiners from the load sets
+	and add new ones with their saved counts. Existing counts are kept.
+	"""
+	for role in ROLE_COUNT_FIELDS:
+		key = _load_key(exam_schedule, role)
+		if not frappe.cache().zcard(key):
+			continue
+
+		examiners = get_examiner_counts(exam_schedule, role)
+		current = {frappe.safe_decode(ex) for ex in frappe.cache().zrange(key, 0, -1)}
+		removed = current - set(examiners)
+		if removed:
+			frappe.cache().zrem(key, *removed)
+		if examiners:
+			frappe.cache().zadd(key, examiners, nx=True)
+		else:
+			frappe.cache().delete(key)
+
+
+def clear_examiner_pool(exam_schedule):
+	for role in ROLE_COUNT_FIELDS:
+		frappe.cache().delete(_load_key(exam_schedule, role))
+
+
+def reconcile_examiner_counts(exam_schedule):
+	"""
+	Background job, write the allocated counts back to the Examiner rows.
+	"""
+	counts = {}
+	for role, (_, count_field) in ROLE_COUNT_FIELDS.items():
+		for examiner, assigned in frappe.cache().zrange(
+			_load_key(exam_schedule, role), 0, -1, withscores=True
+		):
+			counts.setdefault(frappe.safe_decode(examiner), {})[count_field] = int(assigned)
+
+	if not counts:
+		return
+
+	rows = frappe.get_all(
+		"Examiner",
+		filters={"parent": exam_schedule, "parenttype": "Exam Schedule"},
+		fields=["name", "examiner"]
+	)
+	for row in rows:
+		if counts.get(row["examiner"]):
+			frappe.db.set_value("Examiner", row["name"], counts[row["examiner"]], update_modified=False)
+
+
+def enqueue_reconcile(exam_schedule):
+	frappe.enqueue(
+		"exampro.exam_pro.api.allocator.reconcile_examiner_counts",
+		queue="short",
+		job_id="reconcile_examiner_counts::{}".format(exam_schedule),
+		deduplicate=True,
+		enqueue_after_commit=True,
+		exam_schedule=exam_schedule
+	)
@@ -0,0 +1,244 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils.background_jobs import get_redis_conn
+from redis.exceptions import LockError, ResponseError
+
+from exampro.exam_pro.api.examops import grade_answers
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
+
+# write-behind answer buffer
+# > EXAM_ANSWER_BUFFER:<submission> hash of exam_question -> latest response
+# > EXAM_ANSWER_BUFFER:<submission>:inflight the hash being flushed. It is
+#   deleted only after the db commit, a leftover one is replayed on next flush
+# > EXAM_ANSWER_BUFFER_PENDING set of submissions with buffered responses,
+#   a submission is removed only after its flush is committed
+# > the buffer lives on the queue redis, not frappe.cache(): the cache redis
+#   is not persisted and evicts keys, a buffered answer must survive until
+#   it is flushed. Keys are prefixed with the site like cache keys, values are json
+# > EXAM_ANSWER_BUFFER:<submission>:lock serialises flushes of a submission
+#   (end_exam, scheduled flush) and direct writes that bypass the buffer
+EXAM_ANSWER_BUFFER = "exam_answer_buffer"
+EXAM_ANSWER_BUFFER_PENDING = "exam_answer_buffer_pending"
+FLUSH_LOCK_TIMEOUT = 5 * 60
+FLUSH_LOCK_WAIT = 60
+
+
+def _redis():
+	return get_redis_conn()
+
+
+def _key(key):
+	return frappe.cache().make_key(key)
+
+
+def _buffer_key(exam_submission):
+	return _key("{}:{}".format(EXAM_ANSWER_BUFFER, exam_submission))
+
+
+def _inflight_key(exam_submission):
+	return _key("{}:{}:inflight".format(EXAM_ANSWER_BUFFER, exam_submission))
+
+
+def _flush_lock(exam_submission):
+	return _redis().lock(
+		_key("{}:{}:lock".format(EXAM_ANSWER_BUFFER, exam_submission)),
+		timeout=FLUSH_LOCK_TIMEOUT,
+		blocking_timeout=FLUSH_LOCK_WAIT
+	)
+
+
+def _decode(buffered):
+	return {
+		frappe.safe_decode(qs): json.loads(resp) for qs, resp in (buffered or {}).items()
+	}
+
+
+def is_answer_buffer_enabled():
+	return get_exam_settings().buffer_answer_writes
+
+
+def buffer_answer(exam_submission, exam_question, answer, marked_for_later):
+	"""
+	Record a candidate response in the buffer. It is written to db on next flush.
+	returns False if the buffer could not be written, the caller writes to db instead
+	"""
+	try:
+		pipe = _redis().pipeline()
+		pipe.hset(_buffer_key(exam_submission), exam_question, json.dumps({
+			"answer": answer,
+			"marked_for_later": marked_for_later
+		}))
+		pipe.sadd(_key(EXAM_ANSWER_BUFFER_PENDING), exam_submission)
+		pipe.execute()
+	except Exception:
+		frappe.log_error(
+			"Error buffering answer of {}".format(exam_submission), "buffer_answer error"
+		)
+		return False
+
+	return True
+
+
+def get_buffered_answers(exam_submission):
+	"""
+	Responses not yet written to db, newest wins.
+	"""
+	conn = _redis()
+	buffered = _decode(conn.hgetall(_inflight_key(exam_submission)))
+	buffered.update(_decode(conn.hgetall(_buffer_key(exam_submission))))
+
+	return buffered
+
+
+def get_answer_updates(exam_submission, buffered, rows=None):
+	"""
+	Evaluate buffered responses.
+	returns {Exam Answer name: {field: value}}
+	"""
+	if rows is None:
+		rows = frappe.get_all(
+			"Exam Answer",
+			filters={"parent": exam_submission, "exam_question": ["in", list(buffered)]},
+			fields=["name", "exam_question"],
+			ignore_permissions=True
+		)
+
+	exam = frappe.get_cached_value("Exam Submission", exam_submission, "exam")
+	graded = grade_answers(exam, {
+		qs: resp["answer"] for qs, resp in buffered.items()
+	})
+
+	updates = {}
+	for row in rows:
+		exam_question = row.get("exam_question")
+		resp = buffered.get(exam_question)
+		if not resp:
+			continue
+		update = {
+			"answer": resp["answer"],
+			"marked_for_later": resp["marked_for_later"],
+			"evaluation_status": "Pending"
+		}
+		update.update(graded.get(exam_question, {}))
+		updates[row.get("name")] = update
+
+	return updates
+
+
+def apply_buffered_answers(submission_doc):
+	"""
+	Copy buffered responses to the loaded child rows, so that saving
+	the submission doesn't overwrite them with stale values.
+	"""
+	buffered = get_buffered_answers(submission_doc.name)
+	if not buffered:
+		return
+
+	updates = get_answer_updates(
+		submission_doc.name, buffered, rows=submission_doc.submitted_answers
+	)
+	for row in submission_doc.submitted_answers:
+		if row.name in updates:
+			row.update(updates[row.name])
+
+
+def _claim_buffer(exam_submission):
+	"""
+	Move the buffer to the inflight key, unless an earlier flush left one.
+	"""
+	conn = _redis()
+	inflight = conn.hgetall(_inflight_key(exam_submission))
+	if inflight:
+		return _decode(inflight)
+
+	try:
+		conn.renamenx(_buffer_key(exam_submission), _inflight_key(exam_submission))
+	except ResponseError:
+		# nothing buffered
+		return {}
+
+	return _decode(conn.hgetall(_inflight_key(exam_submission)))
+
+
+def flush_answer_buffer(exam_submission, blocking=True):
+	"""
+	Write buffered responses of a submission to db with bulk updates.
+	:param blocking: wait for a flush running elsewhere, else skip
+	returns False if skipped
+	"""
+	lock = _flush_lock(exam_submission)
+	if not lock.acquire(blocking=blocking):
+		if blocking:
+			frappe.throw(_("Answers of {} are still being saved, please try again.").format(exam_submission))
+		return False
+
+	try:
+		# an inflight leftover is replayed first, then the current buffer
+		for _attempt in range(2):
+			buffered = _claim_buffer(exam_submission)
+			if not buffered:
+				break
+
+			updates = get_answer_updates(exam_submission, buffered)
+			if updates:
+				frappe.db.bulk_update("Exam Answer", updates, chunk_size=500)
+			frappe.db.commit()
+
+			_redis().delete(_inflight_key(exam_submission))
+	finally:
+		try:
+			lock.release()
+		except LockError:
+			# expired after FLUSH_LOCK_TIMEOUT
+			pass
+
+	return True
+
+
+def discard_buffered_answer(exam_submission, exam_question):
+	"""
+	Drop the buffered responses of a question, before it is written to db
+	directly, so that a later flush doesn't overwrite it with an older one.
+	"""
+	lock = _flush_lock(exam_submission)
+	try:
+		if not lock.acquire():
+			raise LockError("flush lock not acquired")
+		try:
+			conn = _redis()
+			conn.hdel(_buffer_key(exam_submission), exam_question)
+			conn.hdel(_inflight_key(exam_submission), exam_question)
+		finally:
+			lock.release()
+	except Exception:
+		frappe.log_error(
+			"Error discarding buffered answer of {}".format(exam_submission), "discard_buffered_answer error"
+		)
+
+
+def flush_pending_answer_buffers():
+	"""
+	Scheduled job to flush all buffered responses
+	"""
+	conn = _redis()
+	pending_key = _key(EXAM_ANSWER_BUFFER_PENDING)
+	for exam_submission in conn.smembers(pending_key) or []:
+		exam_submission = frappe.safe_decode(exam_submission)
+		try:
+			if not flush_answer_buffer(exam_submission, blocking=False):
+				# being flushed elsewhere, stays pending
+				continue
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(
+				"Error flushing answers of {}".format(exam_submission), "flush_answer_buffer error"
+			)
+			continue
+
+		# removed only after the commit, responses buffered during the flush
+		# add it back, or are still there to be seen here
+		conn.srem(pending_key, exam_submission)
+		if conn.exists(_buffer_key(exam_submission), _inflight_key(exam_submission)):
+			conn.sadd(pending_key, exam_submission)
@@ -0,0 +1,66 @@
+import frappe
+from frappe.utils import now_datetime
+
+from exampro.exam_pro.api.regrade import regrade_submissions
+from exampro.exam_pro.api.schedulewindow import SUBMISSION_DEADLINE_SQL
+
+# auto submission of expired exams
+# > a scheduled sweep closes Registered/Started submissions whose window
+#   (schedule end + additional time) is over: Started -> Submitted,
+#   Registered -> Not Attempted, and grades them in batches
+# > started flexible exams are closed once their own time is up, candidate
+#   start + duration + additional time, see calculate_end_time
+# > page loads only read, they never close submissions themselves
+SWEEP_BATCH_SIZE = 500
+SWEEP_MAX_BATCHES = 20
+
+
+def get_expired_submissions(limit=SWEEP_BATCH_SIZE, exam_schedule=None, candidate=None):
+	"""
+	Open submissions whose exam time is over, oldest schedule first.
+	"""
+	conditions = []
+	if exam_schedule:
+		conditions.append("AND sub.exam_schedule = %(exam_schedule)s")
+	if candidate:
+		conditions.append("AND sub.candidate = %(candidate)s")
+
+	return frappe.db.sql("""
+		SELECT sub.name, sub.exam, sub.exam_schedule, sub.status, sub.candidate
+		FROM `tabExam Submission` sub
+		INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+		WHERE sub.status IN ('Registered', 'Started')
+		AND sch.start_date_time <= %(now)s
+		AND {end} < %(now)s
+		{conditions}
+		ORDER BY sch.start_date_time
+		LIMIT %(limit)s
+	""".format(end=SUBMISSION_DEADLINE_SQL, conditions=" ".join(conditions)), {
+		"now": now_datetime(),
+		"exam_schedule": exam_schedule,
+		"candidate": candidate,
+		"limit": limit
+	}, as_dict=True)
+
+
+def submit_expired_submissions(exam_schedule=None, candidate=None):
+	"""
+	Close and grade expired submissions in batches.
+	Runs from the scheduler, can be scoped to a schedule or a candidate.
+	returns number of submissions closed
+	"""
+	closed = 0
+	for _ in range(SWEEP_MAX_BATCHES):
+		submissions = get_expired_submissions(exam_schedule=exam_schedule, candidate=candidate)
+		if not submissions:
+			break
+
+		stats = regrade_submissions(submissions)
+		closed += stats["updated"]
+		if len(submissions) < SWEEP_BATCH_SIZE:
+			break
+
+	if closed:
+		frappe.logger("exampro").info("submit_expired_submissions: {} closed".format(closed))
+
+	return closed
@@ -0,0 +1,208 @@
+import csv
+import re
+from io import StringIO
+
+import frappe
+from frappe import _
+from frappe.utils import now, now_datetime
+
+from exampro.exam_pro.api.provisioning import QUERY_CHUNK_SIZE, chunks, grant_candidate_role, \
+	provision_submissions
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
+
+# bulk import of candidates into an exam batch
+# > emails (or a csv of email[, full name]) are processed in chunks of
+#   IMPORT_CHUNK_SIZE: existing users and memberships are fetched with IN
+#   queries, missing users and memberships are written with multi row inserts
+# > new users are inserted as documents, so the User controller and the
+#   hooks of other apps run, without the welcome email. Emails of domains not
+#   allowed in Exam Settings are skipped before the insert
+# > like provisioning, the per document hooks of Exam Batch User are skipped.
+#   Candidate role and submissions of upcoming auto assign schedules of the
+#   batch are created here, the schedules are resolved once per import
+IMPORT_CHUNK_SIZE = 1000
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+BATCH_USER_FIELDS = [
+	"name", "creation", "modified", "owner", "modified_by", "docstatus",
+	"exam_batch", "candidate"
+]
+
+
+def parse_candidates(emails=None, file_url=None):
+	"""
+	Candidates to import, from comma/newline separated emails or a csv file
+	with the email in the first column and an optional full name in the second.
+	returns list of (email, full_name), full_name may be None
+	"""
+	rows = []
+	if file_url:
+		content = frappe.get_doc("File", {"file_url": file_url}).get_content()
+		if isinstance(content, bytes):
+			content = content.decode("utf-8-sig")
+		for row in csv.reader(StringIO(content)):
+			if row and row[0].strip():
+				rows.append((row[0], row[1] if len(row) > 1 else None))
+		# header row
+		if rows and "@" not in rows[0][0]:
+			rows = rows[1:]
+
+	if emails:
+		rows.extend((email, None) for email in re.split(r'[,;\s]+', emails))
+
+	return [
+		(email.strip().lower(), (full_name or "").strip() or None)
+		for email, full_name in rows if email and email.strip()
+	]
+
+
+def get_auto_assign_schedules(exam_batch):
+	"""
+	Upcoming schedules that auto assign users of the batch, in one query
+	"""
+	return frappe.db.sql("""
+		SELECT DISTINCT sch.name
+		FROM `tabExam Schedule` sch
+		INNER JOIN `tabSchedule Batch Assignment` sba
+			ON sba.parent = sch.name AND sba.parenttype = 'Exam Schedule'
+		WHERE sba.batch_name = %(exam_batch)s
+		AND sch.auto_assign_batch_users = 1
+		AND sch.start_date_time > %(now)s
+	""", {"exam_batch": exam_batch, "now": now_datetime()}, pluck=True)
+
+
+def create_users(candidates):
+	"""
+	Create website users for the emails that are not users yet.
+	Emails of domains not allowed in Exam Settings, or failing User
+	validation, are not created.
+	:param candidates: list of (email, full_name)
+	returns (number of users created, set of rejected emails)
+	"""
+	existing = set()
+	for chunk in chunks([email for email, _ in candidates], QUERY_CHUNK_SIZE):
+		existing.update(frappe.get_all("User", filters={"name": ["in", chunk]}, pluck="name"))
+
+	allowed_domains = get_exam_settings().allowed_domains
+	created, rejected = 0, set()
+	for email, full_name in candidates:
+		if email in existing:
+			continue
+		if allowed_domains and email.split("@")[-1] not in allowed_domains:
+			frappe.log_error(f"Email domain not allowed: {email}", "Bulk Add Users")
+			rejected.add(email)
+			continue
+		existing.add(email)
+		full_name = full_name or email.split("@")[0]
+		name_parts = full_name.split()
+		user = frappe.get_doc({
+			"doctype": "User",
+			"email": email,
+			"first_name": name_parts[0],
+			"last_name": " ".join(name_parts[1:]),
+			"enabled": 1,
+			"user_type": "Website User",
+			"send_welcome_email": 0
+		})
+		user.flags.no_welcome_email = True
+		frappe.db.savepoint("bulk_add_user")
+		try:
+			user.insert(ignore_permissions=True)
+		except Exception:
+			frappe.db.rollback(save_point="bulk_add_user")
+			frappe.log_error(f"Failed to create user {email}", "Bulk Add Users")
+			rejected.add(email)
+			continue
+		created += 1
+
+	return created, rejected
+
+
+def add_batch_users(exam_batch, candidates):
+	"""
+	Add the users to the batch, skipping existing members.
+	returns the candidates added
+	"""
+	existing = set()
+	for chunk in chunks(candidates, QUERY_CHUNK_SIZE):
+		existing.update(frappe.get_all(
+			"Exam Batch User",
+			filters={"exam_batch": exam_batch, "candidate": ["in", chunk]},
+			pluck="candidate"
+		))
+
+	added = [candidate for candidate in candidates if candidate not in existing]
+	if added:
+		tnow = now()
+		user = frappe.session.user
+		frappe.db.bulk_insert("Exam Batch User", BATCH_USER_FIELDS, [
+			(frappe.generate_hash(length=10), tnow, tnow, user, user, 0, exam_batch, candidate)
+			for candidate in added
+		], chunk_size=QUERY_CHUNK_SIZE)
+
+	return added
+
+
+def import_batch_users(exam_batch, emails=None, file_url=None):
+	"""
+	Background job, add candidates to a batch creating users and the
+	submissions of the batch's upcoming auto assign schedules.
+	returns {"added", "skipped", "users_created", "submissions"}
+	"""
+	candidates, seen = [], set()
+	skipped = 0
+	for email, full_name in parse_candidates(emails, file_url):
+		if email in seen:
+			skipped += 1
+			continue
+		seen.add(email)
+		if not EMAIL_PATTERN.match(email):
+			frappe.log_error(f"Invalid email format: {email}", "Bulk Add Users")
+			skipped += 1
+			continue
+		candidates.append((email, full_name))
+
+	schedules = get_auto_assign_schedules(exam_batch)
+	res = {"added": 0, "skipped": skipped, "users_created": 0, "submissions": 0}
+	done = 0
+	for chunk in chunks(candidates, IMPORT_CHUNK_SIZE):
+		created, rejected = create_users(chunk)
+		res["users_created"] += created
+		added = add_batch_users(exam_batch, [email for email, _ in chunk if email not in rejected])
+		grant_candidate_role(added)
+		frappe.db.commit()
+
+		for exam_schedule in schedules:
+			res["submissions"] += provision_submissions(
+				exam_schedule, [(candidate, exam_batch) for candidate in added], publish_progress=False
+			)
+
+		res["added"] += len(added)
+		res["skipped"] += len(chunk) - len(added)
+		done += len(chunk)
+		frappe.publish_progress(
+			done * 100 / len(candidates),
+			title=_("Adding Users"),
+			doctype="Exam Batch",
+			docname=exam_batch,
+			description="{} of {}".format(done, len(candidates))
+		)
+
+	frappe.publish_realtime(
+		"exam_batch_import", message=dict(res, exam_batch=exam_batch), user=frappe.session.user
+	)
+	frappe.logger("exampro").info("import_batch_users: {} {}".format(exam_batch, res))
+
+	return res
+
+
+def enqueue_batch_import(exam_batch, emails=None, file_url=None):
+	frappe.enqueue(
+		"exampro.exam_pro.api.batchimport.import_batch_users",
+		queue="long",
+		timeout=3600,
+		enqueue_after_commit=True,
+		exam_batch=exam_batch,
+		emails=emails,
+		file_url=file_url
+	)
@@ -0,0 +1,167 @@
+import frappe
+from frappe.utils import now_datetime
+
+from datetime import timedelta
+
+from exampro.exam_pro.api.schedulewindow import SCHEDULE_STATUS_CONDITIONS, SUBMISSION_END_SQL, \
+	window_from_row
+
+# exam listing of a candidate (/my-exams)
+# > CANDIDATE_EXAMS:<candidate> hash of page:<page>:<page_size> -> {rows, total}
+#   rows are the joined submission/schedule/exam/certificate columns, the
+#   schedule status is time dependent and worked out from them on every read
+# > LIVE_EXAM:<candidate> the submission the candidate should attend on /exam,
+#   expires at the end of its window, or after a few minutes if there is none
+# > both are cleared when a submission, certificate or schedule of the candidate changes
+CANDIDATE_EXAMS_CACHE = "candidate_exams"
+CANDIDATE_EXAMS_TTL = 24 * 60 * 60
+LIVE_EXAM_CACHE = "live_exam"
+LIVE_EXAM_EMPTY_TTL = 5 * 60
+LISTED_EXAM_FIELDS = [
+	"title", "instructions", "enable_calculator", "enable_video_proctoring", "enable_chat",
+	"leaderboard", "enable_certification"
+]
+
+EXAM_LIST_QUERY = """
+	SELECT sub.name, sub.exam_schedule, sub.status, sub.exam_started_time,
+		sub.additional_time_given, sub.result_status,
+		sch.exam, sch.start_date_time, sch.schedule_type, sch.duration, sch.schedule_expire_in_days,
+		ex.title as exam_title, ex.enable_calculator, ex.enable_video_proctoring, ex.enable_chat,
+		ex.leaderboard, ex.enable_certification,
+		(SELECT cert.name FROM `tabExam Certificate` cert
+			WHERE cert.exam_submission = sub.name
+			ORDER BY cert.creation DESC LIMIT 1) as certificate_name {extra_fields}
+	FROM `tabExam Submission` sub
+	INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+	INNER JOIN `tabExam` ex ON ex.name = sch.exam
+	WHERE sub.candidate = %(candidate)s {conditions}
+	ORDER BY {order_by}
+	LIMIT %(start)s, %(page_length)s
+"""
+
+
+def _cache_name(candidate):
+	return "{}:{}".format(CANDIDATE_EXAMS_CACHE, candidate)
+
+
+def get_candidate_exam_page(candidate, page=1, page_size=10):
+	"""
+	One page of a candidate's submissions, latest schedule first.
+	returns {"rows": [...], "total": count}
+	"""
+	name = _cache_name(candidate)
+	key = "page:{}:{}".format(page, page_size)
+	data = frappe.cache().hget(name, key)
+	if data is None:
+		rows = frappe.db.sql(
+			EXAM_LIST_QUERY.format(extra_fields="", conditions="", order_by="sch.start_date_time DESC"),
+			{"candidate": candidate, "start": (page - 1) * page_size, "page_length": page_size},
+			as_dict=True
+		)
+		data = {
+			"rows": rows,
+			"total": frappe.db.count("Exam Submission", {"candidate": candidate})
+		}
+		frappe.cache().hset(name, key, data)
+		frappe.cache().expire(frappe.cache().make_key(name), CANDIDATE_EXAMS_TTL)
+
+	return data
+
+
+def get_candidate_next_exam(candidate):
+	"""
+	The exam a candidate should attend next, in order of preference
+	- a started exam
+	- a registered exam whose window is open, earliest first
+	- the earliest upcoming exam
+	Not cached, the answer moves with time. One indexed query returning one row.
+	"""
+	rows = frappe.db.sql(
+		EXAM_LIST_QUERY.format(
+			extra_fields="",
+			conditions="""AND (
+				sub.status = 'Started'
+				OR (sub.status = 'Registered' AND sch.start_date_time <= %(now)s
+					AND {end} >= %(now)s)
+				OR sch.start_date_time > %(now)s
+			)""".format(end=SUBMISSION_END_SQL),
+			order_by="""CASE WHEN sub.status = 'Started' THEN 0
+				WHEN sch.start_date_time <= %(now)s THEN 1 ELSE 2 END,
+				sch.start_date_time ASC"""
+		),
+		{"candidate": candidate, "now": now_datetime(), "start": 0, "page_length": 1},
+		as_dict=True
+	)
+	return rows[0] if rows else None
+
+
+def has_ongoing_fixed_exam(candidate):
+	"""
+	True if the candidate has a registered or started submission of a fixed
+	schedule that is ongoing, those can only be attended from /exam.
+	"""
+	return bool(frappe.db.sql("""
+		SELECT sub.name
+		FROM `tabExam Submission` sub
+		INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+		WHERE sub.candidate = %(candidate)s
+		AND sub.status IN ('Registered', 'Started')
+		AND sch.schedule_type = 'Fixed'
+		AND {ongoing}
+		LIMIT 1
+	""".format(ongoing=SCHEDULE_STATUS_CONDITIONS["Ongoing"]),
+		{"candidate": candidate, "now": now_datetime()}
+	))
+
+
+def get_candidate_live_exam(candidate):
+	"""
+	The open submission a candidate can attend on /exam, None if there is none
+	- a started exam
+	- else the registered exam with the earliest start whose window is not over
+	Cached per candidate until the end of the submission's window.
+	"""
+	key = "{}:{}".format(LIVE_EXAM_CACHE, candidate)
+	data = frappe.cache().get_value(key)
+	if data is not None:
+		return data["row"]
+
+	current_time = now_datetime()
+	rows = frappe.db.sql(
+		EXAM_LIST_QUERY.format(
+			extra_fields=", ex.instructions",
+			conditions="""AND sub.status IN ('Registered', 'Started')
+				AND (sub.status = 'Started' OR {end} >= %(now)s)""".format(end=SUBMISSION_END_SQL),
+			order_by="sub.status = 'Started' DESC, sch.start_date_time ASC"
+		),
+		{"candidate": candidate, "now": current_time, "start": 0, "page_length": 1},
+		as_dict=True
+	)
+	row = rows[0] if rows else None
+
+	expires_in_sec = LIVE_EXAM_EMPTY_TTL
+	if row:
+		end_time = window_from_row(row)["end"] + timedelta(minutes=row["additional_time_given"] or 0)
+		expires_in_sec = max(int((end_time - current_time).total_seconds()), 1)
+	frappe.cache().set_value(
+		key, {"row": row}, expires_in_sec=min(expires_in_sec, CANDIDATE_EXAMS_TTL)
+	)
+
+	return row
+
+
+def clear_candidate_exams(candidates):
+	for candidate in {candidate for candidate in candidates if candidate}:
+		frappe.cache().delete_value([
+			_cache_name(candidate), "{}:{}".format(LIVE_EXAM_CACHE, candidate)
+		])
+
+
+def clear_submission_candidate_exams(filters):
+	"""
+	Schedule window or exam details changed, drop the listings of candidates
+	with submissions matching `filters`.
+	"""
+	clear_candidate_exams(frappe.get_all(
+		"Exam Submission", filters=filters, pluck="candidate", distinct=True
+	))
@@ -21,4 +21,108 @@ def evaluation_values(exam, submitted_answers):
 	if eval_pending > 0:
 		evaluation_status = "Pending"
 	
-	return total_marks, evaluation_status, result_status
\ No newline at end of file
+	return total_marks, evaluation_status, result_status
+
+# compiled answer key of an exam
+# > EXAM_ANSWER_KEY hash of exam -> {question: (type, mark, correct option bitmask)}
+EXAM_ANSWER_KEY_CACHE = "exam_answer_key"
+ANSWER_KEY_FIELDS = [
+	"name", "type", "mark", "is_correct_1", "is_correct_2", "is_correct_3", "is_correct_4"
+]
+
+
+def options_bitmask(options):
+	"""
+	Bitmask of option numbers, bit 0 for option 1 and so on.
+	Returns None for an invalid option.
+	"""
+	mask = 0
+	for opt in options:
+		opt = str(opt).strip()
+		if not opt.isdigit() or not 1 <= int(opt) <= 4:
+			return None
+		mask |= 1 << (int(opt) - 1)
+
+	return mask
+
+
+def answer_key_entry(question):
+	"""
+	(type, mark, correct option bitmask) of an Exam Question row
+	"""
+	correct = [idx for idx in range(1, 5) if question.get("is_correct_{}".format(idx))]
+	return (question.get("type"), question.get("mark") or 0, options_bitmask(correct))
+
+
+def compile_answer_key(questions):
+	if not questions:
+		return {}
+
+	rows = frappe.get_all(
+		"Exam Question",
+		filters={"name": ["in", list(questions)]},
+		fields=ANSWER_KEY_FIELDS
+	)
+	return {row["name"]: answer_key_entry(row) for row in rows}
+
+
+def set_answer_key(exam, answer_key):
+	frappe.cache().hset(EXAM_ANSWER_KEY_CACHE, exam, answer_key)
+
+
+def clear_answer_keys():
+	frappe.cache().delete_value(EXAM_ANSWER_KEY_CACHE)
+
+
+def get_answer_key(exam):
+	"""
+	Get the compiled answer key of an exam, compile it on cache miss.
+	"""
+	def generator():
+		questions = frappe.get_all(
+			"Exam Added Question", filters={"parent": exam}, pluck="exam_question"
+		)
+		return compile_answer_key(questions)
+
+	return frappe.cache().hget(EXAM_ANSWER_KEY_CACHE, exam, generator=generator)
+
+
+def grade_answer(key_entry, answer):
+	"""
+	Auto evaluate an answer if applicable.
+	returns dict of Exam Answer fields to update, empty if manual evaluation needed.
+	"""
+	question_type, mark, correct_mask = key_entry
+	if question_type != "Choices":
+		return {}
+
+	if not answer:
+		return {"evaluation_status": "Auto", "mark": 0}
+
+	answered = answer.split(",")
+	answered_mask = options_bitmask(answered)
+	if len(set(answered)) == len(answered) and answered_mask == correct_mask:
+		return {"is_correct": 1, "evaluation_status": "Auto", "mark": mark}
+
+	return {"is_correct": 0, "evaluation_status": "Auto", "mark": 0}
+
+
+def grade_answers(exam, responses):
+	"""
+	Grade many responses of an exam in one pass.
+	:param responses: {exam_question: answer}
+	returns {exam_question: dict of Exam Answer fields to update}
+	"""
+	answer_key = get_answer_key(exam)
+
+	# questions picked before the exam questions were changed
+	missing = [qs for qs in responses if qs not in answer_key]
+	if missing:
+		answer_key = dict(answer_key)
+		answer_key.update(compile_answer_key(missing))
+		set_answer_key(exam, answer_key)
+
+	return {
+		qs: grade_answer(answer_key[qs], answer)
+		for qs, answer in responses.items() if qs in answer_key
+	}
@@ -0,0 +1,195 @@
+import pickle
+
+import frappe
+from frappe.utils import now_datetime
+
+from exampro.exam_pro.api.answerbuffer import get_buffered_answers
+from exampro.exam_pro.api.schedulewindow import calculate_end_time, get_schedule_window
+
+# exam session cache
+# > EXAM_SESSION:<submission> holds the ordered question list, end time
+#   and status of a started submission, it is not written after creation
+# > EXAM_SESSION_ANSWERS:<submission> hash of seq_no -> answer, one field
+#   per question so concurrent responses don't overwrite each other.
+#   The BUILT field marks the hash as complete, it is rebuilt when missing
+# > keys expire when the exam ends, hence a missing key after end time
+#   always goes back to the db
+EXAM_SESSION_CACHE = "exam_session"
+EXAM_SESSION_ANSWERS_CACHE = "exam_session_answers"
+ANSWERS_BUILT = "built"
+
+
+def _session_key(exam_submission):
+	return "{}:{}".format(EXAM_SESSION_CACHE, exam_submission)
+
+
+def _answers_key(exam_submission):
+	return "{}:{}".format(EXAM_SESSION_ANSWERS_CACHE, exam_submission)
+
+
+def build_exam_session(exam_submission):
+	"""
+	Load the session state of a submission from the db.
+	"""
+	submission = frappe.db.get_value(
+		"Exam Submission", exam_submission,
+		["name", "candidate", "exam", "exam_schedule", "status",
+		"exam_started_time", "additional_time_given"],
+		as_dict=True
+	)
+	if not submission:
+		return None
+
+	session = {
+		"exam_submission": submission["name"],
+		"candidate": submission["candidate"],
+		"exam": submission["exam"],
+		"exam_schedule": submission["exam_schedule"],
+		"status": submission["status"],
+		"end_time": None,
+		"questions": [],
+		"answers": {}
+	}
+	if submission["status"] != "Started":
+		return session
+
+	window = get_schedule_window(submission["exam_schedule"])
+	session["end_time"] = calculate_end_time(
+		window, submission["exam_started_time"], submission["additional_time_given"]
+	)
+
+	answers = frappe.get_all(
+		"Exam Answer",
+		filters={"parent": exam_submission},
+		fields=["name", "exam_question", "seq_no", "answer", "marked_for_later", "evaluation_status"],
+		order_by="seq_no asc",
+		ignore_permissions=True
+	)
+	for row in answers:
+		session["questions"].append({
+			"name": row["exam_question"],
+			"answer_row": row["name"],
+			"seq_no": row["seq_no"]
+		})
+		if row["evaluation_status"] != "Not Attempted":
+			session["answers"][row["seq_no"]] = {
+				"answer": row["answer"],
+				"marked_for_later": row["marked_for_later"]
+			}
+
+	# responses not yet flushed to db
+	buffered = get_buffered_answers(exam_submission)
+	for qs in session["questions"]:
+		if qs["name"] in buffered:
+			session["answers"][qs["seq_no"]] = {
+				"answer": buffered[qs["name"]]["answer"],
+				"marked_for_later": buffered[qs["name"]]["marked_for_later"]
+			}
+
+	return session
+
+
+def _session_ttl(session):
+	return int((session["end_time"] - now_datetime()).total_seconds())
+
+
+def _store_exam_session(session):
+	ttl = _session_ttl(session)
+	if ttl <= 0:
+		return
+
+	frappe.cache().set_value(
+		_session_key(session["exam_submission"]),
+		{key: value for key, value in session.items() if key != "answers"},
+		expires_in_sec=ttl
+	)
+	# fields set by update_session_answer meanwhile are newer, keep them
+	key = frappe.cache().make_key(_answers_key(session["exam_submission"]))
+	pipe = frappe.cache().pipeline()
+	for seq_no, answer in session["answers"].items():
+		pipe.hsetnx(key, str(seq_no), pickle.dumps(answer))
+	pipe.hset(key, ANSWERS_BUILT, pickle.dumps(1))
+	pipe.expire(key, ttl)
+	pipe.execute()
+
+
+def _get_session_answers(exam_submission):
+	"""
+	Answers of a session from cache, None if they are not cached
+	"""
+	answers = {
+		frappe.safe_decode(seq_no): answer
+		for seq_no, answer in frappe.cache().hgetall(_answers_key(exam_submission)).items()
+	}
+	if not answers.pop(ANSWERS_BUILT, None):
+		return None
+
+	return {int(seq_no): answer for seq_no, answer in answers.items()}
+
+
+def create_exam_session(exam_submission):
+	"""
+	Build the session from db and cache it till the exam end time.
+	"""
+	session = build_exam_session(exam_submission)
+	if session and session["status"] == "Started":
+		_store_exam_session(session)
+
+	return session
+
+
+def get_exam_session(exam_submission):
+	"""
+	Get the session of a submission from cache, rebuild it on cache miss.
+	"""
+	session = frappe.cache().get_value(_session_key(exam_submission))
+	if session:
+		answers = _get_session_answers(exam_submission)
+		if answers is not None:
+			return dict(session, answers=answers)
+
+	return create_exam_session(exam_submission)
+
+
+def clear_exam_session(exam_submission):
+	frappe.cache().delete_value(_session_key(exam_submission))
+	frappe.cache().delete(frappe.cache().make_key(_answers_key(exam_submission)))
+
+
+def get_session_question(session, qs_no):
+	"""
+	Returns the question entry for a sequence no., None if invalid
+	"""
+	if qs_no < 1 or qs_no > len(session["questions"]):
+		return None
+
+	return session["questions"][qs_no - 1]
+
+
+def find_session_question(session, exam_question):
+	for qs in session["questions"]:
+		if qs["name"] == exam_question:
+			return qs
+
+
+def update_session_answer(session, seq_no, answer, marked_for_later):
+	"""
+	Record an answer in the cached session, only its own field is written
+	"""
+	session["answers"][seq_no] = {
+		"answer": answer,
+		"marked_for_later": marked_for_later
+	}
+	ttl = _session_ttl(session)
+	if ttl <= 0:
+		return
+
+	key = frappe.cache().make_key(_answers_key(session["exam_submission"]))
+	pipe = frappe.cache().pipeline()
+	pipe.hset(key, str(seq_no), pickle.dumps(session["answers"][seq_no]))
+	pipe.expire(key, ttl)
+	pipe.execute()
+
+
+def has_session_ended(session):
+	return now_datetime() >= session["end_time"]
@@ -0,0 +1,155 @@
+import frappe
+from frappe.utils import get_datetime
+
+# materialised leaderboards, one per exam and one per schedule
+# > LEADERBOARD:<scope>:<name> sorted set of passed submission -> score
+#   score is total marks (x100) in the high digits and the inverted modified
+#   timestamp in the low digits, so ZREVRANGE orders by marks desc, modified asc
+# > LEADERBOARD_STATS:<scope>:<name> hash with count and sum (x100) of marks,
+#   its presence marks the leaderboard as built
+# > built from the db on first read, kept up to date on submission updates
+LEADERBOARD_CACHE = "leaderboard"
+LEADERBOARD_STATS_CACHE = "leaderboard_stats"
+LEADERBOARD_TTL = 7 * 24 * 60 * 60
+SCORE_SCALE = 10 ** 10
+SCOPES = ("exam", "exam_schedule")
+
+# KEYS[1] ranking set, KEYS[2] stats hash
+# ARGV[1] submission, ARGV[2] new score (empty to remove), ARGV[3] score scale
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+	return 0
+end
+local scale = tonumber(ARGV[3])
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if old then
+	redis.call('ZREM', KEYS[1], ARGV[1])
+	redis.call('HINCRBY', KEYS[2], 'count', -1)
+	redis.call('HINCRBY', KEYS[2], 'sum', -math.floor(tonumber(old) / scale))
+end
+if ARGV[2] ~= '' then
+	local score = tonumber(ARGV[2])
+	redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+	redis.call('HINCRBY', KEYS[2], 'count', 1)
+	redis.call('HINCRBY', KEYS[2], 'sum', math.floor(score / scale))
+end
+return 1
+"""
+
+
+def _keys(scope, name):
+	return (
+		frappe.cache().make_key("{}:{}:{}".format(LEADERBOARD_CACHE, scope, name)),
+		frappe.cache().make_key("{}:{}:{}".format(LEADERBOARD_STATS_CACHE, scope, name))
+	)
+
+
+def _get_script():
+	if not getattr(frappe.local, "leaderboard_update_script", None):
+		frappe.local.leaderboard_update_script = frappe.cache().register_script(UPDATE_SCRIPT)
+
+	return frappe.local.leaderboard_update_script
+
+
+def marks_to_int(total_marks):
+	return int(round((total_marks or 0) * 100))
+
+
+def leaderboard_score(total_marks, modified):
+	ts = int(get_datetime(modified).timestamp())
+	return marks_to_int(total_marks) * SCORE_SCALE + (SCORE_SCALE - 1 - ts)
+
+
+def score_to_marks(score):
+	return int(score // SCORE_SCALE) / 100
+
+
+def is_on_leaderboard(status, result_status):
+	return status == "Submitted" and result_status == "Passed"
+
+
+def build_leaderboard(scope, name):
+	"""
+	Materialise a leaderboard from the db.
+	"""
+	rows = frappe.get_all(
+		"Exam Submission",
+		filters={scope: name, "status": "Submitted", "result_status": "Passed"},
+		fields=["name", "total_marks", "modified"]
+	)
+	rank_key, stats_key = _keys(scope, name)
+	pipe = frappe.cache().pipeline()
+	pipe.delete(rank_key, stats_key)
+	if rows:
+		pipe.zadd(rank_key, {
+			row["name"]: leaderboard_score(row["total_marks"], row["modified"]) for row in rows
+		})
+	pipe.hset(stats_key, mapping={
+		"count": len(rows),
+		"sum": sum(marks_to_int(row["total_marks"]) for row in rows)
+	})
+	pipe.expire(rank_key, LEADERBOARD_TTL)
+	pipe.expire(stats_key, LEADERBOARD_TTL)
+	pipe.execute()
+
+
+def get_leaderboard(scope, name, limit=10, submission=None):
+	"""
+	Top `limit` submissions of a leaderboard with its aggregates.
+	If `submission` is given, its 1 based rank is returned, None if it is not on the board.
+	"""
+	rank_key, stats_key = _keys(scope, name)
+	for attempt in range(2):
+		pipe = frappe.cache().pipeline()
+		pipe.exists(stats_key)
+		pipe.zrevrange(rank_key, 0, int(limit) - 1, withscores=True)
+		pipe.hgetall(stats_key)
+		if submission:
+			pipe.zrevrank(rank_key, submission)
+		res = pipe.execute()
+		if res[0] or attempt:
+			break
+		build_leaderboard(scope, name)
+
+	stats = {frappe.safe_decode(k): int(v) for k, v in res[2].items()}
+	rank = res[3] if submission else None
+
+	return {
+		"top": [(frappe.safe_decode(member), score_to_marks(score)) for member, score in res[1]],
+		"count": stats.get("count", 0),
+		"total_marks": stats.get("sum", 0) / 100,
+		"rank": rank + 1 if rank is not None else None
+	}
+
+
+def update_leaderboards(submission):
+	"""
+	Move a submission on the leaderboards of its exam and schedule.
+	Leaderboards that are not built yet are left alone.
+	"""
+	score = ""
+	if is_on_leaderboard(submission.status, submission.result_status):
+		score = leaderboard_score(submission.total_marks, submission.modified)
+
+	script = _get_script()
+	for scope in SCOPES:
+		script(keys=_keys(scope, submission.get(scope)), args=[submission.name, score, SCORE_SCALE])
+
+
+def remove_from_leaderboards(submission):
+	script = _get_script()
+	for scope in SCOPES:
+		script(keys=_keys(scope, submission.get(scope)), args=[submission.name, "", SCORE_SCALE])
+
+
+def clear_leaderboards(exams=(), schedules=()):
+	"""
+	Drop leaderboards after bulk updates, they are rebuilt on next read.
+	"""
+	keys = []
+	for scope, names in (("exam", exams), ("exam_schedule", schedules)):
+		for name in set(names):
+			keys.extend(_keys(scope, name))
+
+	if keys:
+		frappe.cache().delete(*keys)
@@ -0,0 +1,89 @@
+import frappe
+from frappe.utils import get_datetime
+
+# last message marker of a submission
+# > EXAM_LAST_MESSAGE:<submission> holds the creation time (epoch microseconds)
+#   of the latest message, NO_MESSAGES if the submission has none yet
+# > only ever moves forward, concurrent inserts can't set an older time
+# > lets a poll with an up to date cursor return without touching the db
+EXAM_LAST_MESSAGE_CACHE = "exam_last_message"
+NO_MESSAGES = "-"
+LAST_MESSAGE_TTL = 24 * 60 * 60
+
+# set the marker if it is missing, NO_MESSAGES or older
+SET_MARKER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if not current or current == ARGV[3] or tonumber(ARGV[1]) > tonumber(current) then
+	redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+	return 1
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 0
+"""
+
+
+def _marker_key(exam_submission):
+	return frappe.cache().make_key("{}:{}".format(EXAM_LAST_MESSAGE_CACHE, exam_submission))
+
+
+def _marker_value(creation):
+	creation = get_datetime(creation)
+	return (creation.toordinal() * 86400 + creation.hour * 3600 + creation.minute * 60
+		+ creation.second) * 1000000 + creation.microsecond
+
+
+def get_last_message_marker(exam_submission):
+	marker = frappe.cache().get(_marker_key(exam_submission))
+	return frappe.safe_decode(marker) if marker else None
+
+
+def set_last_message_marker(exam_submission, creation):
+	if not creation:
+		# only if nothing newer was recorded meanwhile
+		frappe.cache().set(_marker_key(exam_submission), NO_MESSAGES, ex=LAST_MESSAGE_TTL, nx=True)
+		return
+
+	frappe.cache().eval(
+		SET_MARKER_SCRIPT, 1, _marker_key(exam_submission),
+		_marker_value(creation), LAST_MESSAGE_TTL, NO_MESSAGES
+	)
+
+
+def is_cursor_current(exam_submission, since):
+	"""
+	True if no message was created after the cursor, as per the marker.
+	"""
+	marker = get_last_message_marker(exam_submission)
+	if not marker:
+		return False
+	if marker == NO_MESSAGES:
+		return True
+
+	return int(marker) <= _marker_value(since)
+
+
+def get_messages(exam_submission, since=None):
+	"""
+	Messages of a submission in creation order, only newer than `since` if given.
+	"""
+	filters = {"exam_submission": exam_submission}
+	if since:
+		filters["creation"] = [">", get_datetime(since)]
+
+	res = frappe.get_all(
+		"Exam Messages",
+		filters=filters,
+		fields=["creation", "from", "message", "type_of_message"],
+		order_by="creation asc",
+		ignore_permissions=True
+	)
+	for idx, msg in enumerate(res):
+		res[idx]["creation"] = res[idx]["creation"].isoformat()
+
+	# the last row is the latest message, keep the marker warm
+	if res:
+		set_last_message_marker(exam_submission, res[-1]["creation"])
+	elif not since:
+		set_last_message_marker(exam_submission, None)
+
+	return res
@@ -0,0 +1,265 @@
+import random
+
+import frappe
+from frappe import _
+from frappe.utils import now
+from redis.exceptions import LockError
+
+from exampro.exam_pro.api.allocator import allocate_examiners
+from exampro.exam_pro.api.candidate_exams import clear_candidate_exams
+
+# bulk creation of exam submissions
+# > submissions and their Exam Answer rows are written with multi row inserts,
+#   skipping the per document hooks of Exam Submission. Everything the hooks
+#   compute (question sets, candidate role, examiner assignment) is done here
+#   in memory, once per schedule.
+# > provisioning of a schedule is serialised with a redis lock, the existing
+#   submissions are read before the inserts, so overlapping jobs (schedule
+#   saves, batch imports) would otherwise create the same submissions.
+#   Every save queues its own job, the lock runs them one after the other.
+#   Without commit (document hooks) the lock is released when the caller's
+#   transaction ends
+PROVISION_CHUNK_SIZE = 500
+QUERY_CHUNK_SIZE = 1000
+PROVISION_LOCK = "provision_submissions"
+PROVISION_LOCK_TIMEOUT = 60 * 60
+
+SUBMISSION_FIELDS = [
+	"name", "creation", "modified", "owner", "modified_by", "docstatus",
+	"exam_schedule", "exam", "candidate", "candidate_name", "exam_batch", "status",
+	"additional_time_given", "result_status", "evaluation_status", "warning_count",
+	"new_user", "reset_password_key", "assigned_proctor", "assigned_evaluator"
+]
+ANSWER_FIELDS = [
+	"name", "creation", "modified", "owner", "modified_by", "docstatus",
+	"parent", "parenttype", "parentfield", "idx",
+	"exam_question", "question", "seq_no", "evaluation_status",
+	"marked_for_later", "is_correct", "mark"
+]
+
+
+def chunks(items, size):
+	items = list(items)
+	for idx in range(0, len(items), size):
+		yield items[idx:idx + size]
+
+
+def get_candidate_details(candidates):
+	"""
+	full name, login and reset key of users, in chunked queries
+	returns {user: row}
+	"""
+	details = {}
+	for chunk in chunks(candidates, QUERY_CHUNK_SIZE):
+		rows = frappe.get_all(
+			"User",
+			filters={"name": ["in", chunk]},
+			fields=["name", "full_name", "last_login", "reset_password_key"]
+		)
+		details.update({row["name"]: row for row in rows})
+
+	return details
+
+
+def grant_candidate_role(users):
+	"""
+	Add Exam Candidate role to the users who do not have it, in bulk.
+	"""
+	missing = set(users)
+	for chunk in chunks(users, QUERY_CHUNK_SIZE):
+		missing -= set(frappe.get_all(
+			"Has Role",
+			filters={"parent": ["in", chunk], "parenttype": "User", "role": "Exam Candidate"},
+			pluck="parent"
+		))
+
+	if not missing:
+		return
+
+	tnow = now()
+	frappe.db.bulk_insert("Has Role", [
+		"name", "creation", "modified", "owner", "modified_by", "docstatus",
+		"parent", "parenttype", "parentfield", "idx", "role"
+	], [
+		(frappe.generate_hash(length=10), tnow, tnow, frappe.session.user, frappe.session.user, 0,
+			user, "User", "roles", 0, "Exam Candidate")
+		for user in missing
+	], chunk_size=QUERY_CHUNK_SIZE)
+
+	# roles are cached per user
+	for user in missing:
+		frappe.cache().hdel("roles", user)
+
+
+def get_exam_questions(exam):
+	"""
+	Questions added to an exam with the question text copied into answer rows
+	"""
+	return frappe.db.sql("""
+		SELECT eaq.exam_question, eq.question
+		FROM `tabExam Added Question` eaq
+		INNER JOIN `tabExam Question` eq ON eq.name = eaq.exam_question
+		WHERE eaq.parent = %(exam)s
+		ORDER BY eaq.idx
+	""", {"exam": exam}, as_dict=True)
+
+
+def provision_submissions(exam_schedule, candidates, publish_progress=True, commit=True):
+	"""
+	Create Registered submissions of a schedule for many candidates.
+	:param candidates: list of (candidate, exam_batch)
+	:param commit: commit after each chunk, off when called from a document hook
+	Candidates who already have a submission in the schedule are skipped.
+	returns number of submissions created
+	"""
+	if commit:
+		lock = _acquire_provision_lock(exam_schedule)
+		try:
+			# new transaction, so submissions committed by the previous lock holder are read
+			frappe.db.commit()
+			return _provision_submissions(exam_schedule, candidates, publish_progress, commit)
+		finally:
+			_release_provision_lock(lock)
+
+	# document hook, the caller commits the rows, so the lock is held till then.
+	# Locks taken in this transaction are remembered, the lock is not reentrant
+	held = frappe.flags.setdefault("held_provision_locks", {})
+	if exam_schedule not in held:
+		lock = _acquire_provision_lock(exam_schedule)
+		held[exam_schedule] = lock
+
+		def release():
+			if held.pop(exam_schedule, None):
+				_release_provision_lock(lock)
+
+		frappe.db.after_commit.add(release)
+		frappe.db.after_rollback.add(release)
+
+	return _provision_submissions(exam_schedule, candidates, publish_progress, commit)
+
+
+def _acquire_provision_lock(exam_schedule):
+	lock = frappe.cache().lock(
+		frappe.cache().make_key("{}:{}".format(PROVISION_LOCK, exam_schedule)),
+		timeout=PROVISION_LOCK_TIMEOUT,
+		blocking_timeout=PROVISION_LOCK_TIMEOUT
+	)
+	if not lock.acquire():
+		frappe.throw(_("Submissions of {} are still being created, please try again.").format(exam_schedule))
+
+	return lock
+
+
+def _release_provision_lock(lock):
+	try:
+		lock.release()
+	except LockError:
+		# expired after PROVISION_LOCK_TIMEOUT
+		pass
+
+
+def _provision_submissions(exam_schedule, candidates, publish_progress, commit):
+	exam = frappe.db.get_value("Exam Schedule", exam_schedule, "exam")
+	existing = set(frappe.get_all(
+		"Exam Submission", filters={"exam_schedule": exam_schedule}, pluck="candidate"
+	))
+	pending, seen = [], set()
+	for candidate, exam_batch in candidates:
+		if candidate in existing or candidate in seen:
+			continue
+		seen.add(candidate)
+		pending.append((candidate, exam_batch))
+
+	if not pending:
+		return 0
+
+	users = get_candidate_details([cand for cand, _ in pending])
+	pending = [(cand, batch) for cand, batch in pending if cand in users]
+	grant_candidate_role([cand for cand, _ in pending])
+
+	questions = get_exam_questions(exam)
+	randomize = frappe.get_cached_value("Exam", exam, "randomize_questions")
+	examiners = allocate_examiners(exam_schedule, count=len(pending))
+
+	created = 0
+	user = frappe.session.user
+	for chunk in chunks(zip(pending, examiners), PROVISION_CHUNK_SIZE):
+		tnow = now()
+		submission_rows, answer_rows = [], []
+		for (candidate, exam_batch), (proctor, evaluator) in chunk:
+			details = users[candidate]
+			name = frappe.generate_hash(length=10)
+			new_user = 0 if details["last_login"] else 1
+			submission_rows.append((
+				name, tnow, tnow, user, user, 0,
+				exam_schedule, exam, candidate, details["full_name"], exam_batch, "Registered",
+				0, "NA", "NA", 0,
+				new_user, details["reset_password_key"] if new_user else None, proctor, evaluator
+			))
+
+			question_set = list(questions)
+			if randomize:
+				random.shuffle(question_set)
+			for idx, qs in enumerate(question_set):
+				answer_rows.append((
+					frappe.generate_hash(length=10), tnow, tnow, user, user, 0,
+					name, "Exam Submission", "submitted_answers", idx + 1,
+					qs["exam_question"], qs["question"], idx + 1, "Not Attempted",
+					0, 0, 0
+				))
+
+		frappe.db.bulk_insert("Exam Submission", SUBMISSION_FIELDS, submission_rows)
+		frappe.db.bulk_insert("Exam Answer", ANSWER_FIELDS, answer_rows)
+		if commit:
+			frappe.db.commit()
+		clear_candidate_exams([candidate for (candidate, _), _ in chunk])
+
+		created += len(submission_rows)
+		if publish_progress:
+			frappe.publish_progress(
+				created * 100 / len(pending),
+				title="Creating exam submissions",
+				doctype="Exam Schedule",
+				docname=exam_schedule,
+				description="{} of {}".format(created, len(pending))
+			)
+
+	return created
+
+
+def provision_batch_submissions(exam_schedule):
+	"""
+	Background job, create submissions for all users of the batches assigned to a schedule.
+	"""
+	batches = frappe.get_all(
+		"Schedule Batch Assignment",
+		filters={"parent": exam_schedule, "parenttype": "Exam Schedule"},
+		pluck="batch_name"
+	)
+	if not batches:
+		return 0
+
+	batch_users = frappe.get_all(
+		"Exam Batch User",
+		filters={"exam_batch": ["in", batches]},
+		fields=["candidate", "exam_batch"],
+		order_by="creation asc"
+	)
+	created = provision_submissions(
+		exam_schedule, [(row["candidate"], row["exam_batch"]) for row in batch_users]
+	)
+	frappe.logger("exampro").info(
+		"provision_batch_submissions: {} submissions created for {}".format(created, exam_schedule)
+	)
+
+	return created
+
+
+def enqueue_batch_submissions(exam_schedule):
+	frappe.enqueue(
+		"exampro.exam_pro.api.provisioning.provision_batch_submissions",
+		queue="long",
+		timeout=3600,
+		enqueue_after_commit=True,
+		exam_schedule=exam_schedule
+	)
@@ -0,0 +1,142 @@
+import time
+from collections import defaultdict
+
+import frappe
+
+from exampro.exam_pro.api.answerbuffer import flush_answer_buffer
+from exampro.exam_pro.api.candidate_exams import clear_candidate_exams
+from exampro.exam_pro.api.examsession import clear_exam_session
+from exampro.exam_pro.api.leaderboard import clear_leaderboards
+
+# submission status after the exam window is closed
+CLOSED_STATUS = {
+	"Started": "Submitted",
+	"Registered": "Not Attempted"
+}
+UPDATE_CHUNK_SIZE = 1000
+
+
+def get_answer_totals(submissions):
+	"""
+	Total marks and pending evaluation count of submissions, grouped in db.
+	returns {submission: (total_marks, eval_pending)}
+	"""
+	totals = {}
+	names = list(submissions)
+	for idx in range(0, len(names), UPDATE_CHUNK_SIZE):
+		rows = frappe.db.sql("""
+			SELECT
+				parent,
+				SUM(CASE WHEN is_correct = 1 THEN mark ELSE 0 END) AS total_marks,
+				SUM(CASE WHEN evaluation_status = 'Pending' THEN 1 ELSE 0 END) AS eval_pending
+			FROM `tabExam Answer`
+			WHERE parenttype = 'Exam Submission' AND parent IN %(names)s
+			GROUP BY parent
+		""", {"names": tuple(names[idx:idx + UPDATE_CHUNK_SIZE])}, as_dict=True)
+		for row in rows:
+			totals[row["parent"]] = (row["total_marks"] or 0, int(row["eval_pending"] or 0))
+
+	return totals
+
+
+def get_result_values(total_marks, eval_pending, pass_mark):
+	"""
+	Same rules as evaluation_values, on precomputed totals
+	"""
+	if total_marks >= pass_mark:
+		result_status = "Passed"
+	elif eval_pending == 0:
+		result_status = "Failed"
+	else:
+		result_status = "NA"
+
+	evaluation_status = "Pending" if eval_pending > 0 else "NA"
+
+	return evaluation_status, result_status
+
+
+def regrade_submissions(submissions, close=True):
+	"""
+	Recompute results of many submissions with grouped queries and batched updates.
+	:param submissions: list of dicts with name, exam, exam_schedule, status and candidate
+	:param close: move Started/Registered submissions to their closed status
+	returns stats with time taken per stage
+	"""
+	stats = {"submissions": len(submissions), "updated": 0, "timings": {}}
+	if not submissions:
+		return stats
+
+	tstart = time.perf_counter()
+	# buffered answers of live submissions have to be in db before totalling
+	for subm in submissions:
+		if subm["status"] == "Started":
+			flush_answer_buffer(subm["name"])
+	stats["timings"]["flush_buffers"] = time.perf_counter() - tstart
+
+	tstart = time.perf_counter()
+	totals = get_answer_totals([subm["name"] for subm in submissions])
+	stats["timings"]["aggregate_answers"] = time.perf_counter() - tstart
+
+	tstart = time.perf_counter()
+	pass_marks = {}
+	for exam in {subm["exam"] for subm in submissions}:
+		exam_total_mark, pass_perc = frappe.get_cached_value(
+			"Exam", exam, ["total_marks", "pass_percentage"]
+		)
+		pass_marks[exam] = ((exam_total_mark or 0) * (pass_perc or 0)) / 100
+
+	# group submissions with the same result, one update per group
+	groups = defaultdict(list)
+	for subm in submissions:
+		total_marks, eval_pending = totals.get(subm["name"], (0, 0))
+		evaluation_status, result_status = get_result_values(
+			total_marks, eval_pending, pass_marks[subm["exam"]]
+		)
+		status = CLOSED_STATUS.get(subm["status"], subm["status"]) if close else subm["status"]
+		groups[(status, total_marks, evaluation_status, result_status)].append(subm["name"])
+	stats["timings"]["compute_results"] = time.perf_counter() - tstart
+
+	tstart = time.perf_counter()
+	modified = frappe.utils.now()
+	for (status, total_marks, evaluation_status, result_status), names in groups.items():
+		for idx in range(0, len(names), UPDATE_CHUNK_SIZE):
+			frappe.db.sql("""
+				UPDATE `tabExam Submission`
+				SET exam_submitted_time = CASE WHEN %(status)s = 'Submitted' AND status != 'Submitted'
+						THEN %(modified)s ELSE exam_submitted_time END,
+					status = %(status)s, total_marks = %(total_marks)s,
+					evaluation_status = %(evaluation_status)s, result_status = %(result_status)s,
+					modified = %(modified)s, modified_by = %(modified_by)s
+				WHERE name IN %(names)s
+			""", {
+				"status": status,
+				"total_marks": total_marks,
+				"evaluation_status": evaluation_status,
+				"result_status": result_status,
+				"modified": modified,
+				"modified_by": frappe.session.user,
+				"names": tuple(names[idx:idx + UPDATE_CHUNK_SIZE])
+			})
+		stats["updated"] += len(names)
+	frappe.db.commit()
+	stats["timings"]["write_results"] = time.perf_counter() - tstart
+
+	after_bulk_update(submissions)
+	frappe.logger("exampro").info("regrade_submissions: {}".format(stats))
+
+	return stats
+
+
+def after_bulk_update(submissions):
+	"""
+	Document hooks are skipped by bulk updates, clear the derived caches here.
+	"""
+	for subm in submissions:
+		if subm["status"] == "Started":
+			clear_exam_session(subm["name"])
+
+	clear_candidate_exams([subm.get("candidate") for subm in submissions])
+	clear_leaderboards(
+		exams=[subm["exam"] for subm in submissions],
+		schedules=[subm["exam_schedule"] for subm in submissions if subm.get("exam_schedule")]
+	)
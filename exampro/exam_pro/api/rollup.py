@@ -0,0 +1,194 @@
+import frappe
+from frappe.utils import add_days, add_to_date, getdate, now
+
+# daily analytics rollup
+# > Exam Daily Rollup has one row per schedule per day with registration,
+#   start and submission counters, score sum and histogram buckets
+# > the job picks the (schedule, day) buckets that submissions modified since
+#   the last run (watermark) count in and rebuilds only those rows, so reruns
+#   and overlaps are harmless. The first run rebuilds everything
+ROLLUP_WATERMARK = "exam_daily_rollup_watermark"
+# re-read a little before the watermark to catch rows committed late
+ROLLUP_OVERLAP_MINUTES = 5
+ROLLUP_CHUNK_SIZE = 100
+
+ROLLUP_FIELDS = [
+	"registered", "started", "submitted", "passed", "score_sum",
+	"score_bin_0", "score_bin_1", "score_bin_2", "score_bin_3", "score_bin_4"
+]
+# score histogram of the dashboard, ranges 0-20, 21-40, 41-60, 61-80, 81-100
+SCORE_BINS = [0, 20, 40, 60, 80, 100]
+
+
+def _score_bin_columns():
+	columns = []
+	for idx in range(len(SCORE_BINS) - 1):
+		lower_op = ">=" if idx == 0 else ">"
+		columns.append(
+			"CASE WHEN total_marks {} {} AND total_marks <= {} THEN 1 ELSE 0 END".format(
+				lower_op, SCORE_BINS[idx], SCORE_BINS[idx + 1]
+			)
+		)
+
+	return columns
+
+
+# day a submission counts in, per counter
+REGISTERED_DAY = "creation"
+STARTED_DAY = "exam_started_time"
+SUBMITTED_DAY = "IFNULL(exam_submitted_time, modified)"
+
+
+def _bucket_filter(buckets, column):
+	"""
+	SQL condition selecting rows of the buckets by a datetime `column`.
+	:param buckets: {exam_schedule: set of dates}, None dates for all days
+	returns (condition, params)
+	"""
+	conditions, params = [], {}
+	for idx, (exam_schedule, days) in enumerate(buckets.items()):
+		params["sch_{}".format(idx)] = exam_schedule
+		if not days:
+			conditions.append("exam_schedule = %(sch_{})s".format(idx))
+			continue
+		# a range over the days, every day in it is rebuilt in full
+		params["from_{}".format(idx)] = min(days)
+		params["to_{}".format(idx)] = add_days(max(days), 1)
+		conditions.append(
+			"(exam_schedule = %(sch_{0})s AND {column} >= %(from_{0})s AND {column} < %(to_{0})s)"
+			.format(idx, column=column)
+		)
+
+	return "({})".format(" OR ".join(conditions)), params
+
+
+def compute_rollups(buckets):
+	"""
+	Daily counters of schedule buckets from their submissions.
+	Registrations count on the creation day, starts on the start day and
+	submissions on the submitted day (last modified if not recorded).
+	:param buckets: {exam_schedule: set of dates}, None dates for all days
+	"""
+	bins = _score_bin_columns()
+	# column names come from the first select of the union
+	named_no_bins = ", ".join("0 as b{}".format(idx) for idx in range(len(bins)))
+	no_bins = ", ".join("0" for _ in bins)
+	submitted_bins = ", ".join(bins)
+
+	registered, params = _bucket_filter(buckets, REGISTERED_DAY)
+	started, _ = _bucket_filter(buckets, STARTED_DAY)
+	submitted, _ = _bucket_filter(buckets, SUBMITTED_DAY)
+
+	return frappe.db.sql("""
+		SELECT exam_schedule, exam, day,
+			SUM(registered) as registered, SUM(started) as started,
+			SUM(submitted) as submitted, SUM(passed) as passed, SUM(score) as score_sum,
+			SUM(b0) as score_bin_0, SUM(b1) as score_bin_1, SUM(b2) as score_bin_2,
+			SUM(b3) as score_bin_3, SUM(b4) as score_bin_4
+		FROM (
+			SELECT exam_schedule, exam, DATE({registered_day}) as day,
+				1 as registered, 0 as started, 0 as submitted, 0 as passed, 0 as score,
+				{named_no_bins}
+			FROM `tabExam Submission`
+			WHERE {registered}
+			UNION ALL
+			SELECT exam_schedule, exam, DATE({started_day}),
+				0, 1, 0, 0, 0,
+				{no_bins}
+			FROM `tabExam Submission`
+			WHERE {started} AND exam_started_time IS NOT NULL
+			UNION ALL
+			SELECT exam_schedule, exam, DATE({submitted_day}),
+				0, 0, 1, CASE WHEN result_status = 'Passed' THEN 1 ELSE 0 END, IFNULL(total_marks, 0),
+				{submitted_bins}
+			FROM `tabExam Submission`
+			WHERE {submitted} AND status = 'Submitted'
+		) as events
+		GROUP BY exam_schedule, exam, day
+	""".format(
+		registered_day=REGISTERED_DAY, started_day=STARTED_DAY, submitted_day=SUBMITTED_DAY,
+		registered=registered, started=started, submitted=submitted,
+		named_no_bins=named_no_bins, no_bins=no_bins, submitted_bins=submitted_bins
+	), params, as_dict=True)
+
+
+def rebuild_rollups(buckets):
+	"""
+	Replace the rollup rows of the given buckets.
+	:param buckets: {exam_schedule: set of dates}, None dates for all days
+	"""
+	schedules = list(buckets)
+	for idx in range(0, len(schedules), ROLLUP_CHUNK_SIZE):
+		chunk = {
+			exam_schedule: buckets[exam_schedule]
+			for exam_schedule in schedules[idx:idx + ROLLUP_CHUNK_SIZE]
+		}
+		rows = compute_rollups(chunk)
+		condition, params = _bucket_filter(chunk, "date")
+		frappe.db.sql("DELETE FROM `tabExam Daily Rollup` WHERE {}".format(condition), params)
+
+		tnow = now()
+		frappe.db.bulk_insert(
+			"Exam Daily Rollup",
+			["name", "creation", "modified", "owner", "modified_by", "docstatus",
+				"date", "exam", "exam_schedule"] + ROLLUP_FIELDS,
+			[
+				(frappe.generate_hash(length=10), tnow, tnow, "Administrator", "Administrator", 0,
+					row["day"], row["exam"], row["exam_schedule"])
+				+ tuple(row[field] or 0 for field in ROLLUP_FIELDS)
+				for row in rows
+			]
+		)
+		frappe.db.commit()
+
+
+def get_touched_buckets(since):
+	"""
+	(schedule, day) buckets that submissions modified after `since` count in
+	returns {exam_schedule: set of dates}
+	"""
+	rows = frappe.db.sql("""
+		SELECT exam_schedule, DATE({registered_day}) as day
+		FROM `tabExam Submission` WHERE modified > %(since)s
+		UNION
+		SELECT exam_schedule, DATE({started_day})
+		FROM `tabExam Submission` WHERE modified > %(since)s AND exam_started_time IS NOT NULL
+		UNION
+		SELECT exam_schedule, DATE({submitted_day})
+		FROM `tabExam Submission` WHERE modified > %(since)s AND status = 'Submitted'
+	""".format(
+		registered_day=REGISTERED_DAY, started_day=STARTED_DAY, submitted_day=SUBMITTED_DAY
+	), {"since": since}, as_dict=True)
+
+	buckets = {}
+	for row in rows:
+		if row["exam_schedule"]:
+			buckets.setdefault(row["exam_schedule"], set()).add(getdate(row["day"]))
+
+	return buckets
+
+
+def update_daily_rollups():
+	"""
+	Scheduled job, rebuild the rollup buckets touched since the last run.
+	"""
+	watermark = frappe.db.get_global(ROLLUP_WATERMARK)
+	run_started = now()
+
+	if watermark:
+		buckets = get_touched_buckets(add_to_date(watermark, minutes=-ROLLUP_OVERLAP_MINUTES))
+	else:
+		buckets = {
+			exam_schedule: None for exam_schedule in frappe.get_all(
+				"Exam Submission", pluck="exam_schedule", distinct=True
+			) if exam_schedule
+		}
+	if buckets:
+		rebuild_rollups(buckets)
+
+	frappe.db.set_global(ROLLUP_WATERMARK, run_started)
+	frappe.db.commit()
+
+
+def clear_rollups(exam_schedule):
+	frappe.db.delete("Exam Daily Rollup", {"exam_schedule": exam_schedule})
@@ -0,0 +1,203 @@
+import pickle
+
+import frappe
+from frappe.utils import get_datetime, now_datetime
+
+from datetime import timedelta
+
+# time window of exam schedules
+# > SCHEDULE_WINDOW hash of schedule -> {start, end, schedule_type, duration, expire_in_days}
+# > cleared on schedule update/delete
+SCHEDULE_WINDOW_CACHE = "exam_schedule_window"
+WINDOW_FIELDS = ["name", "start_date_time", "schedule_type", "duration", "schedule_expire_in_days"]
+
+# same window in SQL, for filtering and sorting schedules by status in queries
+# > expects the schedule table aliased as `sch` and a %(now)s parameter
+SCHEDULE_END_SQL = """DATE_ADD(
+	DATE_ADD(sch.start_date_time, INTERVAL IFNULL(sch.duration, 0) MINUTE),
+	INTERVAL (CASE WHEN sch.schedule_type = 'Fixed' THEN 0
+		ELSE IFNULL(sch.schedule_expire_in_days, 0) END) DAY
+)"""
+SCHEDULE_STATUS_SQL = """(CASE
+	WHEN %(now)s < sch.start_date_time THEN 'Upcoming'
+	WHEN %(now)s <= {end} THEN 'Ongoing'
+	ELSE 'Completed'
+END)""".format(end=SCHEDULE_END_SQL)
+# end of a candidate's window, schedule end + additional time given
+# > expects the submission table aliased as `sub`
+SUBMISSION_END_SQL = """DATE_ADD(
+	DATE_ADD(sch.start_date_time, INTERVAL (IFNULL(sch.duration, 0) + IFNULL(sub.additional_time_given, 0)) MINUTE),
+	INTERVAL (CASE WHEN sch.schedule_type = 'Fixed' THEN 0
+		ELSE IFNULL(sch.schedule_expire_in_days, 0) END) DAY
+)"""
+# deadline of a submission, a started flexible exam ends duration + additional
+# time after the candidate started, and no later than the window end
+# > SQL form of calculate_end_time, expects `sch` and `sub`
+SUBMISSION_DEADLINE_SQL = """(CASE
+	WHEN sch.schedule_type = 'Flexible' AND sub.status = 'Started' AND sub.exam_started_time IS NOT NULL
+	THEN LEAST(
+		DATE_ADD(sub.exam_started_time, INTERVAL (IFNULL(sch.duration, 0) + IFNULL(sub.additional_time_given, 0)) MINUTE),
+		{end}
+	)
+	ELSE {end}
+END)""".format(end=SUBMISSION_END_SQL)
+# conditions matching each status, kept sargable on start_date_time where possible
+SCHEDULE_STATUS_CONDITIONS = {
+	"Upcoming": "sch.start_date_time > %(now)s",
+	"Ongoing": "sch.start_date_time <= %(now)s AND {end} >= %(now)s".format(end=SCHEDULE_END_SQL),
+	"Completed": "sch.start_date_time <= %(now)s AND {end} < %(now)s".format(end=SCHEDULE_END_SQL)
+}
+
+
+def schedule_window(start_date_time, schedule_type, duration, schedule_expire_in_days=0):
+	"""
+	End time is start time + duration.
+	For flexible schedules the expiry days are added as well.
+	"""
+	start = get_datetime(start_date_time) if start_date_time else now_datetime()
+	end = start + timedelta(minutes=duration or 0)
+	if schedule_type != "Fixed":
+		end += timedelta(days=schedule_expire_in_days or 0)
+
+	return {
+		"start": start,
+		"end": end,
+		"schedule_type": schedule_type,
+		"duration": duration or 0,
+		"expire_in_days": schedule_expire_in_days or 0
+	}
+
+
+def window_from_row(row):
+	return schedule_window(
+		row.get("start_date_time"), row.get("schedule_type"),
+		row.get("duration"), row.get("schedule_expire_in_days")
+	)
+
+
+def get_schedule_window(exam_schedule):
+	"""
+	Get the cached window of a schedule, load it on cache miss.
+	"""
+	def generator():
+		row = frappe.db.get_value("Exam Schedule", exam_schedule, WINDOW_FIELDS, as_dict=True)
+		return window_from_row(row) if row else None
+
+	return frappe.cache().hget(SCHEDULE_WINDOW_CACHE, exam_schedule, generator=generator)
+
+
+def get_schedule_windows(schedules):
+	"""
+	Windows of many schedules, read with one HMGET, cache misses are loaded
+	in one query.
+	returns {schedule: window}
+	"""
+	schedules = list(set(schedules))
+	if not schedules:
+		return {}
+
+	windows = {}
+	missing = []
+	values = frappe.cache().hmget(frappe.cache().make_key(SCHEDULE_WINDOW_CACHE), schedules)
+	for exam_schedule, value in zip(schedules, values):
+		# stored pickled by hset
+		if value:
+			windows[exam_schedule] = pickle.loads(value)
+		else:
+			missing.append(exam_schedule)
+
+	if missing:
+		rows = frappe.get_all(
+			"Exam Schedule", filters={"name": ["in", missing]}, fields=WINDOW_FIELDS
+		)
+		for row in rows:
+			windows[row["name"]] = window_from_row(row)
+			frappe.cache().hset(SCHEDULE_WINDOW_CACHE, row["name"], windows[row["name"]])
+
+	return windows
+
+
+def clear_schedule_window(exam_schedule):
+	frappe.cache().hdel(SCHEDULE_WINDOW_CACHE, exam_schedule)
+
+
+def get_window_status(window, additional_time=0, current_time=None):
+	"""
+	- "Upcoming" if the current time is before the start time.
+	- "Ongoing" if the current time is between the start time and end time.
+	- "Completed" if the current time is after the end time.
+	"""
+	current_time = current_time or now_datetime()
+	end_time = window["end"] + timedelta(minutes=additional_time or 0)
+
+	if current_time < window["start"]:
+		return "Upcoming"
+	elif current_time <= end_time:
+		return "Ongoing"
+
+	return "Completed"
+
+
+def get_schedule_status(exam_schedule, additional_time=0):
+	"""
+	Status of a schedule, see get_window_status.
+	:param additional_time: Optional minutes to adjust the end time for status calculation.
+	"""
+	return get_window_status(get_schedule_window(exam_schedule), additional_time)
+
+
+def get_schedule_end_time(exam_schedule, additional_time=0):
+	"""
+	End time of a schedule as a datetime object.
+	:param additional_time: Optional minutes to adjust the end time.
+	"""
+	return get_schedule_window(exam_schedule)["end"] + timedelta(minutes=additional_time or 0)
+
+
+def calculate_end_time(window, started_time=None, additional_time=0):
+	"""
+	Deadline of a submission, the schedule end time + additional time given.
+	A started flexible exam ends duration + additional time after the
+	candidate started, capped at the former. See SUBMISSION_DEADLINE_SQL.
+	"""
+	end_time = window["end"] + timedelta(minutes=additional_time or 0)
+	if window["schedule_type"] == "Flexible" and started_time:
+		end_time = min(
+			end_time,
+			get_datetime(started_time) + timedelta(minutes=(window["duration"] or 0) + (additional_time or 0))
+		)
+
+	return end_time
+
+
+def classify_schedules(schedules):
+	"""
+	Status of many schedules at once.
+	returns {schedule: status}
+	"""
+	current_time = now_datetime()
+	windows = get_schedule_windows(schedules)
+
+	return {
+		exam_schedule: get_window_status(window, current_time=current_time)
+		for exam_schedule, window in windows.items()
+	}
+
+
+def classify_submissions(submissions):
+	"""
+	Schedule status of many submissions at once, with their additional time.
+	:param submissions: list of dicts with name, exam_schedule and additional_time_given
+	returns {submission: status}
+	"""
+	current_time = now_datetime()
+	windows = get_schedule_windows([subm["exam_schedule"] for subm in submissions])
+
+	return {
+		subm["name"]: get_window_status(
+			windows[subm["exam_schedule"]],
+			subm.get("additional_time_given"),
+			current_time=current_time
+		)
+		for subm in submissions if subm["exam_schedule"] in windows
+	}
@@ -0,0 +1,73 @@
+import threading
+
+import boto3
+from botocore.client import Config
+
+import frappe
+from frappe import _
+
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings, \
+	get_storage_secret
+
+# video storage client registry
+# > one boto3 client per worker process for each storage settings fingerprint,
+#   so its connection pool and TLS sessions are reused across requests and threads.
+#   Clients are thread safe, creating them is not, hence the lock.
+# > settings come from the exam settings cache, a saved settings version
+#   gives a new fingerprint and the old client of the site is dropped
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_bucket():
+	return get_exam_settings().s3_bucket
+
+
+def _fingerprint(settings):
+	return (
+		frappe.local.site, settings.storage_provider, settings.storage_endpoint,
+		settings.aws_key, settings.s3_bucket, settings.version
+	)
+
+
+def _create_client(settings):
+	if not settings.storage_endpoint:
+		frappe.throw(_("Storage endpoint is not configured. Please check Exam Settings."))
+
+	# own session, the default boto3 session is not thread safe
+	return boto3.session.Session().client(
+		's3',
+		endpoint_url=settings.storage_endpoint,
+		aws_access_key_id=settings.aws_key,
+		aws_secret_access_key=get_storage_secret(),
+		config=Config(
+			signature_version='s3v4',
+			# Add connection pooling settings
+			max_pool_connections=50,  # Reuse connections
+			connect_timeout=5,        # Connection timeout
+			read_timeout=60           # Read timeout for uploads
+		)
+	)
+
+
+def get_s3_client():
+	"""
+	Get the S3 client of the current site's storage settings.
+	Built once per worker process and settings version.
+	"""
+	settings = get_exam_settings()
+	fingerprint = _fingerprint(settings)
+	client = _clients.get(fingerprint)
+	if client:
+		return client
+
+	with _clients_lock:
+		client = _clients.get(fingerprint)
+		if not client:
+			client = _create_client(settings)
+			# drop clients of older settings of this site
+			for stale in [fp for fp in _clients if fp[0] == fingerprint[0]]:
+				del _clients[stale]
+			_clients[fingerprint] = client
+
+	return client
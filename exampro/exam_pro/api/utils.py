@@ -1,21 +1,12 @@
 import frappe
 
-from exampro.exam_pro.api.examops import evaluation_values
+from exampro.exam_pro.api.autosubmit import submit_expired_submissions
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
 
 def redirect_to_exams_list():
 	frappe.local.flags.redirect_location = "/my-exams"
 	raise frappe.Redirect
 
-def cleanup_request():
-	"""
-	Clean up resources at the end of a request.
-	This function cleans up any resources that were used during the request.
-	Currently, it:
-	1. Clears the S3 client from frappe.local to prevent memory leaks
-	"""
-	if hasattr(frappe.local, "s3_client"):
-		delattr(frappe.local, "s3_client")
-
 def get_website_context(context):
 	user_roles = frappe.get_roles(frappe.session.user)
 	top_bar_items = []
@@ -281,42 +272,17 @@ def validate_user_email(doc, method=None):
 	if not doc.email:
 		return
 
-	# Get the list of allowed emails from Exam Settings
-	allowed_emails = frappe.get_single("Exam Settings").restrict_user_account_domains or ""
-	allowed_emails = [email.strip() for email in allowed_emails.split(",") if email.strip()]
-	if allowed_emails:
+	# Get the set of allowed email domains from Exam Settings
+	allowed_domains = get_exam_settings().allowed_domains
+	if allowed_domains:
 		# Check if the user's email domain is in the allowed list
 		user_email_domain = doc.email.split('@')[-1]
-		if user_email_domain not in allowed_emails:
+		if user_email_domain.lower() not in allowed_domains:
 			frappe.throw(f"Email domain '{user_email_domain}' is not allowed.")
 
 def submit_candidate_pending_exams(member=None):
 	"""
 	Submit any pending exams for the user.
-	This is useful for exams that are not submitted automatically.
+	Expired exams are closed by the scheduled sweep, this runs it for one candidate.
 	"""
-	submissions = frappe.get_all(
-		"Exam Submission",
-		{
-			"candidate": member or frappe.session.user,
-			"status": ["in", ["Registered", "Started"]]
-		}, 
-		["name", "exam_schedule", "status", "additional_time_given"],
-		ignore_permissions=True
-	)
-	for submission in submissions:
-		sched = frappe.get_doc("Exam Schedule", submission["exam_schedule"], ignore_permissions=True)
-		if sched.get_status(additional_time=submission["additional_time_given"]) == "Completed":
-			doc = frappe.get_doc("Exam Submission", submission["name"], ignore_permissions=True)
-			if doc.status == "Started":
-				doc.status = "Submitted"
-			elif doc.status == "Registered":
-				doc.status = "Not Attempted"
-			total_marks, evaluation_status, result_status = evaluation_values(
-				doc.exam, doc.submitted_answers
-			)
-			doc.total_marks = total_marks
-			doc.evaluation_status = evaluation_status
-			doc.result_status = result_status
-			doc.save(ignore_permissions=True)
-			frappe.db.commit()
\ No newline at end of file
+	return submit_expired_submissions(candidate=member or frappe.session.user)
@@ -0,0 +1,189 @@
+import json
+from io import BytesIO
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from exampro.exam_pro.api.storage import get_bucket, get_s3_client
+from exampro.exam_pro.api.videoindex import clear_video_chunks
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
+
+# compaction of proctoring videos
+# > once an exam is over, the webm chunks of a submission are concatenated
+#   into segments of up to SEGMENT_CHUNKS chunks, <submission>/segments/<ts>.webm,
+#   and the chunk objects are deleted
+# > <submission>/manifest.json lists the chunks of every segment with their
+#   timestamp, byte offset and length. Each chunk is a standalone webm file,
+#   players fetch it from its segment with a Range request
+# > VIDEO_MANIFEST:<submission> caches the manifest
+# > failed compactions are counted in video_compaction_attempts, submissions
+#   with fewer attempts go first and after MAX_COMPACT_ATTEMPTS they are left
+#   alone, so failing submissions don't hold up the rest
+SEGMENT_PREFIX = "segments"
+MANIFEST_NAME = "manifest.json"
+SEGMENT_CHUNKS = 60
+VIDEO_MANIFEST_CACHE = "video_manifest"
+VIDEO_MANIFEST_TTL = 60 * 60
+COMPACT_AFTER_MINUTES = 30
+COMPACT_BATCH_SIZE = 20
+MAX_COMPACT_ATTEMPTS = 3
+DELETE_BATCH_SIZE = 1000
+CLOSED_STATUSES = ("Submitted", "Terminated", "Not Attempted")
+
+
+def list_video_chunks(exam_submission):
+	"""
+	Chunk objects of a submission in timestamp order, [(ts, key)]
+	"""
+	s3_client = get_s3_client()
+	chunks = []
+	paginator = s3_client.get_paginator('list_objects_v2')
+	for page in paginator.paginate(Bucket=get_bucket(), Prefix="{}/".format(exam_submission)):
+		for obj in page.get('Contents', []):
+			name = obj['Key'][len(exam_submission) + 1:]
+			if "/" in name or not name.endswith('.webm'):
+				continue
+			chunks.append((name.rsplit(".", 1)[0], obj['Key']))
+
+	chunks.sort(key=lambda chunk: int(chunk[0]))
+	return chunks
+
+
+def build_segment(chunks):
+	"""
+	Download the chunks and concatenate them.
+	returns (segment bytes, [{ts, offset, length}])
+	"""
+	s3_client = get_s3_client()
+	bucket = get_bucket()
+	segment = BytesIO()
+	entries = []
+	for ts, key in chunks:
+		body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+		entries.append({"ts": ts, "offset": segment.tell(), "length": len(body)})
+		segment.write(body)
+
+	return segment.getvalue(), entries
+
+
+def compact_videos(exam_submission):
+	"""
+	Merge the video chunks of a submission into segments with a manifest
+	and delete the chunks.
+	"""
+	s3_client = get_s3_client()
+	bucket = get_bucket()
+	chunks = list_video_chunks(exam_submission)
+	manifest = {"segments": []}
+	for idx in range(0, len(chunks), SEGMENT_CHUNKS):
+		group = chunks[idx:idx + SEGMENT_CHUNKS]
+		body, entries = build_segment(group)
+		key = "{}/{}/{}.webm".format(exam_submission, SEGMENT_PREFIX, group[0][0])
+		s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='video/webm')
+		manifest["segments"].append({"key": key, "chunks": entries})
+
+	if chunks:
+		s3_client.put_object(
+			Bucket=bucket,
+			Key="{}/{}".format(exam_submission, MANIFEST_NAME),
+			Body=json.dumps(manifest).encode(),
+			ContentType='application/json'
+		)
+
+	frappe.db.set_value("Exam Submission", exam_submission, "video_compacted", 1, update_modified=False)
+	frappe.db.commit()
+
+	# chunks are dropped only after the segments and the flag are saved
+	for idx in range(0, len(chunks), DELETE_BATCH_SIZE):
+		s3_client.delete_objects(Bucket=bucket, Delete={
+			"Objects": [{"Key": key} for _, key in chunks[idx:idx + DELETE_BATCH_SIZE]],
+			"Quiet": True
+		})
+	clear_video_chunks(exam_submission)
+	frappe.cache().delete_value("{}:{}".format(VIDEO_MANIFEST_CACHE, exam_submission))
+
+	return len(chunks)
+
+
+def compact_finished_videos():
+	"""
+	Scheduled job, compact videos of submissions closed a while ago.
+	"""
+	if not get_exam_settings().compact_videos:
+		return
+
+	submissions = frappe.db.sql("""
+		SELECT sub.name
+		FROM `tabExam Submission` sub
+		INNER JOIN `tabExam` ex ON ex.name = sub.exam
+		WHERE sub.status IN %(statuses)s
+		AND sub.video_compacted = 0
+		AND sub.video_compaction_attempts < %(max_attempts)s
+		AND ex.enable_video_proctoring = 1
+		AND sub.modified < %(before)s
+		ORDER BY sub.video_compaction_attempts, sub.modified
+		LIMIT %(limit)s
+	""", {
+		"statuses": CLOSED_STATUSES,
+		"max_attempts": MAX_COMPACT_ATTEMPTS,
+		"before": add_to_date(now_datetime(), minutes=-COMPACT_AFTER_MINUTES),
+		"limit": COMPACT_BATCH_SIZE
+	}, pluck=True)
+
+	for exam_submission in submissions:
+		try:
+			compact_videos(exam_submission)
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(
+				"Video compaction failed for {}".format(exam_submission), "compact_finished_videos error"
+			)
+			frappe.db.sql("""
+				UPDATE `tabExam Submission`
+				SET video_compaction_attempts = video_compaction_attempts + 1
+				WHERE name = %s
+			""", exam_submission)
+			frappe.db.commit()
+
+
+def get_video_manifest(exam_submission):
+	"""
+	Segment manifest of a compacted submission, None if it was not compacted
+	"""
+	def generator():
+		if not frappe.db.get_value("Exam Submission", exam_submission, "video_compacted"):
+			return {}
+		try:
+			body = get_s3_client().get_object(
+				Bucket=get_bucket(), Key="{}/{}".format(exam_submission, MANIFEST_NAME)
+			)['Body'].read()
+		except Exception:
+			# compacted submission without videos
+			return {}
+		return json.loads(body)
+
+	key = "{}:{}".format(VIDEO_MANIFEST_CACHE, exam_submission)
+	manifest = frappe.cache().get_value(key)
+	if manifest is None:
+		manifest = generator()
+		frappe.cache().set_value(key, manifest, expires_in_sec=VIDEO_MANIFEST_TTL)
+
+	return manifest or None
+
+
+def get_video_segments(exam_submission, ttl):
+	"""
+	Segments of a compacted submission with presigned urls, [] if not compacted
+	"""
+	manifest = get_video_manifest(exam_submission)
+	if not manifest:
+		return []
+
+	s3_client = get_s3_client()
+	bucket = get_bucket()
+	return [{
+		"url": s3_client.generate_presigned_url(
+			'get_object', Params={'Bucket': bucket, 'Key': segment["key"]}, ExpiresIn=ttl
+		),
+		"chunks": segment["chunks"]
+	} for segment in manifest["segments"]]
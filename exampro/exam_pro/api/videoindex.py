@@ -0,0 +1,145 @@
+import json
+import time
+
+import frappe
+from redis.exceptions import WatchError
+
+# index of uploaded proctoring video chunks
+# > VIDEO_CHUNKS:<submission> list of {ts, key, url, expires} in upload order,
+#   appended by upload_video, so listing never needs an S3 LIST call
+# > VIDEO_CHUNKS_BUILT:<submission> marks the list as complete, it is rebuilt
+#   from S3 once when missing (index expired, chunks uploaded before the index)
+# > uploads are always appended, also while the index is being rebuilt, and
+#   the rebuild merges the S3 listing with them, so no chunk is left out
+# > list cursor is the list length, clients ask for chunks after it
+# > VIDEO_UPLOAD_SLOTS:<submission> hash of object key -> index entry for the
+#   presigned uploads handed to the browser, moved to the index on confirm
+VIDEO_CHUNKS_CACHE = "video_chunks"
+VIDEO_CHUNKS_BUILT_CACHE = "video_chunks_built"
+VIDEO_UPLOAD_SLOTS_CACHE = "video_upload_slots"
+# presigned urls expiring within this many seconds are signed again on read
+URL_RENEW_MARGIN = 5 * 60
+
+
+def _keys(exam_submission):
+	return (
+		frappe.cache().make_key("{}:{}".format(VIDEO_CHUNKS_CACHE, exam_submission)),
+		frappe.cache().make_key("{}:{}".format(VIDEO_CHUNKS_BUILT_CACHE, exam_submission))
+	)
+
+
+def chunk_entry(key, url, ttl):
+	"""
+	Index entry of an uploaded object, timestamp is the file name without extension
+	"""
+	return {
+		"ts": key.split("/")[-1].rsplit(".", 1)[0],
+		"key": key,
+		"url": url,
+		"expires": int(time.time()) + int(ttl)
+	}
+
+
+def is_index_built(exam_submission):
+	return bool(frappe.cache().get(_keys(exam_submission)[1]))
+
+
+def add_video_chunk(exam_submission, entry, ttl):
+	"""
+	Append an uploaded chunk to the index.
+	"""
+	list_key, built_key = _keys(exam_submission)
+	pipe = frappe.cache().pipeline()
+	pipe.rpush(list_key, json.dumps(entry))
+	pipe.expire(list_key, ttl)
+	pipe.expire(built_key, ttl)
+	pipe.execute()
+
+
+def set_video_chunks(exam_submission, entries, ttl):
+	"""
+	Merge the given entries with the chunks appended meanwhile, in timestamp
+	order, and mark the index complete.
+	"""
+	list_key, built_key = _keys(exam_submission)
+	with frappe.cache().pipeline() as pipe:
+		while True:
+			try:
+				# retried if a chunk is appended between the read and the write
+				pipe.watch(list_key)
+				merged = {entry["key"]: entry for entry in entries}
+				for row in pipe.lrange(list_key, 0, -1):
+					entry = json.loads(row)
+					merged[entry["key"]] = entry
+				merged = sorted(merged.values(), key=lambda entry: int(entry["ts"]))
+
+				pipe.multi()
+				pipe.delete(list_key)
+				if merged:
+					pipe.rpush(list_key, *[json.dumps(entry) for entry in merged])
+					pipe.expire(list_key, ttl)
+				pipe.set(built_key, 1, ex=ttl)
+				pipe.execute()
+				break
+			except WatchError:
+				continue
+
+
+def get_video_chunks(exam_submission, since=0):
+	"""
+	Chunks uploaded after cursor `since`.
+	returns (entries, cursor), entries from the start if the cursor is past the end
+	"""
+	list_key = _keys(exam_submission)[0]
+	pipe = frappe.cache().pipeline()
+	pipe.llen(list_key)
+	pipe.lrange(list_key, since, -1)
+	length, rows = pipe.execute()
+	if since > length:
+		since = 0
+		rows = frappe.cache().lrange(list_key, 0, -1)
+
+	return [json.loads(row) for row in rows], since + len(rows)
+
+
+def update_video_chunk(exam_submission, index, entry):
+	"""
+	Store a renewed entry back at its position.
+	"""
+	try:
+		frappe.cache().lset(_keys(exam_submission)[0], index, json.dumps(entry))
+	except Exception:
+		# index was rebuilt in between, it is renewed again on next read
+		pass
+
+
+def _slots_key(exam_submission):
+	return frappe.cache().make_key("{}:{}".format(VIDEO_UPLOAD_SLOTS_CACHE, exam_submission))
+
+
+def add_upload_slots(exam_submission, entries, ttl):
+	"""
+	Remember the chunks the browser was allowed to upload.
+	"""
+	slots_key = _slots_key(exam_submission)
+	pipe = frappe.cache().pipeline()
+	pipe.hset(slots_key, mapping={entry["key"]: json.dumps(entry) for entry in entries})
+	pipe.expire(slots_key, ttl)
+	pipe.execute()
+
+
+def pop_upload_slot(exam_submission, key):
+	"""
+	Take an issued upload slot, None if it was never issued or already confirmed.
+	"""
+	slots_key = _slots_key(exam_submission)
+	pipe = frappe.cache().pipeline()
+	pipe.hget(slots_key, key)
+	pipe.hdel(slots_key, key)
+	entry, removed = pipe.execute()
+
+	return json.loads(entry) if entry and removed else None
+
+
+def clear_video_chunks(exam_submission):
+	frappe.cache().delete(*_keys(exam_submission), _slots_key(exam_submission))
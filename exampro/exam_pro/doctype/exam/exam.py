@@ -6,6 +6,8 @@ import random
 import frappe
 from frappe.model.document import Document
 from exampro.exam_pro.doctype.exam_settings.exam_settings import validate_video_settings
+from exampro.exam_pro.api.examops import ANSWER_KEY_FIELDS, answer_key_entry, set_answer_key
+from exampro.exam_pro.api.candidate_exams import LISTED_EXAM_FIELDS, clear_submission_candidate_exams
 
 RE_SLUG_NOTALLOWED = re.compile("[^a-z0-9]+")
 
@@ -102,6 +104,7 @@ class Exam(Document):
 		
 		total_qs = 0
 		total_marks = 0
+		self._answer_key = {}
 		for cat in self.select_questions:
 			picked_questions = get_random_questions(
 				cat.question_category, cat.mark_per_question,
@@ -110,8 +113,9 @@ class Exam(Document):
 			for qs in picked_questions:
 				qs_data = frappe.db.get_value(
 					"Exam Question", qs["name"],
-					["question", "mark", "type"], as_dict=True
+					["question"] + ANSWER_KEY_FIELDS, as_dict=True
 				)
+				self._answer_key[qs["name"]] = answer_key_entry(qs_data)
 				self.append("added_questions", {
 						"exam_question": qs["name"],
 						"question": qs_data["question"],
@@ -125,6 +129,15 @@ class Exam(Document):
 		self.total_questions = total_qs
 		self.total_marks = total_marks
 
+	def on_update(self):
+		# answer key of the finalised question list
+		if getattr(self, "_answer_key", None) is not None:
+			set_answer_key(self.name, self._answer_key)
+
+		# exam details are part of the candidates' exam listings
+		if any(self.has_value_changed(field) for field in LISTED_EXAM_FIELDS):
+			clear_submission_candidate_exams({"exam": self.name})
+
 	def validate_weightage_table(self):
 		for cat in self.select_questions:
 			if not cat.mark_per_question or not cat.no_of_questions:
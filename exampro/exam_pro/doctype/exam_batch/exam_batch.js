@@ -17,34 +17,48 @@ function show_bulk_add_users_dialog(frm) {
 			{
 				fieldname: 'user_emails',
 				fieldtype: 'Text',
-				label: __('User Emails (Comma Separated)'),
-				reqd: 1,
-				description: __('Enter comma separated email addresses')
+				label: __('User Emails'),
+				description: __('Enter comma or newline separated email addresses')
+			},
+			{
+				fieldname: 'csv_file',
+				fieldtype: 'Attach',
+				label: __('CSV File'),
+				description: __('Or attach a csv with email and an optional full name per row')
 			}
 		],
 		primary_action_label: __('Add Users'),
 		primary_action: function() {
 			const values = dialog.get_values();
-			if (!values.user_emails) {
-				frappe.msgprint(__('Please enter email addresses'));
+			if (!values.user_emails && !values.csv_file) {
+				frappe.msgprint(__('Please enter email addresses or attach a csv file'));
 				return;
 			}
 			
-			// Show loading indicator
-			frappe.show_progress(__('Adding Users'), 0, 100);
+			// Import runs in the background, the result comes back as a realtime event
+			frappe.realtime.off('exam_batch_import');
+			frappe.realtime.on('exam_batch_import', function(data) {
+				if (data.exam_batch !== frm.doc.name) return;
+				frappe.realtime.off('exam_batch_import');
+				frappe.hide_progress();
+				frappe.msgprint(__(`${data.added} users added successfully. ${data.skipped} users skipped. ${data.users_created} new users created, ${data.submissions} exam submissions created.`));
+				frm.reload_doc();
+			});
 			
 			// Call server-side method to add users
 			frappe.call({
 				method: 'exampro.exam_pro.doctype.exam_batch.exam_batch.bulk_add_users',
 				args: {
 					batch_name: frm.doc.name,
-					emails: values.user_emails
+					emails: values.user_emails,
+					file_url: values.csv_file
 				},
 				callback: function(r) {
-					frappe.hide_progress();
-					if (r.message) {
-						frappe.msgprint(__(`${r.message.added} users added successfully. ${r.message.skipped} users skipped.`));
-						frm.reload_doc();
+					if (r.message && r.message.queued) {
+						frappe.show_alert({
+							message: __('Adding users in the background'),
+							indicator: 'blue'
+						});
 					}
 				}
 			});
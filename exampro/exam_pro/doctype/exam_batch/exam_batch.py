@@ -3,63 +3,40 @@
 
 import frappe
 from frappe.model.document import Document
-import re
+
+from exampro.exam_pro.api.batchimport import enqueue_batch_import
 
 class ExamBatch(Document):
 	pass
 
 @frappe.whitelist()
-def bulk_add_users(batch_name, emails):
+def bulk_add_users(batch_name, emails=None, file_url=None):
 	"""
-	Add multiple users to an Exam Batch based on a comma-separated list of email addresses.
-	If user doesn't exist, create a new user with Exam Candidate role.
+	Add multiple users to an Exam Batch from a list of email addresses or a
+	csv file (email, optional full name). Users that don't exist are created
+	with Exam Candidate role.
+	The import runs as a background job, progress is published on the batch form
+	and the result is sent to the user as an `exam_batch_import` event.
 	
 	Args:
 		batch_name (str): Name of the Exam Batch
-		emails (str): Comma-separated email addresses
+		emails (str): Comma or newline separated email addresses
+		file_url (str): url of an uploaded csv file
 	
 	Returns:
-		dict: Count of added and skipped users
+		dict: {"queued": True}
 	"""
-	if not frappe.has_permission("Exam Batch", "write"):
+	if not frappe.has_permission("Exam Batch", "write", batch_name):
 		frappe.throw("Not permitted to add users to this batch")
-	
-	email_list = [email.strip() for email in emails.split(',') if email.strip()]
-	added_count = 0
-	skipped_count = 0
-	
-	# Email validation regex pattern
-	email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-	
-	for email in email_list:
-		# Skip invalid email addresses
-		if not re.match(email_pattern, email):
-			frappe.log_error(f"Invalid email format: {email}", "Bulk Add Users")
-			skipped_count += 1
-			continue
-		
-		if frappe.db.exists("User", email):
-			continue
-		
-		# Check if user is already added to this batch
-		existing = frappe.db.exists("Exam Batch User", {
-			"exam_batch": batch_name,
-			"candidate": email
-		})
-		
-		if existing:
-			skipped_count += 1
-			continue
-		
-		# Add user to batch
-		try:
-			batch_user = frappe.new_doc("Exam Batch User")
-			batch_user.exam_batch = batch_name
-			batch_user.candidate = email
-			batch_user.insert(ignore_permissions=True)
-			added_count += 1
-		except Exception as e:
-			frappe.log_error(f"Failed to add {email} to batch: {str(e)}", "Bulk Add Users")
-			skipped_count += 1
-	
-	return {"added": added_count, "skipped": skipped_count}
+
+	if not (emails or file_url):
+		frappe.throw("Please enter email addresses or attach a csv file")
+
+	if file_url:
+		file_doc = frappe.get_doc("File", {"file_url": file_url})
+		if not frappe.has_permission("File", doc=file_doc):
+			frappe.throw("Not permitted to read this file")
+
+	enqueue_batch_import(batch_name, emails=emails, file_url=file_url)
+
+	return {"queued": True}
@@ -3,8 +3,9 @@
 
 import frappe
 from frappe.model.document import Document
-from datetime import datetime
-from frappe.utils import now
+
+from exampro.exam_pro.api.batchimport import get_auto_assign_schedules
+from exampro.exam_pro.api.provisioning import provision_submissions
 
 
 class ExamBatchUser(Document):
@@ -19,57 +20,12 @@ class ExamBatchUser(Document):
 		Check for upcoming exam schedules with this batch and auto_assign_batch_users enabled,
 		and create Exam Submission entries accordingly
 		"""
-		# Get current datetime for comparison
-		current_time = datetime.fromisoformat(now().split(".")[0])
-		
-		# Get all exam schedules with auto_assign_batch_users enabled and upcoming
-		schedules = frappe.get_all("Exam Schedule",
-			filters={
-				"auto_assign_batch_users": 1,
-				"start_date_time": (">", current_time)  # Only upcoming schedules
-			},
-			fields=["name", "exam"]
-		)
-		
-		# Filter schedules to only include those that have this batch
-		valid_schedules = []
-		for schedule in schedules:
-			# Check if this batch is included in the schedule's batch_assignments
-			batch_assigned = frappe.get_all("Schedule Batch Assignment",
-				filters={
-					"parent": schedule.name,
-					"batch_name": self.exam_batch
-				},
-				fields=["name"],
-				limit=1
-			)
-			
-			if batch_assigned:
-				valid_schedules.append(schedule)
-		
-		schedules = valid_schedules
-		
 		submissions_created = 0
-		for schedule in schedules:
-			# Check if a submission already exists for this candidate and schedule
-			existing = frappe.get_all("Exam Submission", 
-				filters={
-					"exam_schedule": schedule.name,
-					"candidate": self.candidate
-				},
-				limit=1
+		for exam_schedule in get_auto_assign_schedules(self.exam_batch):
+			submissions_created += provision_submissions(
+				exam_schedule, [(self.candidate, self.exam_batch)],
+				publish_progress=False, commit=False
 			)
-			
-			if not existing:
-				# Create new submission
-				submission = frappe.new_doc("Exam Submission")
-				submission.exam_schedule = schedule.name
-				submission.exam = schedule.exam
-				submission.candidate = self.candidate
-				submission.exam_batch = self.exam_batch
-				submission.status = "Registered"
-				submission.insert(ignore_permissions=True)
-				submissions_created += 1
 		
 		if submissions_created > 0:
 			frappe.msgprint(f"Created {submissions_created} exam submissions for the newly added batch user")
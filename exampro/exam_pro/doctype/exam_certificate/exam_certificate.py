@@ -4,6 +4,8 @@
 import frappe
 from frappe.model.document import Document
 
+from exampro.exam_pro.api.candidate_exams import clear_candidate_exams
+
 
 class ExamCertificate(Document):
 
@@ -17,6 +19,12 @@ class ExamCertificate(Document):
     def after_insert(self):
         self.send_email()
 
+    def on_update(self):
+        clear_candidate_exams([self.candidate])
+
+    def on_trash(self):
+        clear_candidate_exams([self.candidate])
+
     def can_send_certificate(self):
         has_certification = frappe.db.get_value("Exam", self.exam, "enable_certification")
         assert has_certification, "Exam does not have certification enabled."
@@ -139,3 +147,6 @@ class ExamCertificate(Document):
         }
 
 
+def on_doctype_update():
+    # certificates are looked up per submission in exam listings
+    frappe.db.add_index("Exam Certificate", ["exam_submission"])
@@ -0,0 +1,8 @@
+// Copyright (c) 2025, Labeeb Mattra and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Exam Daily Rollup", {
+// 	refresh(frm) {
+
+// 	},
+// });
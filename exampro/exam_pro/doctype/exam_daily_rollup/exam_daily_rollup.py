@@ -0,0 +1,14 @@
+# Copyright (c) 2025, Labeeb Mattra and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ExamDailyRollup(Document):
+	pass
+
+
+def on_doctype_update():
+	# rollups are replaced per schedule and read per date window
+	frappe.db.add_index("Exam Daily Rollup", ["exam_schedule", "date"])
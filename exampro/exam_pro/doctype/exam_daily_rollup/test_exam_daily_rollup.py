@@ -0,0 +1,133 @@
+# Copyright (c) 2025, Labeeb Mattra and Contributors
+# See license.txt
+
+from collections import defaultdict
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, flt, getdate, now_datetime
+
+from exampro.exam_pro.api.rollup import ROLLUP_FIELDS, SCORE_BINS, get_touched_buckets, \
+	rebuild_rollups
+
+TEST_EXAM = "_Test Rollup Exam"
+TEST_SCHEDULE = "_Test Rollup Schedule"
+
+# (creation, started, submitted, status, total_marks, result_status)
+SUBMISSIONS = [
+	("2001-01-01 09:00:00", None, None, "Registered", 0, "NA"),
+	("2001-01-01 09:05:00", "2001-01-02 10:00:00", None, "Started", 0, "NA"),
+	("2001-01-01 09:10:00", "2001-01-02 10:00:00", "2001-01-02 11:00:00", "Submitted", 0, "Failed"),
+	("2001-01-01 09:15:00", "2001-01-02 10:00:00", "2001-01-02 11:00:00", "Submitted", 35, "Failed"),
+	("2001-01-01 09:20:00", "2001-01-02 10:00:00", "2001-01-03 00:10:00", "Submitted", 60, "Passed"),
+	("2001-01-02 08:00:00", "2001-01-02 10:00:00", "2001-01-03 00:20:00", "Submitted", 100, "Passed"),
+	("2001-01-02 08:30:00", None, None, "Not Attempted", 0, "NA"),
+]
+
+
+def expected_rollups():
+	"""
+	Rollup counters worked out in python from the raw submissions
+	"""
+	rows = frappe.get_all(
+		"Exam Submission",
+		filters={"exam_schedule": TEST_SCHEDULE},
+		fields=["creation", "modified", "exam_started_time", "exam_submitted_time",
+			"status", "total_marks", "result_status"]
+	)
+	res = defaultdict(lambda: dict.fromkeys(ROLLUP_FIELDS, 0))
+	for row in rows:
+		res[getdate(row.creation)]["registered"] += 1
+		if row.exam_started_time:
+			res[getdate(row.exam_started_time)]["started"] += 1
+		if row.status != "Submitted":
+			continue
+		day = res[getdate(row.exam_submitted_time or row.modified)]
+		marks = flt(row.total_marks)
+		day["submitted"] += 1
+		day["passed"] += 1 if row.result_status == "Passed" else 0
+		day["score_sum"] += marks
+		for idx in range(len(SCORE_BINS) - 1):
+			above_lower = marks >= SCORE_BINS[idx] if idx == 0 else marks > SCORE_BINS[idx]
+			if above_lower and marks <= SCORE_BINS[idx + 1]:
+				day["score_bin_{}".format(idx)] += 1
+
+	return dict(res)
+
+
+def stored_rollups():
+	rows = frappe.get_all(
+		"Exam Daily Rollup",
+		filters={"exam_schedule": TEST_SCHEDULE},
+		fields=["date"] + ROLLUP_FIELDS
+	)
+	return {
+		getdate(row.date): {field: flt(row[field]) for field in ROLLUP_FIELDS} for row in rows
+	}
+
+
+class TestExamDailyRollup(FrappeTestCase):
+	def setUp(self):
+		for idx, (creation, started, submitted, status, marks, result) in enumerate(SUBMISSIONS):
+			doc = frappe.get_doc({
+				"doctype": "Exam Submission",
+				"exam": TEST_EXAM,
+				"exam_schedule": TEST_SCHEDULE,
+				"candidate": "Administrator",
+				"status": status,
+				"exam_started_time": started,
+				"exam_submitted_time": submitted,
+				"total_marks": marks,
+				"result_status": result
+			})
+			doc.name = "_test-rollup-{}".format(idx)
+			doc.creation = creation
+			doc.modified = submitted or started or creation
+			doc.db_insert()
+
+		# rows are checked and rolled back by the test
+		self.commit = patch.object(frappe.db, "commit")
+		self.commit.start()
+
+	def tearDown(self):
+		self.commit.stop()
+		frappe.db.rollback()
+
+	def test_rollups_match_submissions(self):
+		rebuild_rollups({TEST_SCHEDULE: None})
+
+		expected = expected_rollups()
+		self.assertEqual(stored_rollups(), expected)
+		self.assertEqual(sum(day["registered"] for day in expected.values()), len(SUBMISSIONS))
+		self.assertEqual(
+			[sum(day["score_bin_{}".format(idx)] for day in expected.values()) for idx in range(5)],
+			[1, 1, 1, 0, 1]
+		)
+
+	def test_only_touched_buckets_are_rebuilt(self):
+		rebuild_rollups({TEST_SCHEDULE: None})
+		frappe.db.sql("""
+			UPDATE `tabExam Daily Rollup` SET registered = 999
+			WHERE exam_schedule = %s AND date = '2001-01-01'
+		""", TEST_SCHEDULE)
+
+		since = add_to_date(now_datetime(), minutes=-1)
+		# the started candidate submits on the 2nd
+		frappe.db.sql("""
+			UPDATE `tabExam Submission`
+			SET status = 'Submitted', exam_submitted_time = '2001-01-02 12:00:00',
+				total_marks = 50, result_status = 'Passed', modified = %s
+			WHERE name = '_test-rollup-1'
+		""", now_datetime())
+
+		buckets = get_touched_buckets(since)
+		self.assertEqual(buckets[TEST_SCHEDULE], {getdate("2001-01-01"), getdate("2001-01-02")})
+
+		# only the submitted day, the registration day keeps its stale row
+		rebuild_rollups({TEST_SCHEDULE: {getdate("2001-01-02")}})
+		stored = stored_rollups()
+		expected = expected_rollups()
+		self.assertEqual(stored[getdate("2001-01-02")], expected[getdate("2001-01-02")])
+		self.assertEqual(stored[getdate("2001-01-03")], expected[getdate("2001-01-03")])
+		self.assertEqual(stored[getdate("2001-01-01")]["registered"], 999)
@@ -3,37 +3,20 @@
 
 import frappe
 from frappe.model.document import Document
+from frappe.utils import get_datetime
 
+from exampro.exam_pro.api.messages import set_last_message_marker
 from exampro.exam_pro.doctype.exam_submission.exam_submission import terminate_exam
 
 
 class ExamMessages(Document):
 
 	def after_insert(self):
+		set_last_message_marker(self.exam_submission, self.creation)
+
 		# trigger webocket msg to proctor and candidate
-		# chat_message = {
-		# 		"creation": self.timestamp,
-		# 		"exam_submission": self.exam_submission,
-		# 		"message": self.message,
-		# 		"type_of_message": self.type_of_message
-		# }
-		# frappe.publish_realtime(
-		# 	event='newcandidatemsg',
-		# 	message=chat_message,
-		# 	user=frappe.db.get_value(
-		# 		"Exam Submission", self.exam_submission, "candidate"
-		# ))
+		self.publish_message()
 
-		# if there is an assigned proctor, send a msg
-		# proctor = frappe.db.get_value(
-		# 		"Exam Submission", self.exam_submission, "assigned_proctor"
-		# )
-		# if proctor:
-		# 	frappe.publish_realtime(
-		# 		event='newproctormsg',
-		# 		message=chat_message,
-		# 		user=proctor
-		# 	)
 		# update critical warning error
 		wc = frappe.db.get_value("Exam Submission", self.exam_submission, "warning_count") or 0
 		new_wc = wc + 1
@@ -47,3 +30,38 @@ class ExamMessages(Document):
 			if new_wc > max_warning:
 				terminate_exam(self.exam_submission, check_permission=False)
 
+	def publish_message(self):
+		"""
+		Push the message to the candidate and the assigned proctor.
+		Clients fall back to polling exam_messages if realtime is unavailable.
+		"""
+		candidate, proctor = frappe.db.get_value(
+			"Exam Submission", self.exam_submission, ["candidate", "assigned_proctor"]
+		)
+		chat_message = {
+			"creation": get_datetime(self.creation).isoformat(),
+			"exam_submission": self.exam_submission,
+			"from": self.get("from"),
+			"message": self.message,
+			"type_of_message": self.type_of_message
+		}
+		frappe.publish_realtime(
+			event="newcandidatemsg",
+			message=chat_message,
+			user=candidate,
+			after_commit=True
+		)
+
+		# if there is an assigned proctor, send a msg
+		if proctor:
+			frappe.publish_realtime(
+				event="newproctormsg",
+				message=chat_message,
+				user=proctor,
+				after_commit=True
+			)
+
+
+def on_doctype_update():
+	# messages are always read per submission in creation order
+	frappe.db.add_index("Exam Messages", ["exam_submission", "creation"])
@@ -4,6 +4,8 @@
 import frappe
 from frappe.model.document import Document
 
+from exampro.exam_pro.api.examops import clear_answer_keys
+
 def get_correct_options(question):
 	correct_option_fields = [
 		"is_correct_1",
@@ -47,3 +49,10 @@ class ExamQuestion(Document):
 			validate_duplicate_options(self)
 			validate_correct_options(self)
 
+	def on_update(self):
+		# correct options or marks might have changed
+		clear_answer_keys()
+
+	def on_trash(self):
+		clear_answer_keys()
+
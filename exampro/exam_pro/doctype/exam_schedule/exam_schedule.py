@@ -6,10 +6,15 @@ from dateutil.parser import parse
 import frappe
 import base64
 
-from frappe.utils import now
 from frappe.model.document import Document
-from exampro.exam_pro.api.utils import submit_candidate_pending_exams
-from exampro.exam_pro.api.examops import evaluation_values
+from exampro.exam_pro.api.allocator import clear_examiner_pool, refresh_examiner_pool
+from exampro.exam_pro.api.autosubmit import submit_expired_submissions
+from exampro.exam_pro.api.candidate_exams import clear_submission_candidate_exams
+from exampro.exam_pro.api.provisioning import enqueue_batch_submissions
+from exampro.exam_pro.api.regrade import regrade_submissions
+from exampro.exam_pro.api.rollup import clear_rollups
+from exampro.exam_pro.api.schedulewindow import WINDOW_FIELDS, clear_schedule_window, \
+	get_schedule_status, get_window_status, schedule_window
 
 
 class ExamSchedule(Document):
@@ -33,7 +38,17 @@ class ExamSchedule(Document):
 			)
 
 	def on_trash(self):
+		clear_submission_candidate_exams({"exam_schedule": self.name})
 		frappe.db.delete("Exam Submission", {"exam_schedule": self.name})
+		clear_schedule_window(self.name)
+		clear_examiner_pool(self.name)
+		clear_rollups(self.name)
+
+	def on_update(self):
+		clear_schedule_window(self.name)
+		refresh_examiner_pool(self.name)
+		if any(self.has_value_changed(field) for field in WINDOW_FIELDS + ["exam"]):
+			clear_submission_candidate_exams({"exam_schedule": self.name})
 
 	def before_save(self):
 		question_type = frappe.db.get_value("Exam", self.exam, "question_type")
@@ -75,61 +90,13 @@ class ExamSchedule(Document):
 	def create_exam_submissions_for_batch_users(self):
 		"""
 		Fetch all users from the selected batches and create Exam Submission entries for each user
-		while avoiding duplicates
+		while avoiding duplicates.
+		Submissions are created in bulk by a background job once this schedule is saved.
 		"""
-		# Check for existing submissions to avoid duplicates
-		existing_submissions = frappe.get_all("Exam Submission", 
-			filters={"exam_schedule": self.name},
-			fields=["candidate"]
+		enqueue_batch_submissions(self.name)
+		frappe.msgprint(
+			"Exam submissions for users in the assigned batches are being created in the background."
 		)
-		
-		existing_candidates = set([s.candidate for s in existing_submissions])
-		
-		submissions_created = 0
-		batch_counts = {}
-		
-		# Process each batch in the batch_assignments table
-		for batch_assignment in self.batch_assignments:
-			batch_id = batch_assignment.batch_name
-			
-			# Get all users from the current batch
-			batch_users = frappe.get_all("Exam Batch User", 
-				filters={"exam_batch": batch_id},
-				fields=["candidate"]
-			)
-			
-			if not batch_users:
-				frappe.msgprint(f"No users found in batch {batch_id}. No submissions created for this batch.")
-				continue
-			
-			batch_counts[batch_id] = 0
-			
-			for user in batch_users:
-				candidate = user.candidate
-				
-				# Skip if submission already exists for this candidate
-				if candidate in existing_candidates:
-					continue
-					
-				# Create new submission
-				submission = frappe.new_doc("Exam Submission")
-				submission.exam_schedule = self.name
-				submission.exam = self.exam
-				submission.candidate = candidate
-				submission.exam_batch = batch_id
-				submission.status = "Registered"
-				submission.insert(ignore_permissions=True)
-				submissions_created += 1
-				batch_counts[batch_id] += 1
-				
-				# Add to existing candidates to avoid duplicates if the same candidate is in multiple batches
-				existing_candidates.add(candidate)
-		
-		# Construct message about created submissions
-		if submissions_created > 0:
-			batch_messages = [f"{count} for batch {batch_id}" for batch_id, count in batch_counts.items() if count > 0]
-			message = f"Created {submissions_created} new exam submissions ({', '.join(batch_messages)})"
-			frappe.msgprint(message)
 
 	def after_save(self):
 		self.send_proctor_emails()
@@ -143,42 +110,13 @@ class ExamSchedule(Document):
 		- "Ongoing" if the current time is between the start date time and end date time.
 		- "Completed" if the current time is after the end date time.
 		"""
-		current_time = datetime.fromisoformat(now().split(".")[0])
-		
-		# Ensure start_date_time is a datetime object
-		start_time = self.start_date_time
-		if not isinstance(start_time, datetime):
-			start_time = parse(start_time) if start_time else current_time
-		
-		# Calculate end time based on schedule type
-		if self.schedule_type == "Fixed":
-			end_time = start_time + timedelta(minutes=self.duration or 0)
-		else:
-			# For flexible schedules, we consider the end time as start time + duration + days
-			days = self.schedule_expire_in_days or 0
-			end_time = start_time + timedelta(minutes=self.duration or 0, days=days)
-		
-		# If additional_time is provided, adjust the end time
-		if additional_time:
-			end_time += timedelta(minutes=additional_time)
-		
-		# Debug log
-		frappe.logger().debug(f"Status calculation for {self.name}:")
-		frappe.logger().debug(f"- current_time: {current_time}")
-		frappe.logger().debug(f"- start_time: {start_time}")
-		frappe.logger().debug(f"- end_time: {end_time}")
-		
-		# Determine status
-		status = None
-		if current_time < start_time:
-			status = "Upcoming"
-		elif start_time <= current_time <= end_time:
-			status = "Ongoing"
-		else:
-			status = "Completed"
-			
-		frappe.logger().debug(f"- status: {status}")
-		return status
+		# window of the document itself, it can have unsaved changes
+		return get_window_status(self.get_window(), additional_time)
+
+	def get_window(self):
+		return schedule_window(
+			self.start_date_time, self.schedule_type, self.duration, self.schedule_expire_in_days
+		)
 
 	@frappe.whitelist()
 	def get_exam_schedule_status(self):
@@ -211,21 +149,10 @@ class ExamSchedule(Document):
 				frappe.db.set_value("Examiner", examiner.name, "notification_sent", 1)
 	
 	def can_end_schedule(self):
-		current_time = datetime.fromisoformat(now().split(".")[0])
-		
-		# Ensure start_date_time is a datetime object
-		start_time = self.start_date_time
-		if not isinstance(start_time, datetime):
-			start_time = parse(start_time) if start_time else current_time
-		
-		if self.schedule_type == "Fixed":
-			end_time = start_time + timedelta(minutes=self.duration)
-		else:
-			# For flexible schedules, we consider the end time as start time + duration + days
-			end_time = start_time + timedelta(minutes=self.duration, days=self.schedule_expire_in_days)
+		window = self.get_window()
 		
-		if current_time < end_time:
-			frappe.msgprint("Can't end the schedule before {} (end time).".format(end_time.isoformat()))
+		if get_window_status(window) != "Completed":
+			frappe.msgprint("Can't end the schedule before {} (end time).".format(window["end"].isoformat()))
 			return False
 		 
 		return True
@@ -313,6 +240,9 @@ def send_certificates(docname):
 	if not has_certification:
 		frappe.throw("Certification is not enabled for this exam.")
 
+	# close expired submissions of the schedule first
+	submit_expired_submissions(exam_schedule=docname)
+
 	# Get all submitted submissions
 	submissions = frappe.get_all(
 		"Exam Submission", 
@@ -323,13 +253,6 @@ def send_certificates(docname):
 	if not submissions:
 		return "No submitted exam submissions found for this schedule."
 
-	# Submit any pending exams first
-	for subm in submissions:
-		try:
-			submit_candidate_pending_exams(subm["candidate"])
-		except:
-			pass  # Continue if this fails
-
 	# Count passed submissions
 	passed_submissions = [s for s in submissions if s["result_status"] == "Passed"]
 	
@@ -395,104 +318,32 @@ def send_certificates(docname):
 def get_server_status(schedule_name):
 	"""Get the status of an exam schedule for the list view"""
 	try:
-		doc = frappe.get_doc("Exam Schedule", schedule_name)
-		status = doc.get_status()
+		status = get_schedule_status(schedule_name)
 		frappe.logger().info(f"get_server_status for {schedule_name}: {status}")
 		return status
 	except Exception as e:
 		frappe.logger().error(f"Error in get_server_status for {schedule_name}: {str(e)}")
 		return "Error"
 
-def get_schedule_status(exam_schedule, additional_time=0):
-	"""
-	Calculate and return the status of the exam schedule.
-	:param additional_time: Optional minutes to adjust the end time for status calculation.
-	Returns the status of the exam schedule based on the current time and start date time.
-	- "Upcoming" if the current time is before the start date time.
-	- "Ongoing" if the current time is between the start date time and end date time.
-	- "Completed" if the current time is after the end date time.
-	"""
-	start_date_time, schedule_type, duration, schedule_expire_in_days = frappe.get_value(
-		"Exam Schedule", exam_schedule, 
-		["start_date_time", "schedule_type", "duration", "schedule_expire_in_days"]
-	)
-	current_time = datetime.now()
-	
-	# Calculate end time based on schedule type
-	if schedule_type == "Fixed":
-		end_time = start_date_time + timedelta(minutes=duration or 0)
-	else:
-		# For flexible schedules, we consider the end time as start time + duration + days
-		days = schedule_expire_in_days or 0
-		end_time = start_date_time + timedelta(minutes=duration or 0, days=days)
-	
-	# If additional_time is provided, adjust the end time
-	if additional_time:
-		end_time += timedelta(minutes=additional_time)
-	
-	# Determine status
-	status = None
-	if current_time < start_date_time:
-		status = "Upcoming"
-	elif start_date_time <= current_time <= end_time:
-		status = "Ongoing"
-	else:
-		status = "Completed"
-		
-	return status
-
-def get_schedule_end_time(exam_schedule, additional_time=0):
-	"""
-	Get the end time of the exam schedule based on its type and additional time.
-	:param additional_time: Optional minutes to adjust the end time.
-	Returns the end time as a datetime object.
-	"""
-	start_date_time, schedule_type, duration, schedule_expire_in_days = frappe.get_value(
-		"Exam Schedule", exam_schedule, 
-		["start_date_time", "schedule_type", "duration", "schedule_expire_in_days"]
-	)
-	
-	if not isinstance(start_date_time, datetime):
-		start_date_time = parse(start_date_time) if start_date_time else datetime.now()
-	
-	if schedule_type == "Fixed":
-		end_time = start_date_time + timedelta(minutes=duration or 0)
-	else:
-		end_time = start_date_time + timedelta(minutes=duration or 0, days=schedule_expire_in_days or 0)
-	
-	if additional_time:
-		end_time += timedelta(minutes=additional_time)
-	
-	return end_time
-
 @frappe.whitelist()
 def recompute_results_for_schedule(schedule):
 	"""
 	Recompute results for all submissions in the given exam schedule.
 	This will update the total marks, evaluation status, and result status for each submission.
+	Answers are totalled in db and results are written back in batches.
 	"""
-	sched = frappe.get_doc("Exam Schedule", schedule, ignore_permissions=True)
+	# results are written without doc.save, so check permission here
+	frappe.only_for(["System Manager", "Exam Manager"])
+
 	# get max additional time given for submissions in this schedule
 	max_additional_time = frappe.db.get_value("Exam Submission", {"exam_schedule": schedule}, "max(additional_time_given)") or 0
-	if sched.get_status(additional_time=max_additional_time) != "Completed":
+	if get_schedule_status(schedule, additional_time=max_additional_time) != "Completed":
 		frappe.throw("Cannot recompute results since the exam schedule is not completed.")
 
 	submissions = frappe.get_all(
-		"Exam Submission", 
+		"Exam Submission",
 		filters={"exam_schedule": schedule},
-		fields=["name", "exam", "additional_time_given"]
+		fields=["name", "exam", "exam_schedule", "status", "candidate"]
 	)
-	for submission in submissions:
-		doc = frappe.get_doc("Exam Submission", submission["name"], ignore_permissions=True)
-		if doc.status == "Started":
-			doc.status = "Submitted"
-		elif doc.status == "Registered":
-			doc.status = "Not Attempted"
-		total_marks, evaluation_status, result_status = evaluation_values(
-			doc.exam, doc.submitted_answers
-		)
-		doc.total_marks = total_marks
-		doc.evaluation_status = evaluation_status
-		doc.result_status = result_status
-		doc.save()
-		frappe.db.commit()
\ No newline at end of file
+
+	return regrade_submissions(submissions)
@@ -1,9 +1,79 @@
 # Copyright (c) 2024, Labeeb Mattra and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from exampro.exam_pro.api.schedulewindow import SUBMISSION_DEADLINE_SQL, calculate_end_time, \
+	window_from_row
+
+TEST_SCHEDULE = "_Test Flexible Schedule"
 
 
 class TestExamSchedule(FrappeTestCase):
 	pass
+
+
+class TestSubmissionDeadline(FrappeTestCase):
+	def setUp(self):
+		schedule = frappe.get_doc({
+			"doctype": "Exam Schedule",
+			"exam": "_Test Deadline Exam",
+			"schedule_type": "Flexible",
+			"start_date_time": "2001-01-01 09:00:00",
+			"duration": 60,
+			"schedule_expire_in_days": 1
+		})
+		schedule.name = TEST_SCHEDULE
+		schedule.creation = schedule.modified = "2001-01-01 00:00:00"
+		schedule.db_insert()
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def insert_submission(self, name, started_time, additional_time=0):
+		doc = frappe.get_doc({
+			"doctype": "Exam Submission",
+			"exam": "_Test Deadline Exam",
+			"exam_schedule": TEST_SCHEDULE,
+			"candidate": "Administrator",
+			"status": "Started",
+			"exam_started_time": started_time,
+			"additional_time_given": additional_time
+		})
+		doc.name = name
+		doc.creation = doc.modified = started_time
+		doc.db_insert()
+
+	def sql_deadline(self, exam_submission):
+		return get_datetime(frappe.db.sql("""
+			SELECT {deadline}
+			FROM `tabExam Submission` sub
+			INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+			WHERE sub.name = %s
+		""".format(deadline=SUBMISSION_DEADLINE_SQL), exam_submission)[0][0])
+
+	def python_deadline(self, exam_submission):
+		sub = frappe.db.get_value(
+			"Exam Submission", exam_submission,
+			["exam_started_time", "additional_time_given"], as_dict=True
+		)
+		window = window_from_row(frappe.db.get_value(
+			"Exam Schedule", TEST_SCHEDULE,
+			["start_date_time", "schedule_type", "duration", "schedule_expire_in_days"], as_dict=True
+		))
+		return calculate_end_time(window, sub.exam_started_time, sub.additional_time_given)
+
+	def test_flexible_start_near_window_end_is_capped(self):
+		# window closes 2001-01-02 10:00, 10:05 with the additional time
+		self.insert_submission("_test-deadline-late", "2001-01-02 09:30:00", 5)
+
+		self.assertEqual(self.python_deadline("_test-deadline-late"), get_datetime("2001-01-02 10:05:00"))
+		self.assertEqual(self.sql_deadline("_test-deadline-late"), self.python_deadline("_test-deadline-late"))
+
+	def test_flexible_early_start_gets_full_duration(self):
+		self.insert_submission("_test-deadline-early", "2001-01-01 12:00:00", 5)
+
+		self.assertEqual(self.python_deadline("_test-deadline-early"), get_datetime("2001-01-01 13:05:00"))
+		self.assertEqual(self.sql_deadline("_test-deadline-early"), self.python_deadline("_test-deadline-early"))
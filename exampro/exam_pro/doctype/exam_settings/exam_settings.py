@@ -5,21 +5,90 @@ import frappe
 import boto3
 from botocore.exceptions import ClientError
 from frappe.model.document import Document
+from frappe.utils import cint
+from frappe.utils.password import get_decrypted_password
+
+# exam settings cache
+# > EXAM_SETTINGS settings with derived values (storage endpoint, allowed
+#   email domains), cleared when the settings are saved
+# > the storage secret is never cached in redis, it is decrypted once per
+#   worker process and settings version
+EXAM_SETTINGS_CACHE = "exam_settings"
+_storage_secrets = {}
+# webcam recording, advertised to the browser when the exam starts
+DEFAULT_VIDEO_CHUNK_SECONDS = 10
+MIN_VIDEO_CHUNK_SECONDS = 5
+MAX_VIDEO_CHUNK_SECONDS = 30
+DEFAULT_VIDEO_BITS_PER_SECOND = 8000
 
 
 class ExamSettings(Document):
+
+	def on_update(self):
+		# settings cache, and with it the storage clients, are rebuilt from the new settings
+		clear_exam_settings()
 	
 	def get_storage_endpoint(self):
 		"""
-		Get the storage endpoint URL based on the selected provider
+		Get the storage endpoint URL based on the selected provider.
+		`exampro_storage_endpoint` in site config overrides it, e.g. for a local MinIO.
 		"""
-		if self.storage_provider == "AWS S3":
+		if frappe.conf.get("exampro_storage_endpoint"):
+			return frappe.conf.get("exampro_storage_endpoint")
+		elif self.storage_provider == "AWS S3":
 			return f"https://{self.s3_bucket}.s3.amazonaws.com"
 		elif self.storage_provider == "Cloudflare R2":
 			return f'https://{self.aws_account_id}.r2.cloudflarestorage.com'
 		else:
 			return None
 
+def get_exam_settings():
+	"""
+	Exam Settings with derived values, cached until the settings are saved.
+	"""
+	def generator():
+		settings = frappe.get_single("Exam Settings")
+		domains = settings.restrict_user_account_domains or ""
+		return frappe._dict({
+			"storage_provider": settings.storage_provider,
+			"storage_endpoint": settings.get_storage_endpoint(),
+			"aws_account_id": settings.aws_account_id,
+			"aws_key": settings.aws_key,
+			"s3_bucket": settings.s3_bucket,
+			"direct_video_upload": cint(settings.direct_video_upload),
+			"compact_videos": cint(settings.compact_videos),
+			"video_chunk_seconds": min(
+				max(cint(settings.video_chunk_seconds) or DEFAULT_VIDEO_CHUNK_SECONDS, MIN_VIDEO_CHUNK_SECONDS),
+				MAX_VIDEO_CHUNK_SECONDS
+			),
+			"video_bits_per_second": cint(settings.video_bits_per_second) or DEFAULT_VIDEO_BITS_PER_SECOND,
+			"buffer_answer_writes": cint(settings.buffer_answer_writes),
+			"allowed_domains": frozenset(
+				domain.strip().lower() for domain in domains.split(",") if domain.strip()
+			),
+			"version": str(settings.modified)
+		})
+
+	return frappe.cache().get_value(EXAM_SETTINGS_CACHE, generator=generator)
+
+def get_storage_secret():
+	"""
+	Decrypted storage secret of the current settings version
+	"""
+	key = (frappe.local.site, get_exam_settings().version)
+	if key not in _storage_secrets:
+		# forget secrets of older settings of this site
+		for stale in [k for k in _storage_secrets if k[0] == key[0]]:
+			del _storage_secrets[stale]
+		_storage_secrets[key] = get_decrypted_password(
+			"Exam Settings", "Exam Settings", "aws_secret", raise_exception=False
+		)
+
+	return _storage_secrets[key]
+
+def clear_exam_settings():
+	frappe.cache().delete_value(EXAM_SETTINGS_CACHE)
+
 def validate_video_settings():
 	"""
 	Validate AWS/Cloudflare account details are valid
@@ -38,9 +107,9 @@ def validate_video_settings():
 			'aws_secret_access_key': aws_secret
 		}
 		
-		# Add endpoint_url for Cloudflare R2
-		if settings.storage_provider == "Cloudflare R2":
-			client_kwargs['endpoint_url'] = f'https://{settings.aws_account_id}.r2.cloudflarestorage.com'
+		# Add endpoint_url for Cloudflare R2 or a site config override
+		if settings.storage_provider == "Cloudflare R2" or frappe.conf.get("exampro_storage_endpoint"):
+			client_kwargs['endpoint_url'] = settings.get_storage_endpoint()
 		
 		# Create an S3 client with the provided credentials
 		s3_client = boto3.client('s3', **client_kwargs)
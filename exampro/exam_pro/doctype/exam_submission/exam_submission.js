@@ -18,6 +18,15 @@ frappe.ui.form.on("Exam Submission", {
 
                 // Convert the object into an array of key-value pairs
                 const videoArray = Object.entries(r.message.videos);
+                // compacted submissions, chunks are byte ranges of a segment
+                (r.message.segments || []).forEach(segment => {
+                    segment.chunks.forEach(chunk => {
+                        videoArray.push([chunk.ts, {
+                            url: segment.url,
+                            range: "bytes=" + chunk.offset + "-" + (chunk.offset + chunk.length - 1)
+                        }]);
+                    });
+                });
                 if (videoArray != 0) {
                     $('#videoDiv').removeClass("hidden");
                     // Sort the array based on Unix timestamps in ascending order
@@ -29,11 +38,33 @@ frappe.ui.form.on("Exam Submission", {
                     var indexField = document.getElementById('index-field');
 
                     var currentIndex = 0;
+                    var objectUrl = null;
+
+                    function setSource(src) {
+                        if (objectUrl) {
+                            URL.revokeObjectURL(objectUrl);
+                            objectUrl = null;
+                        }
+                        if (typeof src === "string") {
+                            return Promise.resolve(src);
+                        }
+                        return fetch(src.url, { headers: { Range: src.range } })
+                            .then(response => response.blob())
+                            .then(blob => {
+                                objectUrl = URL.createObjectURL(blob);
+                                return objectUrl;
+                            });
+                    }
 
                     function playVideo() {
-                        videoElement.src = videoArray[currentIndex][1];
-                        videoElement.play();
+                        var index = currentIndex;
                         indexField.value = (currentIndex + 1) + '/' + videoArray.length;
+                        setSource(videoArray[currentIndex][1]).then(src => {
+                            // skip stale loads when the user moved on
+                            if (index !== currentIndex) return;
+                            videoElement.src = src;
+                            videoElement.play();
+                        });
                     }
 
                     playPauseBtn.addEventListener('click', function () {
@@ -1,58 +1,40 @@
 # Copyright (c) 2024, Labeeb Mattra and contributors
 # For license information, please see license.txt
 
+import hashlib
 import random
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
 
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import now
+from frappe.utils import cint, now
 from werkzeug.utils import secure_filename
 
-from exampro.exam_pro.doctype.exam_schedule.exam_schedule import get_schedule_status
+from exampro.exam_pro.api.allocator import allocate_examiners
+from exampro.exam_pro.api.candidate_exams import clear_candidate_exams
 from exampro.exam_pro.api.examops import evaluation_values
-
-import boto3
-from botocore.client import Config
-
-def get_s3_client():
-    """
-    Get or create an S3 client from the connection pool.
-    Stores the client in frappe.local for reuse within the same request.
-    
-    Returns:
-        boto3.client: S3 client with appropriate configuration
-    """
-    # Check if we already have a client in the current request
-    if hasattr(frappe.local, "s3_client"):
-        return frappe.local.s3_client
-        
-    # Get settings
-    settings = frappe.get_single("Exam Settings")
-    cfdomain = settings.get_storage_endpoint()
-    if not cfdomain:
-        frappe.throw(_("Storage endpoint is not configured. Please check Exam Settings."))
-        
-    # Create a new client
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=cfdomain,
-        aws_access_key_id=settings.aws_key,
-        aws_secret_access_key=settings.get_password("aws_secret"),
-        config=Config(
-            signature_version='s3v4',
-            # Add connection pooling settings
-            max_pool_connections=50,  # Reuse connections
-            connect_timeout=5,        # Connection timeout
-            read_timeout=60           # Read timeout for uploads
-        )
-    )
-    
-    # Store in frappe.local for this request
-    frappe.local.s3_client = s3_client
-    
-    return s3_client
+from exampro.exam_pro.api.answerbuffer import apply_buffered_answers, buffer_answer, \
+	discard_buffered_answer, flush_answer_buffer, is_answer_buffer_enabled
+from exampro.exam_pro.api.examsession import clear_exam_session, create_exam_session, \
+	find_session_question, get_exam_session, get_session_question, has_session_ended, \
+	update_session_answer
+from exampro.exam_pro.api.leaderboard import remove_from_leaderboards, update_leaderboards
+from exampro.exam_pro.api.messages import get_messages, is_cursor_current
+from exampro.exam_pro.api.schedulewindow import calculate_end_time, get_schedule_window
+from exampro.exam_pro.api.storage import get_bucket, get_s3_client
+from exampro.exam_pro.api.videoarchive import get_video_segments, list_video_chunks
+from exampro.exam_pro.api.videoindex import URL_RENEW_MARGIN, add_upload_slots, add_video_chunk, \
+	chunk_entry, clear_video_chunks, get_video_chunks, is_index_built, pop_upload_slot, \
+	set_video_chunks, update_video_chunk
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
+
+# direct uploads, presigned urls are handed out in batches covering a few minutes
+VIDEO_UPLOAD_BATCH_SIZE = 12
+VIDEO_UPLOAD_URL_TTL = 5 * 60
 
 def create_website_user(full_name, email):
     # Check if the user already exists
@@ -99,6 +81,19 @@ class ExamSubmission(Document):
 	def on_trash(self):
 		frappe.db.delete("Exam Messages", {"exam_submission": self.name})
 		frappe.db.delete("Exam Certificate", {"exam_submission": self.name})
+		clear_exam_session(self.name)
+		remove_from_leaderboards(self)
+		clear_candidate_exams([self.candidate])
+		clear_video_chunks(self.name)
+
+	def on_update(self):
+		# status or additional time might have changed, session is rebuilt on next read
+		clear_exam_session(self.name)
+		clear_candidate_exams([self.candidate])
+
+		if self.has_value_changed("status") or self.has_value_changed("result_status") \
+			or self.has_value_changed("total_marks"):
+			update_leaderboards(self)
 
 	
 	def before_save(self):
@@ -108,6 +103,9 @@ class ExamSubmission(Document):
 		# ):
 		# 	frappe.throw("Duplicate submission exists for {} - {}".format(self.candidate, self.exam_schedule))
 
+		if not self.is_new():
+			apply_buffered_answers(self)
+
 		# If this is a new submission, make sure the candidate has the Exam Candidate role
 		if self.candidate:
 			user = frappe.get_doc("User", self.candidate)
@@ -116,41 +114,22 @@ class ExamSubmission(Document):
 				user.add_roles("Exam Candidate")
 				user.save(ignore_permissions=True)
 
-		sched = frappe.get_doc("Exam Schedule", self.exam_schedule)
-		if sched.examiners:
-			if not self.assigned_proctor or not self.assigned_evaluator:
-				self.assign_proctor_evaluator()
+		if not self.assigned_proctor or not self.assigned_evaluator:
+			self.assign_proctor_evaluator()
 
 	def assign_proctor_evaluator(self):
 		"""
-		Assign a proctor keeping round robin
+		Assign a proctor and evaluator keeping round robin
 		"""
-		sched = frappe.get_doc("Exam Schedule", self.exam_schedule)
-		# proctor
-		pcount = {
-			ex.examiner: ex.proctoring_count for ex in sched.examiners if ex.can_proctor
-		}
-		if pcount:
-			# Determine the examiner with the least number of assignments
-			next_proctor = min(pcount, key=pcount.get)
-			self.assigned_proctor = next_proctor
-			pcount[next_proctor] += 1
-
-		# examiner asignement
-		ecount = {
-			ex.examiner: ex.evaluation_count for ex in sched.examiners if ex.can_evaluate
-		}
-		if ecount:
-			# Determine the examiner with the least number of assignments
-			next_evaluator = min(ecount, key=pcount.get)
-			self.assigned_evaluator = next_evaluator
-			ecount[next_evaluator] += 1
-		
-		# set the updated counts
-		for ex_ in sched.examiners:
-			ex_.proctoring_count = pcount[ex_.examiner]
-			ex_.evaluation_count = ecount[ex_.examiner]
-		sched.save(ignore_permissions=True)
+		proctor, evaluator = allocate_examiners(
+			self.exam_schedule,
+			proctor=not self.assigned_proctor,
+			evaluator=not self.assigned_evaluator
+		)[0]
+		if proctor:
+			self.assigned_proctor = proctor
+		if evaluator:
+			self.assigned_evaluator = evaluator
 	
 	def before_insert(self):
 		last_login = frappe.db.get_value("User", self.candidate, "last_login")
@@ -196,6 +175,44 @@ def can_process_question(doc, member=None):
 	if doc.candidate != (member or frappe.session.user):
 		frappe.throw("Invalid exam requested.")
 
+def can_process_session(session, member=None):
+	"""
+	Cache backed version of can_process_question.
+	Falls back to the db validation if the session is not live.
+	"""
+	if not session:
+		frappe.throw("Invalid exam requested.")
+	if session["candidate"] != (member or frappe.session.user):
+		frappe.throw("Invalid exam requested.")
+	if session["status"] != "Started" or has_session_ended(session):
+		doc = frappe.get_doc("Exam Submission", session["exam_submission"])
+		can_process_question(doc, member)
+		# db says the exam is still on, session was stale
+		session = create_exam_session(session["exam_submission"])
+
+	return session
+
+def get_candidate_question(exam_question):
+	"""
+	Question fields which can be shown to a candidate, never the answers
+	"""
+	question_doc = frappe.get_cached_doc("Exam Question", exam_question)
+	return {
+		"question": question_doc.question,
+		"name": question_doc.name,
+		"type": question_doc.type,
+		"description_image": question_doc.description_image,
+		"option_1": question_doc.option_1,
+		"option_2": question_doc.option_2,
+		"option_3": question_doc.option_3,
+		"option_4": question_doc.option_4,
+		"option_1_image": question_doc.option_1_image,
+		"option_2_image": question_doc.option_2_image,
+		"option_3_image": question_doc.option_3_image,
+		"option_4_image": question_doc.option_4_image,
+		"multiple": question_doc.multiple
+	}
+
 def get_submitted_questions(exam_submission, fields=["exam_question"]):
 	all_submitted = frappe.db.get_all(
 		"Exam Answer",
@@ -251,13 +268,9 @@ def start_exam(exam_submission=None):
 	doc.save(ignore_permissions=True)
 	frappe.db.commit()
 
-	schedule = frappe.get_doc("Exam Schedule", doc.exam_schedule)
+	session = create_exam_session(exam_submission)
 
-	# end time is schedule start time + duration + additional time given
-	end_time = schedule.start_date_time + timedelta(minutes=schedule.duration) + \
-		timedelta(minutes=doc.additional_time_given)
-
-	return {"end_time": end_time}
+	return {"end_time": session["end_time"], "video_recording": get_video_recording_settings()}
 
 
 @frappe.whitelist()
@@ -266,6 +279,7 @@ def end_exam(exam_submission=None):
 	Submit Candidate exam
 	"""
 	assert exam_submission
+	flush_answer_buffer(exam_submission)
 	doc = frappe.get_doc("Exam Submission", exam_submission)
 
 	# check of the logged in user is same as exam submission candidate
@@ -274,6 +288,7 @@ def end_exam(exam_submission=None):
 	
 	if doc.status == "Started":
 		doc.status = "Submitted"
+		doc.exam_submitted_time = now()
 		total_marks, evaluation_status, result_status = evaluation_values(
 			doc.exam, doc.submitted_answers
 		)
@@ -304,50 +319,56 @@ def get_question(exam_submission=None, qsno=1):
 	assert exam_submission
 	qs_no = int(qsno)
 
-	exam_schedule, exam = frappe.get_cached_value("Exam Submission", exam_submission, ["exam_schedule", "exam"])
-	if get_schedule_status(exam_schedule) != "Ongoing":
-		frappe.throw("Exam is not ongoing or has ended.")
-	
-	if frappe.db.get_value("Exam Submission", exam_submission, "status") != "Started":
-		frappe.throw("Exam is not started yet.")
-	exam_ended, _ = has_submission_ended(exam_submission)
-	if exam_ended:
-		frappe.throw("Exam has ended.")
+	session = can_process_session(get_exam_session(exam_submission))
 
-	total_qs = frappe.get_cached_value(
-		"Exam", exam, "total_questions"
-	)
-	if qs_no < 1 or qs_no > total_qs:
+	qs = get_session_question(session, qs_no)
+	if not qs:
 		frappe.throw("Invalid question number requested: {}".format(qs_no))
 
-	answer_doc = frappe.db.get_value("Exam Answer", {"parent": exam_submission, "seq_no": qs_no}, "*")
-	if not answer_doc:
-		frappe.throw("Invalid question requested.")
-
 	try:
-		question_doc = frappe.get_cached_doc("Exam Question", answer_doc["exam_question"])
+		res = get_candidate_question(qs["name"])
 	except frappe.DoesNotExistError:
 		frappe.throw("Invalid question requested.")
 
-	res = {
-		"question": question_doc.question,
-		"qs_no": answer_doc["seq_no"],
-		"name": question_doc.name,
-		"type": question_doc.type,
-		"description_image": question_doc.description_image,
-		"option_1": question_doc.option_1,
-		"option_2": question_doc.option_2,
-		"option_3": question_doc.option_3,
-		"option_4": question_doc.option_4,
-		"option_1_image": question_doc.option_1_image,
-		"option_2_image": question_doc.option_2_image,
-		"option_3_image": question_doc.option_3_image,
-		"option_4_image": question_doc.option_4_image,
-		"multiple": question_doc.multiple,
+	answer = session["answers"].get(qs_no, {})
+	res.update({
+		"qs_no": qs_no,
 		# submitted answer
-		"marked_for_later": answer_doc["marked_for_later"],
-		"answer": answer_doc["answer"]
+		"marked_for_later": answer.get("marked_for_later", 0),
+		"answer": answer.get("answer")
+	})
+
+	return res
+
+
+@frappe.whitelist()
+def get_exam_paper(exam_submission=None, etag=None):
+	"""
+	Get all questions of a started exam in one call, in the submission order.
+	Questions are skipped in the response if the client has the same etag.
+	"""
+	assert exam_submission
+
+	session = can_process_session(get_exam_session(exam_submission))
+
+	questions = []
+	for qs in session["questions"]:
+		try:
+			question = get_candidate_question(qs["name"])
+		except frappe.DoesNotExistError:
+			frappe.throw("Invalid question requested.")
+		question["qs_no"] = qs["seq_no"]
+		questions.append(question)
+
+	paper_etag = hashlib.md5(frappe.as_json(questions).encode()).hexdigest()
+	res = {
+		"etag": paper_etag,
+		"total_questions": len(questions),
+		"end_time": session["end_time"],
+		"answers": session["answers"]
 	}
+	if etag != paper_etag:
+		res["questions"] = questions
 
 	return res
 
@@ -359,24 +380,31 @@ def submit_question_response(exam_submission=None, qs_name=None, answer="", mark
 	"""
 	assert exam_submission, qs_name
 
-	submission = frappe.get_doc("Exam Submission", exam_submission, ignore_permissions=True)
+	session = get_exam_session(exam_submission)
 	# check of the logged in user is same as exam submission candidate
-	if frappe.session.user != submission.candidate:
+	if not session or frappe.session.user != session["candidate"]:
 		raise PermissionError("You don't have access to submit and answer.")
 
-	can_process_question(submission)
+	session = can_process_session(session)
 
-	answer_docname = frappe.db.get_value("Exam Answer", {"parent": exam_submission, "exam_question": qs_name}, "name")
-	if not answer_docname:
+	qs = find_session_question(session, qs_name)
+	if not qs:
 		frappe.throw("Invalid question requested.")
 
-	result_doc = frappe.get_doc("Exam Answer", answer_docname)
-	result_doc.answer = answer
-	result_doc.marked_for_later = markdflater
-	result_doc.evaluation_status = "Pending"
-	result_doc.save(ignore_permissions=True)
-		
-	return {"qs_name": qs_name, "qs_no": result_doc.seq_no}
+	# written to db directly when buffering is off or the buffer write failed
+	buffering = is_answer_buffer_enabled()
+	if not (buffering and buffer_answer(exam_submission, qs_name, answer, int(markdflater))):
+		if buffering:
+			discard_buffered_answer(exam_submission, qs_name)
+		result_doc = frappe.get_doc("Exam Answer", qs["answer_row"])
+		result_doc.answer = answer
+		result_doc.marked_for_later = markdflater
+		result_doc.evaluation_status = "Pending"
+		result_doc.save(ignore_permissions=True)
+
+	update_session_answer(session, qs["seq_no"], answer, int(markdflater))
+
+	return {"qs_name": qs_name, "qs_no": qs["seq_no"]}
 
 
 @frappe.whitelist()
@@ -486,30 +514,29 @@ def terminate_exam(exam_submission, check_permission=True):
 
 
 @frappe.whitelist()
-def exam_messages(exam_submission=None):
+def exam_messages(exam_submission=None, since=None):
 	"""
 	Get messages
+	If `since` (creation of the last seen message) is given, only newer messages
+	are returned. `last` in the response is the cursor for the next call.
 	"""
 	assert exam_submission
-	doc = frappe.get_doc("Exam Submission", exam_submission, ignore_permissions=True)
+	candidate = frappe.get_cached_value("Exam Submission", exam_submission, "candidate")
+	assigned_proctor = frappe.get_cached_value(
+		"Exam Submission", exam_submission, "assigned_proctor"
+	)
 
 	# check of the logged in user is same as exam submission candidate or proctor
-	if frappe.session.user not in [doc.candidate, doc.assigned_proctor]:
+	if frappe.session.user not in [candidate, assigned_proctor]:
 		raise PermissionError("You don't have access to view messages.")
 
-	res = frappe.get_all(
-		"Exam Messages", filters={
-		"exam_submission": exam_submission
-		}, fields=["creation", "from", "message", "type_of_message"],
-		ignore_permissions=True
-	)
-	for idx, msg in enumerate(res):
-		res[idx]["creation"] = res[idx]["creation"].isoformat()
+	# nothing new since the cursor
+	if since and is_cursor_current(exam_submission, since):
+		return {"messages": [], "last": since}
 
-	# sort by datetime
-	res = sorted(res, key=lambda x: x['creation'])
+	res = get_messages(exam_submission, since=since)
 
-	return {"messages": res}
+	return {"messages": res, "last": res[-1]["creation"] if res else since}
 
 
 @frappe.whitelist()
@@ -518,14 +545,24 @@ def exam_overview(exam_submission=None):
 	return list of questions and its status
 	"""
 	assert exam_submission
-	all_submitted = get_submitted_questions(
-		exam_submission, fields=["marked_for_later", "exam_question", "answer", "seq_no"]
-	)
-	exam_schedule = frappe.get_cached_value(
-		"Exam Submission", exam_submission, "exam_schedule"
-	)
-	exam = frappe.get_cached_value("Exam Schedule", exam_schedule, "exam")
-	total_questions = frappe.get_cached_value("Exam", exam, "total_questions")
+	session = get_exam_session(exam_submission)
+	if session and session["status"] == "Started":
+		all_submitted = [{
+			"seq_no": seq_no,
+			"exam_question": session["questions"][seq_no - 1]["name"],
+			"marked_for_later": ans["marked_for_later"],
+			"answer": ans["answer"]
+		} for seq_no, ans in sorted(session["answers"].items())]
+		total_questions = len(session["questions"])
+	else:
+		all_submitted = get_submitted_questions(
+			exam_submission, fields=["marked_for_later", "exam_question", "answer", "seq_no"]
+		)
+		exam_schedule = frappe.get_cached_value(
+			"Exam Submission", exam_submission, "exam_schedule"
+		)
+		exam = frappe.get_cached_value("Exam Schedule", exam_schedule, "exam")
+		total_questions = frappe.get_cached_value("Exam", exam, "total_questions")
 	res = {
 		"exam_submission": exam_submission,
 		"submitted": {},
@@ -552,50 +589,75 @@ def exam_overview(exam_submission=None):
 
 	return res
 
-def get_videos(exam_submission, ttl=None):
+def get_video_ttl(exam_submission):
+	"""
+	Presigned urls and the chunk index live for exam duration + 15 min buffer
+	"""
+	exam = frappe.get_cached_value("Exam Submission", exam_submission, "exam")
+	return (frappe.get_cached_value("Exam", exam, "duration") or 0) * 60 + 900
+
+def build_video_index(exam_submission, ttl):
 	"""
-	Get list of videos. Optional cache the urls with ttl
+	Rebuild the chunk index of a submission from an S3 listing.
 	"""
-	settings = frappe.get_single("Exam Settings")
 	s3_client = get_s3_client()
-	res = {"videos": {}}
-
-	# Paginator to handle buckets with many objects
-	paginator = s3_client.get_paginator('list_objects_v2')
-	for page in paginator.paginate(Bucket=settings.s3_bucket, Prefix=exam_submission):
-		if 'Contents' in page:
-			for obj in page['Contents']:
-				if not obj['Key'].endswith('.webm'):
-					continue
-
-				# check cache for presigned url
-				filetimestamp = obj['Key'].split("/")[-1][:-4]
-				cached_url = frappe.cache().get(obj['Key'])
-				if not cached_url:
-					presigned_url = s3_client.generate_presigned_url(
-						'get_object', Params={
-							'Bucket': settings.s3_bucket,
-							'Key': obj['Key']},
-							ExpiresIn=ttl
-					)
-					res["videos"][filetimestamp] = presigned_url
-					if ttl:
-						frappe.cache().setex(obj['Key'], ttl, presigned_url)
-				else:
-					res["videos"][filetimestamp] = cached_url.decode()
+	bucket = get_bucket()
+	entries = []
+	for _, key in list_video_chunks(exam_submission):
+		presigned_url = s3_client.generate_presigned_url(
+			'get_object', Params={
+				'Bucket': bucket,
+				'Key': key},
+				ExpiresIn=ttl
+		)
+		entries.append(chunk_entry(key, presigned_url, ttl))
+
+	set_video_chunks(exam_submission, entries, ttl)
+
+def get_videos(exam_submission, ttl=None, since=None):
+	"""
+	Get list of videos uploaded after cursor `since`, from the chunk index.
+	Compacted submissions have no chunks left, their segments are returned
+	on the first call instead.
+	returns {"videos": {timestamp: url}, "last": cursor, "segments": [...]}
+	"""
+	ttl = ttl or get_video_ttl(exam_submission)
+	if not is_index_built(exam_submission):
+		build_video_index(exam_submission, ttl)
+
+	since = cint(since)
+	entries, last = get_video_chunks(exam_submission, since)
+	start = last - len(entries)
+	res = {"videos": {}, "last": last}
+
+	renew_before = time.time() + URL_RENEW_MARGIN
+	for idx, entry in enumerate(entries):
+		if entry["expires"] < renew_before:
+			entry = chunk_entry(entry["key"], get_s3_client().generate_presigned_url(
+				'get_object', Params={
+					'Bucket': get_bucket(),
+					'Key': entry["key"]},
+					ExpiresIn=ttl
+			), ttl)
+			update_video_chunk(exam_submission, start + idx, entry)
+		res["videos"][entry["ts"]] = entry["url"]
+
+	if not since and not last:
+		res["segments"] = get_video_segments(exam_submission, ttl)
+
 	return res
 
 @frappe.whitelist()
-def exam_video_list(exam_submission):
+def exam_video_list(exam_submission, since=None):
 	"""
-	Get the list of videos from s3
+	Get the list of videos uploaded after cursor `since`
 	"""
 	assert exam_submission
 	if frappe.session.user == "Guest":
 		raise frappe.PermissionError(_("Please login to access this page."))
 
 	try:
-		res = get_videos(exam_submission)
+		res = get_videos(exam_submission, since=since)
 	except Exception:
 		frappe.log_error("Error retrieving videos for exam submission", "exam_video_list error")
 		res = {"videos": {}}
@@ -606,10 +668,9 @@ def exam_video_list(exam_submission):
 ### Examiner APIs ########
 #########################
 @frappe.whitelist()
-def proctor_video_list(exam_submission=None):
+def proctor_video_list(exam_submission=None, since=None):
 	"""
-	Get the list of videos from s3
-	TODO Add a caching layer to stop generating duplicate urls
+	Get the list of videos uploaded after cursor `since`
 	"""
 	assert exam_submission
 	if frappe.session.user == "Guest":
@@ -622,21 +683,24 @@ def proctor_video_list(exam_submission=None):
 	if frappe.session.user != assigned_proctor:
 		raise frappe.PermissionError(_("No permission to access this exam."))
 
-	exam = frappe.get_cached_value(
-		"Exam Submission", exam_submission, "exam"
-	)
-	ttl = frappe.get_cached_value("Exam", exam, "duration") * 60 + 900  # ttl is exam duration + 15 min buffer
-	res = get_videos(exam_submission, ttl)
+	res = get_videos(exam_submission, since=since)
 
 	return res
 
-@frappe.whitelist()
-def upload_video(exam_submission=None):
+def get_video_recording_settings():
 	"""
-	Upload video to S3 storage and notify proctor
-	Uses connection pooling for better performance with multiple uploads
+	Webcam chunk length and bitrate the browser records with
+	"""
+	settings = get_exam_settings()
+	return {
+		"chunk_seconds": settings.video_chunk_seconds,
+		"bits_per_second": settings.video_bits_per_second
+	}
+
+def validate_video_upload(exam_submission):
+	"""
+	Only the candidate of a started exam can upload videos
 	"""
-	assert exam_submission
 	if frappe.session.user == "Guest":
 		raise frappe.PermissionError(_("Please login to access this page."))
 
@@ -646,8 +710,38 @@ def upload_video(exam_submission=None):
 	if frappe.session.user != \
 		frappe.get_cached_value("Exam Submission", exam_submission, "candidate"):
 		raise frappe.PermissionError(_("Exam does not belongs to the user."))
-	
-	settings = frappe.get_single("Exam Settings")
+
+def publish_video_chunk(exam_submission, entry, ttl):
+	"""
+	Add an uploaded chunk to the index and notify the proctor
+	"""
+	# appended even if the index is not built, the rebuild merges it
+	add_video_chunk(exam_submission, entry, ttl)
+
+	# trigger webocket msg to proctor
+	assigned_proctor = frappe.get_cached_value(
+		"Exam Submission", exam_submission, "assigned_proctor"
+	)
+	if assigned_proctor:
+		frappe.publish_realtime(
+			event='newproctorvideo',
+			message={
+				"exam_submission": exam_submission,
+				"ts": entry["ts"],
+				"url": entry["url"]
+			},
+			user=assigned_proctor
+		)
+
+@frappe.whitelist()
+def upload_video(exam_submission=None):
+	"""
+	Upload video to S3 storage and notify proctor
+	Uses connection pooling for better performance with multiple uploads
+	"""
+	assert exam_submission
+	validate_video_upload(exam_submission)
+
 	s3_client = get_s3_client()
 	
 	if 'file' not in frappe.request.files:
@@ -661,13 +755,9 @@ def upload_video(exam_submission=None):
 	filename = secure_filename(file.filename)
 
 	# Specify your S3 bucket and folder
-	bucket_name = settings.s3_bucket
+	bucket_name = get_bucket()
 	object_name = "{}/{}".format(exam_submission, filename)
-	exam = frappe.get_cached_value(
-		"Exam Submission", exam_submission, "exam"
-	)
-	duration = frappe.get_cached_value("Exam", exam, "duration")
-	ttl = duration * 60 + 900  # ttl is exam duration + 15 min buffer
+	ttl = get_video_ttl(exam_submission)
 
 	try:
 		# Stream the file directly to S3
@@ -678,25 +768,83 @@ def upload_video(exam_submission=None):
 	else:
 		presigned_url = s3_client.generate_presigned_url(
 			'get_object', Params={
-				'Bucket': settings.s3_bucket,
+				'Bucket': get_bucket(),
 				'Key': object_name},
 				ExpiresIn=ttl,
 				HttpMethod='GET'
 			)
-		frappe.cache().setex(object_name, ttl, presigned_url)
-
-		# trigger webocket msg to proctor
-		# frappe.publish_realtime(
-		# 	event='newproctorvideo',
-		# 	message={
-		# 		"exam_submission": exam_submission,
-		# 		"ts": filename[:-5],
-		# 		"url": presigned_url
-		# 	},
-		# 	user=frappe.cache().hget(exam_submission, "assigned_proctor")
-		# )
+		publish_video_chunk(exam_submission, chunk_entry(object_name, presigned_url, ttl), ttl)
 		return {"status": True}
 
+@frappe.whitelist()
+def get_video_upload_urls(exam_submission=None, timestamps=None):
+	"""
+	Presigned PUT urls for the next webcam chunks, the browser uploads
+	them straight to the bucket and confirms each with confirm_video_upload.
+	PUT is used since Cloudflare R2 does not support presigned POST policies.
+	:param timestamps: unix timestamps the chunks will be named after
+	returns {timestamp: url}
+	"""
+	assert exam_submission
+	validate_video_upload(exam_submission)
+
+	timestamps = [cint(ts) for ts in frappe.parse_json(timestamps or "[]")]
+	if not timestamps or len(timestamps) > VIDEO_UPLOAD_BATCH_SIZE:
+		frappe.throw(_("Request between 1 and {} upload urls.").format(VIDEO_UPLOAD_BATCH_SIZE))
+
+	tnow = int(time.time())
+	if any(ts < tnow - VIDEO_UPLOAD_URL_TTL or ts > tnow + VIDEO_UPLOAD_URL_TTL for ts in timestamps):
+		frappe.throw(_("Upload urls can only be requested for the next few minutes."))
+
+	s3_client = get_s3_client()
+	bucket = get_bucket()
+	ttl = get_video_ttl(exam_submission)
+	res, slots = {}, []
+	for ts in timestamps:
+		object_name = "{}/{}.webm".format(exam_submission, ts)
+		res[ts] = s3_client.generate_presigned_url(
+			'put_object', Params={
+				'Bucket': bucket,
+				'Key': object_name,
+				'ContentType': 'video/webm'},
+				ExpiresIn=VIDEO_UPLOAD_URL_TTL * 2,
+				HttpMethod='PUT'
+			)
+		slots.append(chunk_entry(object_name, s3_client.generate_presigned_url(
+			'get_object', Params={
+				'Bucket': bucket,
+				'Key': object_name},
+				ExpiresIn=ttl,
+				HttpMethod='GET'
+			), ttl))
+
+	add_upload_slots(exam_submission, slots, VIDEO_UPLOAD_URL_TTL * 3)
+
+	return res
+
+@frappe.whitelist()
+def confirm_video_upload(exam_submission=None, timestamp=None):
+	"""
+	Record a chunk uploaded with a url from get_video_upload_urls
+	"""
+	assert exam_submission
+	validate_video_upload(exam_submission)
+
+	entry = pop_upload_slot(exam_submission, "{}/{}.webm".format(exam_submission, cint(timestamp)))
+	if not entry:
+		return {"status": False}
+
+	# the browser's word is not enough, the object must be in the bucket
+	try:
+		get_s3_client().head_object(Bucket=get_bucket(), Key=entry["key"])
+	except ClientError:
+		# upload may still be in flight, keep the slot for a retry
+		add_upload_slots(exam_submission, [entry], VIDEO_UPLOAD_URL_TTL * 3)
+		return {"status": False}
+
+	publish_video_chunk(exam_submission, entry, get_video_ttl(exam_submission))
+	return {"status": True}
+
 def val_secs(securities):
 	for row in securities:
 		print(row["qty"], row["isin"])
@@ -767,18 +915,11 @@ def has_submission_ended(exam_submission):
 	"""
 	schedule, additional_time_given = frappe.get_cached_value("Exam Submission", exam_submission, ["exam_schedule", "additional_time_given"])
 	submission_status, sub_started_time = frappe.get_cached_value("Exam Submission", exam_submission, ["status", "exam_started_time"])
-	scheduled_start, duration, schedule_type = frappe.get_cached_value(
-	"Exam Schedule", schedule, ["start_date_time", "duration", "schedule_type"]
-	)
 	if submission_status != "Started":
 		frappe.throw(_("Exam is not started yet."))
 
-	if schedule_type == "Flexible":
-		end_time = sub_started_time + timedelta(minutes=duration) + \
-			timedelta(minutes=additional_time_given)
-	else:
-		end_time = scheduled_start + timedelta(minutes=duration) + \
-			timedelta(minutes=additional_time_given)
+	window = get_schedule_window(schedule)
+	end_time = calculate_end_time(window, sub_started_time, additional_time_given)
 
 	current_time = datetime.strptime(now(), '%Y-%m-%d %H:%M:%S.%f')
 
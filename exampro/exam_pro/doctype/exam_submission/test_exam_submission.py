@@ -1,9 +1,156 @@
 # Copyright (c) 2024, Labeeb Mattra and Contributors
 # See license.txt
 
-# import frappe
+import time
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from exampro.exam_pro.api import videoarchive
+from exampro.exam_pro.api.videoindex import clear_video_chunks
+from exampro.exam_pro.doctype.exam_submission import exam_submission as submission_module
+
+TEST_EXAM = "_Test Video Proctored Exam"
+
+
+def insert_submission(name, modified):
+	doc = frappe.get_doc({
+		"doctype": "Exam Submission",
+		"exam": TEST_EXAM,
+		"candidate": "Administrator",
+		"status": "Submitted"
+	})
+	doc.name = name
+	doc.creation = doc.modified = modified
+	doc.db_insert()
+	return doc
+
 
 class TestExamSubmission(FrappeTestCase):
 	pass
+
+
+class TestVideoCompaction(FrappeTestCase):
+	def setUp(self):
+		exam = frappe.get_doc({
+			"doctype": "Exam",
+			"title": TEST_EXAM,
+			"enable_video_proctoring": 1
+		})
+		exam.name = TEST_EXAM
+		exam.creation = exam.modified = "2000-01-01 00:00:00"
+		exam.db_insert()
+		# older than anything else on the site, so they are picked first
+		self.failing = insert_submission("_test-video-failing", "2000-01-01 00:00:00")
+		self.healthy = insert_submission("_test-video-healthy", "2000-01-01 00:01:00")
+
+	def tearDown(self):
+		frappe.db.rollback()
+
+	def test_failing_submission_does_not_block_the_next_batch(self):
+		compacted = []
+
+		def fake_compact(exam_submission):
+			if exam_submission == self.failing.name:
+				raise Exception("corrupt chunk")
+			compacted.append(exam_submission)
+			frappe.db.set_value("Exam Submission", exam_submission, "video_compacted", 1)
+
+		with patch.object(videoarchive, "compact_videos", fake_compact), \
+			patch.object(videoarchive, "COMPACT_BATCH_SIZE", 1), \
+			patch.object(videoarchive, "get_exam_settings", lambda: frappe._dict(compact_videos=1)), \
+			patch.object(frappe.db, "commit"), \
+			patch.object(frappe.db, "rollback"):
+			videoarchive.compact_finished_videos()
+			videoarchive.compact_finished_videos()
+
+		self.assertEqual(compacted, [self.healthy.name])
+		self.assertEqual(
+			frappe.db.get_value("Exam Submission", self.failing.name, "video_compaction_attempts"), 1
+		)
+
+	def test_submission_is_left_alone_after_max_attempts(self):
+		frappe.db.set_value(
+			"Exam Submission", self.failing.name,
+			"video_compaction_attempts", videoarchive.MAX_COMPACT_ATTEMPTS
+		)
+		frappe.db.set_value("Exam Submission", self.healthy.name, "video_compacted", 1)
+
+		with patch.object(videoarchive, "compact_videos") as compact, \
+			patch.object(videoarchive, "get_exam_settings", lambda: frappe._dict(compact_videos=1)):
+			videoarchive.compact_finished_videos()
+
+		self.assertNotIn(
+			self.failing.name, [call.args[0] for call in compact.call_args_list]
+		)
+
+
+class TestDirectVideoUpload(FrappeTestCase):
+	submission = "_test-video-upload"
+
+	def setUp(self):
+		self.s3_client = MagicMock()
+		self.s3_client.generate_presigned_url.side_effect = \
+			lambda method, Params, **kwargs: "https://s3/{}/{}".format(method, Params["Key"])
+		self.published = []
+		self.patches = [
+			patch.object(submission_module, "get_s3_client", lambda: self.s3_client),
+			patch.object(submission_module, "get_bucket", lambda: "_test-bucket"),
+			patch.object(submission_module, "validate_video_upload", lambda exam_submission: None),
+			patch.object(submission_module, "get_video_ttl", lambda exam_submission: 900),
+			patch.object(
+				submission_module, "publish_video_chunk",
+				lambda exam_submission, entry, ttl: self.published.append(entry["key"])
+			)
+		]
+		for p in self.patches:
+			p.start()
+		clear_video_chunks(self.submission)
+
+	def tearDown(self):
+		for p in self.patches:
+			p.stop()
+		clear_video_chunks(self.submission)
+
+	def presign(self, ts):
+		urls = submission_module.get_video_upload_urls(self.submission, frappe.as_json([ts]))
+		self.assertEqual(
+			urls[ts], "https://s3/put_object/{}/{}.webm".format(self.submission, ts)
+		)
+
+	def test_confirm_publishes_uploaded_chunk(self):
+		ts = int(time.time())
+		self.presign(ts)
+
+		res = submission_module.confirm_video_upload(self.submission, ts)
+
+		key = "{}/{}.webm".format(self.submission, ts)
+		self.assertEqual(res, {"status": True})
+		self.s3_client.head_object.assert_called_once_with(Bucket="_test-bucket", Key=key)
+		self.assertEqual(self.published, [key])
+		# a slot is confirmed only once
+		self.assertEqual(submission_module.confirm_video_upload(self.submission, ts), {"status": False})
+
+	def test_confirm_rejects_missing_object(self):
+		ts = int(time.time())
+		self.presign(ts)
+		self.s3_client.head_object.side_effect = ClientError(
+			{"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject"
+		)
+
+		self.assertEqual(submission_module.confirm_video_upload(self.submission, ts), {"status": False})
+		self.assertEqual(self.published, [])
+
+		# the upload lands, the retry goes through
+		self.s3_client.head_object.side_effect = None
+		self.assertEqual(submission_module.confirm_video_upload(self.submission, ts), {"status": True})
+		self.assertEqual(self.published, ["{}/{}.webm".format(self.submission, ts)])
+
+	def test_confirm_rejects_unissued_slot(self):
+		self.assertEqual(
+			submission_module.confirm_video_upload(self.submission, int(time.time())), {"status": False}
+		)
+		self.s3_client.head_object.assert_not_called()
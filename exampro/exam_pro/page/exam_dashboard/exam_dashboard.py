@@ -1,7 +1,14 @@
 import frappe
 from frappe.utils import getdate, add_days, nowdate, flt
+import hashlib
 import json
 
+from exampro.exam_pro.api.rollup import SCORE_BINS
+
+# dashboard results are cached per filter window
+DASHBOARD_CACHE = "exam_dashboard"
+DASHBOARD_CACHE_TTL = 60
+
 @frappe.whitelist()
 def get_dashboard_data(filters=None):
     """
@@ -16,84 +23,81 @@ def get_dashboard_data(filters=None):
             'end_date': nowdate()
         }
     
+    cache_key = "{}:{}".format(
+        DASHBOARD_CACHE,
+        hashlib.md5(frappe.as_json(filters).encode()).hexdigest()
+    )
+    data = frappe.cache().get_value(cache_key)
+    if data:
+        return data
+
+    totals = get_totals()
+    submitted = get_submitted_summary(filters)
+
     # Initialize data object
     data = {
-        'total_exams': get_total_exams(),
-        'total_schedules': get_total_schedules(),
-        'total_candidates': get_total_candidates(),
-        'completed_exams': get_completed_exams(filters),
-        'pass_rate': get_pass_rate(filters),
-        'avg_score': get_avg_score(filters),
+        'total_exams': totals.total_exams,
+        'total_schedules': totals.total_schedules,
+        'total_candidates': totals.total_candidates,
+        'completed_exams': submitted['completed_exams'],
+        'pass_rate': submitted['pass_rate'],
+        'avg_score': submitted['avg_score'],
         'status_distribution': get_status_distribution(filters),
         'submission_trend': get_submission_trend(filters),
-        'score_distribution': get_score_distribution(filters),
+        'score_distribution': submitted['score_distribution'],
         'schedule_types': get_schedule_types(filters),
         'recent_submissions': get_recent_submissions(filters),
         'top_exams': get_top_exams(filters)
     }
     
-    return data
-
-def get_total_exams():
-    """Return total number of exams"""
-    return frappe.db.count('Exam')
+    frappe.cache().set_value(cache_key, data, expires_in_sec=DASHBOARD_CACHE_TTL)
 
-def get_total_schedules():
-    """Return total number of exam schedules"""
-    return frappe.db.count('Exam Schedule')
+    return data
 
-def get_total_candidates():
-    """Return total number of candidates"""
-    # Count unique candidates in Exam Batch User
-    batch_users = frappe.db.sql("""
-        SELECT COUNT(DISTINCT candidate) as count 
-        FROM `tabExam Batch User`
-    """, as_dict=1)
-    
-    # Count unique candidates in Exam Submission
-    submission_users = frappe.db.sql("""
-        SELECT COUNT(DISTINCT candidate) as count 
-        FROM `tabExam Submission`
-    """, as_dict=1)
+def get_totals():
+    """Return total number of exams, schedules and candidates"""
+    totals = frappe.db.sql("""
+        SELECT
+            (SELECT COUNT(*) FROM `tabExam`) as total_exams,
+            (SELECT COUNT(*) FROM `tabExam Schedule`) as total_schedules,
+            (SELECT COUNT(DISTINCT candidate) FROM `tabExam Batch User`) as batch_candidates,
+            (SELECT COUNT(DISTINCT candidate) FROM `tabExam Submission`) as submission_candidates
+    """, as_dict=1)[0]
     
     # Return the higher count as some candidates might be in batches but not have submissions yet
-    return max(batch_users[0].count if batch_users else 0, submission_users[0].count if submission_users else 0)
-
-def get_completed_exams(filters):
-    """Return number of completed exams within the filter period"""
-    return frappe.db.count('Exam Submission', {
-        'status': 'Submitted',
-        'exam_submitted_time': ['between', [filters.get('start_date'), filters.get('end_date')]]
-    })
+    totals.total_candidates = max(totals.batch_candidates or 0, totals.submission_candidates or 0)
 
-def get_pass_rate(filters):
-    """Calculate pass rate percentage"""
-    total_submitted = frappe.db.count('Exam Submission', {
-        'status': 'Submitted',
-        'exam_submitted_time': ['between', [filters.get('start_date'), filters.get('end_date')]]
-    })
-    
-    if not total_submitted:
-        return 0
-    
-    passed = frappe.db.count('Exam Submission', {
-        'status': 'Submitted',
-        'result_status': 'Pass',
-        'exam_submitted_time': ['between', [filters.get('start_date'), filters.get('end_date')]]
-    })
-    
-    return int(passed / total_submitted * 100) if total_submitted > 0 else 0
+    return totals
 
-def get_avg_score(filters):
-    """Calculate average score of submitted exams"""
-    avg_score = frappe.db.sql("""
-        SELECT AVG(total_marks) as avg_score
-        FROM `tabExam Submission`
-        WHERE status = 'Submitted'
-        AND exam_submitted_time BETWEEN %s AND %s
-    """, (filters.get('start_date'), filters.get('end_date')), as_dict=1)
+def get_submitted_summary(filters):
+    """
+    Completed count, pass rate, average score and score histogram
+    of submitted exams within the filter period, from the daily rollups
+    """
+    bin_columns = ",\n            ".join(
+        "SUM(score_bin_{0}) as bin_{0}".format(idx) for idx in range(len(SCORE_BINS) - 1)
+    )
+    summary = frappe.db.sql("""
+        SELECT
+            SUM(submitted) as completed_exams,
+            SUM(passed) as passed,
+            SUM(score_sum) as score_sum,
+            {bins}
+        FROM `tabExam Daily Rollup`
+        WHERE date BETWEEN %s AND %s
+    """.format(bins=bin_columns),
+    (filters.get('start_date'), filters.get('end_date')), as_dict=1)[0]
+    
+    completed = int(summary.completed_exams or 0)
     
-    return flt(avg_score[0].avg_score) if avg_score and avg_score[0].avg_score else 0
+    return {
+        'completed_exams': completed,
+        'pass_rate': int(flt(summary.passed) / completed * 100) if completed else 0,
+        'avg_score': flt(summary.score_sum) / completed if completed else 0,
+        'score_distribution': [
+            int(summary.get("bin_{}".format(idx)) or 0) for idx in range(len(SCORE_BINS) - 1)
+        ]
+    }
 
 def get_status_distribution(filters):
     """Get distribution of exam submission statuses"""
@@ -135,55 +139,38 @@ def get_submission_trend(filters):
         interval = 30
         format_str = '%b %Y'
     
+    # Count submissions per interval, bucket is days since start date / interval
+    counts = frappe.db.sql("""
+        SELECT FLOOR(DATEDIFF(date, %(start_date)s) / %(interval)s) as bucket,
+            SUM(submitted) as count
+        FROM `tabExam Daily Rollup`
+        WHERE date BETWEEN %(start_date)s AND %(end_date)s
+        GROUP BY bucket
+    """, {
+        'start_date': start_date,
+        'end_date': end_date,
+        'interval': interval
+    }, as_dict=1)
+    counts = {int(d.bucket): int(d.count or 0) for d in counts}
+
     labels = []
     values = []
     
+    bucket = 0
     current_date = start_date
     while current_date <= end_date:
-        next_date = add_days(current_date, interval)
-        if next_date > end_date:
-            next_date = end_date
-            
         # Format the label
         labels.append(current_date.strftime(format_str))
+        values.append(counts.get(bucket, 0))
         
-        # Count submissions in this interval
-        count = frappe.db.count('Exam Submission', {
-            'exam_submitted_time': ['between', [current_date, next_date]]
-        })
-        values.append(count)
-        
-        current_date = add_days(next_date, 1)
+        bucket += 1
+        current_date = add_days(current_date, interval)
     
     return {
         'labels': labels,
         'values': values
     }
 
-def get_score_distribution(filters):
-    """Get distribution of scores in ranges"""
-    bins = [0, 20, 40, 60, 80, 100]
-    distribution = [0, 0, 0, 0, 0]  # For ranges 0-20, 21-40, 41-60, 61-80, 81-100
-    
-    # Get all scores from submitted exams
-    scores = frappe.db.sql("""
-        SELECT total_marks
-        FROM `tabExam Submission`
-        WHERE status = 'Submitted'
-        AND exam_submitted_time BETWEEN %s AND %s
-    """, (filters.get('start_date'), filters.get('end_date')), as_dict=1)
-    
-    for score_dict in scores:
-        score = score_dict.total_marks
-        if score is not None:
-            # Place the score in the appropriate bin
-            for i in range(len(bins) - 1):
-                if bins[i] <= score <= bins[i+1]:
-                    distribution[i] += 1
-                    break
-    
-    return distribution
-
 def get_schedule_types(filters):
     """Get distribution of schedule types (Fixed vs Flexible)"""
     data = frappe.db.sql("""
@@ -219,36 +206,23 @@ def get_recent_submissions(filters):
     return submissions
 
 def get_top_exams(filters):
-    """Get top exams by participation"""
-    # Get exams with submission counts
+    """Get top exams by participation, with pass rate of submitted exams"""
     exams = frappe.db.sql("""
-        SELECT es.exam, COUNT(DISTINCT es.name) as participants,
-               AVG(es.total_marks) as avg_score
-        FROM `tabExam Submission` es
-        WHERE es.creation BETWEEN %s AND %s
-        GROUP BY es.exam
+        SELECT exam, SUM(registered) as participants,
+               SUM(score_sum) / NULLIF(SUM(submitted), 0) as avg_score,
+               SUM(submitted) as submitted,
+               SUM(passed) as passed
+        FROM `tabExam Daily Rollup`
+        WHERE date BETWEEN %s AND %s
+        GROUP BY exam
         ORDER BY participants DESC
         LIMIT 10
     """, (filters.get('start_date'), filters.get('end_date')), as_dict=1)
     
-    # Calculate pass rate for each exam
     for exam in exams:
-        total = frappe.db.count('Exam Submission', {
-            'exam': exam.exam,
-            'status': 'Submitted',
-            'creation': ['between', [filters.get('start_date'), filters.get('end_date')]]
-        })
-        
-        if total > 0:
-            passed = frappe.db.count('Exam Submission', {
-                'exam': exam.exam,
-                'status': 'Submitted',
-                'result_status': 'Pass',
-                'creation': ['between', [filters.get('start_date'), filters.get('end_date')]]
-            })
-            
-            exam['pass_rate'] = int(passed / total * 100)
-        else:
-            exam['pass_rate'] = 0
+        submitted = exam.pop('submitted') or 0
+        passed = exam.pop('passed') or 0
+        exam['participants'] = int(exam['participants'] or 0)
+        exam['pass_rate'] = int(flt(passed) / submitted * 100) if submitted else 0
     
     return exams
@@ -26,6 +26,19 @@ frappe.query_reports["Exam Schedule Status"] = {
 			"label": __("To Date"),
 			"fieldtype": "Date",
 			"default": frappe.datetime.add_days(frappe.datetime.get_today(), 30)
+		},
+		{
+			"fieldname": "page",
+			"label": __("Page"),
+			"fieldtype": "Int",
+			"default": 1
+		},
+		{
+			"fieldname": "page_length",
+			"label": __("Rows per Page"),
+			"fieldtype": "Select",
+			"options": "100\n500\n1000\n5000",
+			"default": "500"
 		}
 	],
 	"formatter": function(value, row, column, data, default_formatter) {
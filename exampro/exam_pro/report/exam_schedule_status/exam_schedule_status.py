@@ -3,6 +3,11 @@
 
 import frappe
 from frappe import _
+from frappe.utils import cint, now_datetime
+
+from exampro.exam_pro.api.schedulewindow import SCHEDULE_STATUS_CONDITIONS, SCHEDULE_STATUS_SQL
+
+DEFAULT_PAGE_LENGTH = 500
 
 def execute(filters=None):
     columns = get_columns()
@@ -46,39 +51,37 @@ def get_columns():
     ]
 
 def get_data(filters):
+    filters = filters or {}
     conditions = []
-    values = {}
-    
+    values = {"now": now_datetime()}
+
     if filters.get("exam"):
-        conditions.append("exam = %(exam)s")
+        conditions.append("sch.exam = %(exam)s")
         values["exam"] = filters.get("exam")
-    
+
     if filters.get("from_date") and filters.get("to_date"):
-        conditions.append("start_date_time BETWEEN %(from_date)s AND %(to_date)s")
+        conditions.append("sch.start_date_time BETWEEN %(from_date)s AND %(to_date)s")
         values["from_date"] = filters.get("from_date")
         values["to_date"] = filters.get("to_date")
-    
-    where_clause = " AND ".join(conditions) if conditions else ""
-    where_clause = "WHERE " + where_clause if where_clause else ""
-    
-    data = frappe.db.sql(
+
+    if filters.get("status") in SCHEDULE_STATUS_CONDITIONS:
+        conditions.append(SCHEDULE_STATUS_CONDITIONS[filters.get("status")])
+
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    page_length = cint(filters.get("page_length")) or DEFAULT_PAGE_LENGTH
+    values["page_length"] = page_length
+    values["start"] = (max(cint(filters.get("page")), 1) - 1) * page_length
+
+    return frappe.db.sql(
         f"""
-        SELECT name, exam, start_date_time, duration, schedule_type, schedule_expire_in_days
-        FROM `tabExam Schedule`
+        SELECT sch.name, sch.exam, sch.start_date_time, sch.duration,
+            {SCHEDULE_STATUS_SQL} as status
+        FROM `tabExam Schedule` sch
         {where_clause}
-        ORDER BY start_date_time DESC
+        ORDER BY sch.start_date_time DESC
+        LIMIT %(start)s, %(page_length)s
         """,
         values,
         as_dict=1
     )
-    
-    # Calculate status for each schedule
-    for row in data:
-        doc = frappe.get_doc("Exam Schedule", row.name)
-        row["status"] = doc.get_status()
-    
-    # Filter by status if specified
-    if filters.get("status"):
-        data = [row for row in data if row.get("status") == filters.get("status")]
-    
-    return data
@@ -162,6 +162,19 @@ doc_events = {
 #	],
 # }
 
+scheduler_events = {
+    "cron": {
+        "* * * * *": [
+            "exampro.exam_pro.api.answerbuffer.flush_pending_answer_buffers",
+            "exampro.exam_pro.api.autosubmit.submit_expired_submissions"
+        ],
+        "*/10 * * * *": [
+            "exampro.exam_pro.api.rollup.update_daily_rollups",
+            "exampro.exam_pro.api.videoarchive.compact_finished_videos"
+        ]
+    }
+}
+
 # Testing
 # -------
 
@@ -193,7 +206,7 @@ doc_events = {
 # Request Events
 # ----------------
 # before_request = ["exampro.utils.before_request"]
-after_request = ["exampro.exam_pro.api.utils.cleanup_request"]
+# after_request = ["exampro.utils.after_request"]
 
 # Job Events
 # ----------
@@ -3,6 +3,8 @@ var visibleTime = 0;
 var examOverview;
 var currentQuestion;
 var detector;
+// full question paper, prefetched once per exam
+var examPaper;
 
 // Function to update the countdown timer
 function updateTimer() {
@@ -54,17 +56,187 @@ let recorder;
 let stream;
 let recordingInterval;
 
+// seconds of video per uploaded chunk and recording bitrate, advertised by the server
+var videoChunkSeconds = 10;
+var videoBitsPerSecond = 8000;
+// presigned upload urls for direct uploads, timestamp -> url
+var uploadSlots = {};
+const UPLOAD_SLOT_BATCH = 6;
+
+// recorded chunks waiting to be uploaded, {blob, ts, attempts}
+// > at most MAX_ACTIVE_UPLOADS uploads run at a time, the rest wait in the queue
+// > failed uploads are retried with exponential backoff, the oldest chunks
+//   are dropped once the queue is full so a long outage can not exhaust memory
+var videoUploadQueue = [];
+var activeUploads = 0;
+const MAX_ACTIVE_UPLOADS = 2;
+const MAX_QUEUED_UPLOADS = 60;
+const MAX_UPLOAD_ATTEMPTS = 5;
+const UPLOAD_BACKOFF_MS = 2000;
+const MAX_UPLOAD_BACKOFF_MS = 60000;
+
 function sendVideoBlob(blob) {
-    let xhr = new XMLHttpRequest();
-    const unixTimestamp = Math.floor(Date.now() / 1000);
-    xhr.open('POST', '/api/method/exampro.exam_pro.doctype.exam_submission.exam_submission.upload_video', true);
-    xhr.setRequestHeader('Accept', 'application/json');
-    xhr.setRequestHeader('X-Frappe-CSRF-Token', frappe.csrf_token);
-
-    let form_data = new FormData();
-    form_data.append('file', blob, unixTimestamp + ".webm");
-    form_data.append('exam_submission', exam["exam_submission"])
-    xhr.send(form_data);
+    videoUploadQueue.push({ blob: blob, ts: Math.floor(Date.now() / 1000), attempts: 0 });
+    while (videoUploadQueue.length > MAX_QUEUED_UPLOADS) {
+        let dropped = videoUploadQueue.shift();
+        console.error("Video upload queue full, dropped chunk", dropped.ts);
+    }
+    processUploadQueue();
+}
+
+function processUploadQueue() {
+    while (activeUploads < MAX_ACTIVE_UPLOADS && videoUploadQueue.length) {
+        let job = videoUploadQueue.shift();
+        activeUploads++;
+        uploadVideoChunk(job)
+            .catch((error) => {
+                job.attempts++;
+                if (job.attempts >= MAX_UPLOAD_ATTEMPTS) {
+                    console.error("Video upload failed, giving up on chunk", job.ts, error);
+                    return;
+                }
+                let delay = Math.min(
+                    UPLOAD_BACKOFF_MS * Math.pow(2, job.attempts - 1), MAX_UPLOAD_BACKOFF_MS
+                );
+                // jitter spreads the retries of candidates who lost connection together
+                delay = delay / 2 + Math.random() * delay / 2;
+                return new Promise((resolve) => setTimeout(resolve, delay)).then(() => {
+                    videoUploadQueue.unshift(job);
+                });
+            })
+            .finally(() => {
+                activeUploads--;
+                processUploadQueue();
+            });
+    }
+}
+
+function uploadVideoChunk(job) {
+    if (exam["direct_video_upload"]) {
+        return uploadVideoBlobDirect(job.blob, job.ts);
+    }
+    return postVideoBlob(job.blob, job.ts);
+}
+
+// fetch presigned urls for the chunks starting at fromTs
+function requestUploadSlots(fromTs) {
+    let timestamps = [];
+    for (let i = 0; i < UPLOAD_SLOT_BATCH; i++) {
+        timestamps.push(fromTs + i * videoChunkSeconds);
+    }
+    return new Promise((resolve) => {
+        frappe.call({
+            method: "exampro.exam_pro.doctype.exam_submission.exam_submission.get_video_upload_urls",
+            args: {
+                exam_submission: exam["exam_submission"],
+                timestamps: JSON.stringify(timestamps)
+            },
+            callback: (data) => {
+                Object.assign(uploadSlots, data.message || {});
+                resolve();
+            },
+            error: () => resolve()
+        });
+    });
+}
+
+// take the unused slot closest to the chunk, null if none is close enough
+function takeUploadSlot(unixTimestamp) {
+    let best = null;
+    Object.keys(uploadSlots).forEach((ts) => {
+        let distance = Math.abs(parseInt(ts, 10) - unixTimestamp);
+        if (distance <= videoChunkSeconds * 2 &&
+            (best === null || distance < Math.abs(parseInt(best, 10) - unixTimestamp))) {
+            best = ts;
+        }
+    });
+    if (best === null) return null;
+
+    // drop this and older slots, they can not be used anymore
+    let slot = { ts: best, url: uploadSlots[best] };
+    Object.keys(uploadSlots).forEach((ts) => {
+        if (parseInt(ts, 10) <= parseInt(best, 10)) delete uploadSlots[ts];
+    });
+    return slot;
+}
+
+function uploadVideoBlobDirect(blob, unixTimestamp) {
+    let slot = takeUploadSlot(unixTimestamp);
+    if (!slot) {
+        return requestUploadSlots(unixTimestamp).then(() => {
+            let slot = takeUploadSlot(unixTimestamp);
+            if (slot) {
+                return putVideoBlob(blob, slot);
+            }
+            return postVideoBlob(blob, unixTimestamp);
+        });
+    }
+
+    // keep a few slots ahead of the recording
+    let remaining = Object.keys(uploadSlots).map((ts) => parseInt(ts, 10));
+    if (remaining.length < 2) {
+        let lastTs = remaining.length ? Math.max(...remaining) : parseInt(slot.ts, 10);
+        requestUploadSlots(lastTs + videoChunkSeconds);
+    }
+    return putVideoBlob(blob, slot);
+}
+
+function putVideoBlob(blob, slot) {
+    return fetch(slot.url, {
+        method: 'PUT',
+        body: blob,
+        headers: { 'Content-Type': 'video/webm' }
+    }).then((response) => {
+        if (!response.ok) throw new Error(response.status);
+        frappe.call({
+            method: "exampro.exam_pro.doctype.exam_submission.exam_submission.confirm_video_upload",
+            args: {
+                exam_submission: exam["exam_submission"],
+                timestamp: slot.ts
+            }
+        });
+    }).catch((error) => {
+        // storage unreachable from the browser, go through the server
+        console.error("Direct video upload failed:", error);
+        return postVideoBlob(blob, parseInt(slot.ts, 10));
+    });
+}
+
+function postVideoBlob(blob, unixTimestamp) {
+    return new Promise((resolve, reject) => {
+        let xhr = new XMLHttpRequest();
+        xhr.open('POST', '/api/method/exampro.exam_pro.doctype.exam_submission.exam_submission.upload_video', true);
+        xhr.setRequestHeader('Accept', 'application/json');
+        xhr.setRequestHeader('X-Frappe-CSRF-Token', frappe.csrf_token);
+        xhr.onload = () => {
+            let res = {};
+            try {
+                res = JSON.parse(xhr.responseText).message || {};
+            } catch (e) {}
+            if (xhr.status === 200 && res.status) {
+                resolve();
+            } else if (xhr.status === 403) {
+                // exam is over, retrying will not help
+                resolve();
+            } else {
+                reject(new Error(xhr.status));
+            }
+        };
+        xhr.onerror = () => reject(new Error("network error"));
+
+        let form_data = new FormData();
+        form_data.append('file', blob, unixTimestamp + ".webm");
+        form_data.append('exam_submission', exam["exam_submission"])
+        xhr.send(form_data);
+    });
+}
+
+function newRecorder() {
+    return RecordRTC(stream, {
+        type: 'video',
+        mimeType: 'video/webm',
+        videoBitsPerSecond: videoBitsPerSecond
+    });
 }
 
 // Function to start recording
@@ -75,6 +247,11 @@ function startRecording() {
         video: true
     };
 
+    if (exam["video_recording"]) {
+        videoChunkSeconds = exam["video_recording"]["chunk_seconds"] || videoChunkSeconds;
+        videoBitsPerSecond = exam["video_recording"]["bits_per_second"] || videoBitsPerSecond;
+    }
+
     navigator.mediaDevices.getUserMedia(constraints)
         .then(function (mediaStream) {
             stream = mediaStream;
@@ -94,28 +271,23 @@ function startRecording() {
 
             if (exam["submission_status"] === "Started") { 
             // Create a recorder instance
-            recorder = RecordRTC(stream, {
-                type: 'video',
-                mimeType: 'video/webm',
-                videoBitsPerSecond: 8000
-
-            });
+            recorder = newRecorder();
 
             // Start recording
             recorder.startRecording();
 
-            // Start sending recorded blobs to the server every 10 seconds
+            // Queue the recorded blob for upload every chunk interval
             recordingInterval = setInterval(function () {
                 recorder.stopRecording(function () {
                     // Get the recorded blob
                     let blob = recorder.getBlob();
 
                     sendVideoBlob(blob);
-                    // Reset the recorder
-                    recorder = RecordRTC(stream, { type: 'video' });
+                    // Reset the recorder, with the same settings as the first one
+                    recorder = newRecorder();
                     recorder.startRecording();
                 });
-            }, 10000);
+            }, videoChunkSeconds * 1000);
             }
         })
         .catch(function (error) {
@@ -231,7 +403,9 @@ frappe.ready(() => {
         $("#start-banner").addClass("hide");
         $("#quiz-form").removeClass("hide");
         // on first load, show the last question loaded
-        getQuestion(exam["current_qs"]);
+        loadExamPaper(() => {
+            getQuestion(exam["current_qs"]);
+        });
     }
 
     if (exam.submission_status === "Started" || exam.submission_status === "Registered") {
@@ -280,14 +454,21 @@ frappe.ready(() => {
         $('#toggleButton').text('Show Video');
     });
 
-    // frappe.realtime.on('newcandidatemsg', (data) => {
-    //     convertedTime = timeAgo(data.creation);
-    //     addChatBubble(convertedTime, data.message, data.type_of_message)
-    // });
+    onRealtime('newcandidatemsg', (data) => {
+        if (data.exam_submission === exam["exam_submission"]) {
+            processMessage(data.exam_submission, data);
+        }
+    });
 
-    setInterval(function () {
+    // catch up on anything missed before the socket connected
+    updateMessages(exam["exam_submission"]);
+    pollWithFallback(function () {
         updateMessages(exam["exam_submission"]);
-    }, 3000); // 3 seconds
+    }, MESSAGE_POLL_INTERVAL, MESSAGE_FALLBACK_POLL_INTERVAL);
+
+    $('#chat-input').on('click', function() {
+        $('#messages .chat-container').scrollTop($('#messages .chat-container')[0].scrollHeight);
+    });
 
     // Attach event listener for all inputs with names starting with "qs_"
     $(document).on('change', 'input[name^="qs_"]', function () {
@@ -304,79 +485,149 @@ frappe.ready(() => {
 
 
 
-function updateOverviewMap() {
+function loadExamPaper(callback) {
+    // questions are cached in the browser, server skips them if etag matches
+    const paperKey = "exampaper_" + exam.exam_submission;
+    let cachedPaper = null;
+    try {
+        cachedPaper = JSON.parse(localStorage.getItem(paperKey));
+    } catch (e) {
+        cachedPaper = null;
+    }
+
     frappe.call({
-        method: "exampro.exam_pro.doctype.exam_submission.exam_submission.exam_overview",
+        method: "exampro.exam_pro.doctype.exam_submission.exam_submission.get_exam_paper",
+        type: "POST",
         args: {
             "exam_submission": exam.exam_submission,
+            "etag": cachedPaper ? cachedPaper.etag : "",
         },
-        success: (data) => {
-            examOverview = data.message;
-            // if this is the lastQs, change button
-            if (currentQuestion) {
-                if (currentQuestion["no"] === examOverview["total_questions"]) {
-                    $('#nextQs').hide();
-                    $('#finish').show();
-                } else {
-                    $('#nextQs').show();
-                    $('#finish').hide();
-                }
+        callback: (data) => {
+            let paper = data.message;
+            if (!paper.questions && cachedPaper) {
+                paper.questions = cachedPaper.questions;
+            }
+            examPaper = paper;
+            try {
+                localStorage.setItem(paperKey, JSON.stringify({
+                    "etag": paper.etag,
+                    "questions": paper.questions
+                }));
+            } catch (e) {
+                console.log("Could not cache the exam paper.");
             }
+            callback();
+        },
+        error: () => {
+            // fall back to fetching questions one by one
+            callback();
+        }
+    });
+};
 
-            // document.getElementById("answered").innerHTML = data.message.total_answered;
-            // document.getElementById("notattempted").innerHTML = data.message.total_not_attempted;
-            document.getElementById("markedforlater").innerHTML = data.message.total_marked_for_later;
-            $("#question-length").text(data.message.total_questions);
+function getLocalOverview() {
+    let overview = {
+        "exam_submission": exam.exam_submission,
+        "submitted": examPaper.answers,
+        "total_questions": examPaper.total_questions,
+        "total_answered": 0,
+        "total_marked_for_later": 0,
+        "total_not_attempted": 0
+    };
+    $.each(examPaper.answers, function (qsNo, ans) {
+        if (ans.marked_for_later) {
+            overview.total_marked_for_later += 1;
+        } else {
+            overview.total_answered += 1;
+        }
+    });
+    overview.total_not_attempted = overview.total_questions -
+        overview.total_answered - overview.total_marked_for_later;
+    return overview;
+};
 
-            // populate buttons
-            if (data.message.total_questions != 0) {
-                $("#button-grid").html('');
-            }
-            for (let i = 1; i <= data.message.total_questions; i++) {
-                let btnCls = "btn-outline-secondary";
-                let btnStyle = "";
-                
-                // Determine button style based on question status
-                if (data.message.submitted[i] && data.message.submitted[i].marked_for_later) {
-                    btnCls = "btn-warning text-white";
-                    btnStyle = "";
-                } else if (data.message.submitted[i] && data.message.submitted[i].answer) {
-                    btnCls = "btn-outline-success";
-                    btnStyle = "border-width: 2px;";
-                }
-                
-                // If this is the current question, highlight it
-                if (currentQuestion && i === currentQuestion["no"]) {
-                    btnCls = "btn-primary";
-                }
-                
-                // Create a new button
-                const button = $("<button></button>");
-                button.addClass("exam-map-btn btn " + btnCls);
-                button.attr("id", "button-" + i);
-                button.attr("style", btnStyle);
-                
-                // Set the button content based on question status
-                if (data.message.submitted[i] && data.message.submitted[i].marked_for_later) {
-                    button.html(answrLater + ' ' + i);
-                } else if (data.message.submitted[i] && data.message.submitted[i].answer) {
-                    button.html(answrdCheck + ' ' + i);
-                } else {
-                    button.text(i);
-                }
-                
-                // Append the button to the grid
-                $("#button-grid").append(button);
-                
-                // Add click event handler
-                button.click((e) => {
-                    getQuestion(i);
-                });
-            }
+function updateOverviewMap() {
+    if (examPaper) {
+        renderOverviewMap(getLocalOverview());
+        return;
+    }
+    frappe.call({
+        method: "exampro.exam_pro.doctype.exam_submission.exam_submission.exam_overview",
+        args: {
+            "exam_submission": exam.exam_submission,
+        },
+        success: (data) => {
+            renderOverviewMap(data.message);
         },
     });
 };
 
+function renderOverviewMap(overview) {
+    examOverview = overview;
+    let data = {"message": overview};
+    // if this is the lastQs, change button
+    if (currentQuestion) {
+        if (currentQuestion["no"] === examOverview["total_questions"]) {
+            $('#nextQs').hide();
+            $('#finish').show();
+        } else {
+            $('#nextQs').show();
+            $('#finish').hide();
+        }
+    }
+
+    // document.getElementById("answered").innerHTML = data.message.total_answered;
+    // document.getElementById("notattempted").innerHTML = data.message.total_not_attempted;
+    document.getElementById("markedforlater").innerHTML = data.message.total_marked_for_later;
+    $("#question-length").text(data.message.total_questions);
+
+    // populate buttons
+    if (data.message.total_questions != 0) {
+        $("#button-grid").html('');
+    }
+    for (let i = 1; i <= data.message.total_questions; i++) {
+        let btnCls = "btn-outline-secondary";
+        let btnStyle = "";
+        
+        // Determine button style based on question status
+        if (data.message.submitted[i] && data.message.submitted[i].marked_for_later) {
+            btnCls = "btn-warning text-white";
+            btnStyle = "";
+        } else if (data.message.submitted[i] && data.message.submitted[i].answer) {
+            btnCls = "btn-outline-success";
+            btnStyle = "border-width: 2px;";
+        }
+        
+        // If this is the current question, highlight it
+        if (currentQuestion && i === currentQuestion["no"]) {
+            btnCls = "btn-primary";
+        }
+        
+        // Create a new button
+        const button = $("<button></button>");
+        button.addClass("exam-map-btn btn " + btnCls);
+        button.attr("id", "button-" + i);
+        button.attr("style", btnStyle);
+        
+        // Set the button content based on question status
+        if (data.message.submitted[i] && data.message.submitted[i].marked_for_later) {
+            button.html(answrLater + ' ' + i);
+        } else if (data.message.submitted[i] && data.message.submitted[i].answer) {
+            button.html(answrdCheck + ' ' + i);
+        } else {
+            button.text(i);
+        }
+        
+        // Append the button to the grid
+        $("#button-grid").append(button);
+        
+        // Add click event handler
+        button.click((e) => {
+            getQuestion(i);
+        });
+    }
+};
+
 function displayQuestion(current_qs) {
     // $("#quiz-form").fadeOut(300);
     currentQuestion = {
@@ -587,6 +838,9 @@ function startExam() {
             if (data.message && data.message.end_time) {
                 exam.end_time = data.message.end_time;
             }
+            if (data.message && data.message.video_recording) {
+                exam.video_recording = data.message.video_recording;
+            }
             
             $("#start-banner").addClass("hide");
             $("#quiz-form").removeClass("hide");
@@ -602,6 +856,17 @@ function getQuestion(qsno) {
     if (currentQuestion && currentQuestion.no > 1) {
         submitAnswer(false);
     }
+    // navigate locally if the paper is prefetched
+    if (examPaper && examPaper.questions && examPaper.questions[qsno - 1]) {
+        let current_qs = Object.assign({}, examPaper.questions[qsno - 1]);
+        let submitted = examPaper.answers[qsno] || {};
+        current_qs.answer = submitted.answer;
+        current_qs.marked_for_later = submitted.marked_for_later;
+        displayQuestion(current_qs);
+        currentQsNo = current_qs.qs_no;
+        updateOverviewMap();
+        return;
+    }
     frappe.call({
         method: "exampro.exam_pro.doctype.exam_submission.exam_submission.get_question",
         type: "POST",
@@ -699,6 +964,12 @@ function submitAnswer(loadNext) {
         },
         callback: (data) => {
             console.log("submitted answer.");
+            if (examPaper) {
+                examPaper.answers[data.message.qs_no] = {
+                    "answer": answer,
+                    "marked_for_later": mrkForLtr
+                };
+            }
             // check if this is the last question
             if (loadNext) {
                 if (data.message.qs_no < examOverview["total_questions"]) {
@@ -1,4 +1,6 @@
 const existingMessages = {};
+// creation of the last message fetched, per submission
+const messageCursors = {};
 
 const examAlert = (alertTitle, alertText) => {
     $('#alertTitle').text(alertTitle);
@@ -75,51 +77,83 @@ const addChatBubble = (timestamp, message, messageType, messageFrom) => {
     
 }
 
-const updateMessages = (exam_submission) => {
+// realtime push is used when the socket is up, polling is only a fallback
+const MESSAGE_POLL_INTERVAL = 3000;
+const MESSAGE_FALLBACK_POLL_INTERVAL = 30000;
+
+const isRealtimeConnected = () => {
+    return !!(frappe.realtime && frappe.realtime.socket && frappe.realtime.socket.connected);
+};
+
+const onRealtime = (event, handler) => {
+    if (frappe.realtime && frappe.realtime.on) {
+        frappe.realtime.on(event, handler);
+    }
+};
+
+// call fn every `interval` ms, slowing down to `connectedInterval` ms
+// while realtime is connected. returns a function to stop polling.
+const pollWithFallback = (fn, interval, connectedInterval) => {
+    let timer = null;
+    let stopped = false;
+    const tick = () => {
+        if (stopped) return;
+        fn();
+        timer = setTimeout(tick, isRealtimeConnected() ? connectedInterval : interval);
+    };
+    timer = setTimeout(tick, isRealtimeConnected() ? connectedInterval : interval);
+
+    return () => {
+        stopped = true;
+        clearTimeout(timer);
+    };
+};
+
+const processMessage = (exam_submission, chatmsg) => {
     if (!(exam_submission in existingMessages)) {
         existingMessages[exam_submission] = [];
     }
+    // check msg already processed
+    if (existingMessages[exam_submission].includes(chatmsg.creation)) {
+        return;
+    }
+
+    convertedTime = timeAgo(chatmsg.creation);
+    if (chatmsg.type_of_message === "Critical") {
+        frappe.msgprint({
+            title: 'Critial',
+            message: chatmsg.message ,
+            primary_action:{
+                action(values) {
+                    window.location.reload();
+                }
+            }
+        });
+        setTimeout(function() {
+            window.location.reload()
+        }, 5000); // 5 seconds delay
+    } else {
+        addChatBubble(convertedTime, chatmsg.message, chatmsg.type_of_message, chatmsg.from);
+    }
+
+    existingMessages[exam_submission].push(chatmsg.creation);
+    $("#msgCount").text(existingMessages[exam_submission].length);
+};
+
+const updateMessages = (exam_submission) => {
     frappe.call({
         method: "exampro.exam_pro.doctype.exam_submission.exam_submission.exam_messages",
         args: {
             'exam_submission': exam_submission,
+            'since': messageCursors[exam_submission] || null,
         },
         callback: (data) => {
-            msgData = data.message["messages"];
-            $("#msgCount").text(msgData.length);
+            messageCursors[exam_submission] = data.message["last"];
             // loop through msgs and add alerts
             // Add new messages as alerts to the Bootstrap div
-            msgData.forEach(chatmsg => {
-                // check msg already processed
-                if (existingMessages[exam_submission].includes(chatmsg.creation)) {
-                    return;
-                }
-
-                convertedTime = timeAgo(chatmsg.creation);
-                if (chatmsg.type_of_message === "Critical") {
-                    frappe.msgprint({
-                        title: 'Critial',
-                        message: chatmsg.message ,
-                        primary_action:{
-                            action(values) {
-                                window.location.reload();
-                            }
-                        }
-                    });
-                    setTimeout(function() {
-                        window.location.reload()
-                    }, 5000); // 5 seconds delay
-                } else {
-                    addChatBubble(convertedTime, chatmsg.message, chatmsg.type_of_message, chatmsg.from);
-                }
-
-                existingMessages[exam_submission].push(chatmsg.creation);
+            data.message["messages"].forEach(chatmsg => {
+                processMessage(exam_submission, chatmsg);
             });
-
         },
     });
-
-    $('#chat-input').on('click', function() {
-        $('#messages .chat-container').scrollTop($('#messages .chat-container')[0].scrollHeight);
-    });
 };
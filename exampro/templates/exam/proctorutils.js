@@ -1,4 +1,7 @@
 var videoStore = {};
+// uploaded chunks per submission, timestamp -> url, and the list cursor
+var videoChunks = {};
+var videoCursors = {};
 var currentVideoIndex = {};
 var videoBlobStore = {};
 const MAX_BLOB_CACHE_SIZE = 4;
@@ -8,6 +11,53 @@ const togglePlayBtn = document.getElementsByClassName("togglePlayBtn");
 
 // Cache for storing the last known message for each candidate
 var lastKnownMessages = {};
+// stops the message poll of the open chat
+var stopProcMessagePoll = null;
+
+/**
+ * Merge chunks returned by proctor_video_list into videoStore, ordered by timestamp.
+ * Returns true if new chunks were added.
+ */
+function mergeVideoChunks(exam_submission, videos) {
+  if (!videoChunks[exam_submission]) {
+    videoChunks[exam_submission] = {};
+  }
+
+  let added = false;
+  Object.entries(videos || {}).forEach(([unixtimestamp, videourl]) => {
+    if (!(unixtimestamp in videoChunks[exam_submission])) {
+      added = true;
+    }
+    videoChunks[exam_submission][unixtimestamp] = videourl;
+  });
+
+  videoStore[exam_submission] = Object.keys(videoChunks[exam_submission])
+    .sort((a, b) => parseInt(a, 10) - parseInt(b, 10))
+    .map((unixtimestamp) => videoChunks[exam_submission][unixtimestamp]);
+
+  return added;
+}
+
+/**
+ * Show or hide the offline overlay from the age of the latest chunk.
+ */
+function updateConnectionStatus(exam_submission) {
+  if (!videoStore[exam_submission] || !videoStore[exam_submission].length) return;
+
+  const lastVideoUrl = videoStore[exam_submission][videoStore[exam_submission].length - 1];
+  const disconnected = videoDisconnected(lastVideoUrl);
+  const offlineOverlay = document.getElementById(`offline-overlay-${exam_submission}`);
+
+  if (disconnected && offlineOverlay) {
+    offlineOverlay.classList.add("show");
+    // Update the message sidebar status badge to "Offline"
+    updateMessageCardStatus(exam_submission, "offline");
+  } else if (offlineOverlay) {
+    offlineOverlay.classList.remove("show");
+    // Update the message sidebar status badge to "Started"
+    updateMessageCardStatus(exam_submission, "started");
+  }
+}
 
 /**
  * A utility function to manage the FIFO queue-like behavior of the videoBlobStore.
@@ -326,36 +376,47 @@ function appendMessage(convertedTime, text, sender) {
   chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
-const updateProcMessages = (exam_submission) => {
+const processProcMessage = (exam_submission, chatmsg) => {
   if (!(exam_submission in existingMessages)) {
       existingMessages[exam_submission] = [];
   }
+  // check msg already processed
+  if (existingMessages[exam_submission].includes(chatmsg.creation)) {
+      return;
+  }
+  convertedTime = timeAgo(chatmsg.creation);
+  appendMessage(convertedTime, chatmsg.message, chatmsg.from);
+  existingMessages[exam_submission].push(chatmsg.creation);
+  $("#msgCount").text(existingMessages[exam_submission].length);
+};
+
+const updateProcMessages = (exam_submission) => {
   frappe.call({
       method: "exampro.exam_pro.doctype.exam_submission.exam_submission.exam_messages",
       args: {
           'exam_submission': exam_submission,
+          'since': messageCursors[exam_submission] || null,
       },
       callback: (data) => {
-          msgData = data.message["messages"];
-          $("#msgCount").text(msgData.length);
-
-          // loop through msgs and add alerts
-          // Add new messages as alerts to the Bootstrap div
-          msgData.forEach(chatmsg => {
-              // check msg already processed
-                if (existingMessages[exam_submission].includes(chatmsg.creation)) {
-                  return;
-              }
-              convertedTime = timeAgo(chatmsg.creation);
-              appendMessage(convertedTime, chatmsg.message, chatmsg.from);
-              existingMessages[exam_submission].push(chatmsg.creation);
-          });
+          // ignore responses for a chat that is no longer open
+          if (exam_submission !== activeChat) return;
+          messageCursors[exam_submission] = data.message["last"];
 
+          data.message["messages"].forEach(chatmsg => {
+              processProcMessage(exam_submission, chatmsg);
+          });
       },
   });
 
 };
 
+function stopChatPolling() {
+  if (stopProcMessagePoll) {
+    stopProcMessagePoll();
+    stopProcMessagePoll = null;
+  }
+}
+
 function openChatModal(event) {
   let videoId, candName, videoSrc;
   
@@ -442,12 +503,16 @@ function openChatModal(event) {
   activeChat = videoId;
   $("#chat-messages").empty();
   existingMessages[videoId] = [];
+  delete messageCursors[videoId];
   
   console.log(`Chat modal opened for: ${candName} (${videoId})`);
 
-  setInterval(function () {
+  // one poll per open chat, replacing the previous chat's poll
+  stopChatPolling();
+  updateProcMessages(videoId);
+  stopProcMessagePoll = pollWithFallback(function () {
     updateProcMessages(videoId);
-  }, 1000); // 1 seconds
+  }, MESSAGE_POLL_INTERVAL, MESSAGE_FALLBACK_POLL_INTERVAL);
 }
 
 function onLoanMetaData() {
@@ -578,6 +643,7 @@ function updateVideoList() {
         "exampro.exam_pro.doctype.exam_submission.exam_submission.proctor_video_list",
       args: {
         exam_submission: exam_submission,
+        since: videoCursors[exam_submission] || 0,
       },
       success: (data) => {
         var vid = document.getElementById(exam_submission);
@@ -592,46 +658,73 @@ function updateVideoList() {
         if (!container) return;
         
         container.classList.remove("hidden");
-        // convert api response to an array of objects
-        let videoList = Object.entries(data.message.videos).map(
-          ([unixtimestamp, videourl]) => {
-            return { unixtimestamp: parseInt(unixtimestamp, 10), videourl };
-          },
-        );
-        // sort them
-        videoList.sort((a, b) => a.unixtimestamp - b.unixtimestamp);
+        // only chunks uploaded after the cursor are returned
+        const added = mergeVideoChunks(exam_submission, data.message.videos);
+        videoCursors[exam_submission] = data.message.last;
 
-        videoStore[exam_submission] = videoList.map((video) => video.videourl);
-        
         // Check connection status before playing video
-        if (videoStore[exam_submission].length > 0) {
-          const lastVideoUrl = videoStore[exam_submission][videoStore[exam_submission].length - 1];
-          const disconnected = videoDisconnected(lastVideoUrl);
-          const offlineOverlay = document.getElementById(`offline-overlay-${exam_submission}`);
-          
-          if (disconnected && offlineOverlay) {
-            offlineOverlay.classList.add("show");
-            // Update the message sidebar status badge to "Offline"
-            updateMessageCardStatus(exam_submission, "offline");
-          } else if (offlineOverlay) {
-            offlineOverlay.classList.remove("show");
-            // Update the message sidebar status badge to "Started"
-            updateMessageCardStatus(exam_submission, "started");
-          }
-        }
-        
+        updateConnectionStatus(exam_submission);
+
         // Make sure control elements have ID-specific IDs
         updateControlElementIds();
-        
-        playVideoAtIndex(
-          exam_submission,
-          videoStore[exam_submission].length - 1,
-        );
+
+        if (added) {
+          playVideoAtIndex(
+            exam_submission,
+            videoStore[exam_submission].length - 1,
+          );
+        }
       },
     });
   }
 }
 
+function refreshMessageCard(card, msg) {
+  const messageText = card.querySelector('.message-text');
+  const statusBadge = card.querySelector('.status-badge');
+  
+  // Get last known message for this candidate
+  const lastMessage = lastKnownMessages[msg.exam_submission];
+  
+  // Check if either message or status has changed
+  const messageChanged = !lastMessage || lastMessage.message !== msg.message;
+  const statusChanged = !lastMessage || lastMessage.status !== msg.status;
+  
+  if (messageChanged || statusChanged) {
+    // Update the message
+    messageText.textContent = msg.message;
+    
+    // Update status
+    if (statusBadge) {
+      statusBadge.className = `badge status-badge status-${msg.status.toLowerCase()}`;
+      statusBadge.textContent = msg.status;
+    }
+    
+    // Remove existing animation class if present
+    card.classList.remove('has-new-message');
+    
+    // Trigger reflow to restart animation
+    void card.offsetWidth;
+    
+    // Add animation class
+    card.classList.add('has-new-message');
+    
+    // Remove animation class after animation completes
+    setTimeout(() => {
+      if (card.classList.contains('has-new-message')) {
+        card.classList.remove('has-new-message');
+      }
+    }, 2000);
+    
+    // Update cache
+    lastKnownMessages[msg.exam_submission] = {
+      message: msg.message,
+      status: msg.status,
+      timestamp: new Date()
+    };
+  }
+}
+
 function updateSidebarMessages() {
   frappe.call({
     method: "exampro.www.proctor.get_latest_messages",
@@ -659,50 +752,7 @@ function updateSidebarMessages() {
           return;
         }
 
-        // Process existing message cards
-        const messageText = card.querySelector('.message-text');
-        const statusBadge = card.querySelector('.status-badge');
-        
-        // Get last known message for this candidate
-        const lastMessage = lastKnownMessages[msg.exam_submission];
-        
-        // Check if either message or status has changed
-        const messageChanged = !lastMessage || lastMessage.message !== msg.message;
-        const statusChanged = !lastMessage || lastMessage.status !== msg.status;
-        
-        if (messageChanged || statusChanged) {
-          // Update the message
-          messageText.textContent = msg.message;
-          
-          // Update status
-          if (statusBadge) {
-            statusBadge.className = `badge status-badge status-${msg.status.toLowerCase()}`;
-            statusBadge.textContent = msg.status;
-          }
-          
-          // Remove existing animation class if present
-          card.classList.remove('has-new-message');
-          
-          // Trigger reflow to restart animation
-          void card.offsetWidth;
-          
-          // Add animation class
-          card.classList.add('has-new-message');
-          
-          // Remove animation class after animation completes
-          setTimeout(() => {
-            if (card.classList.contains('has-new-message')) {
-              card.classList.remove('has-new-message');
-            }
-          }, 2000);
-          
-          // Update cache
-          lastKnownMessages[msg.exam_submission] = {
-            message: msg.message,
-            status: msg.status,
-            timestamp: new Date()
-          };
-        }
+        refreshMessageCard(card, msg);
       });
       
       // Process submissions that have video tiles but no message cards
@@ -734,8 +784,9 @@ frappe.ready(() => {
   updateVideoList();
   updateSidebarMessages();
   
-  // Set up interval for regular updates
-  setInterval(function () {
+  // Set up interval for regular updates, slowed down while realtime
+  // pushes new videos and messages
+  pollWithFallback(function () {
     // Update existing videos
     updateVideoList();
     
@@ -747,18 +798,29 @@ frappe.ready(() => {
     
     // Setup dynamic observer for new content
     setupDynamicObservers();
-  }, 5000); // 5 seconds
+  }, 5000, 15000); // 5 seconds, 15 seconds with realtime
   
-  // frappe.realtime.on('newproctorvideo', (data) => {
-  //     videoStore[data.exam_submission].push(data.url);
-  // });
+  onRealtime('newproctorvideo', (data) => {
+    if (!(data.exam_submission in videoStore)) return;
+    mergeVideoChunks(data.exam_submission, { [data.ts]: data.url });
+  });
+
+  onRealtime('newproctormsg', (data) => {
+    if (data.exam_submission === activeChat) {
+      processProcMessage(data.exam_submission, data);
+    }
 
-  // frappe.realtime.on('newproctormsg', (data) => {
-  //     convertedTime = timeAgo(data.creation);
-  //     if (data.exam_submission === activeChat) {
-  //         addChatBubble(convertedTime, data.message, data.type_of_message)
-  //     }
-  // });
+    const card = document.querySelector(`.message-card[data-submission="${data.exam_submission}"]`);
+    if (card) {
+      const lastMessage = lastKnownMessages[data.exam_submission];
+      const statusBadge = card.querySelector('.status-badge');
+      refreshMessageCard(card, {
+        exam_submission: data.exam_submission,
+        message: data.message,
+        status: lastMessage ? lastMessage.status : (statusBadge ? statusBadge.textContent : "Started")
+      });
+    }
+  });
 
   // chatModal controls
   // Handle send button click event
@@ -823,6 +885,7 @@ frappe.ready(() => {
 
   $("#chatModal").on("hidden.bs.modal", function () {
     activeChat = "";
+    stopChatPolling();
   });
 
 
@@ -1087,6 +1150,7 @@ function fetchVideosForSubmission(exam_submission) {
     method: "exampro.exam_pro.doctype.exam_submission.exam_submission.proctor_video_list",
     args: {
       exam_submission: exam_submission,
+      since: videoCursors[exam_submission] || 0,
     },
     callback: (data) => {
       if (!data.message || !data.message.videos) {
@@ -1101,33 +1165,12 @@ function fetchVideosForSubmission(exam_submission) {
       if (!container) return;
       
       container.classList.remove("hidden");
-      
-      // Convert API response to an array of objects
-      let videoList = Object.entries(data.message.videos).map(
-        ([unixtimestamp, videourl]) => {
-          return { unixtimestamp: parseInt(unixtimestamp, 10), videourl };
-        },
-      );
-      
-      // Sort them
-      videoList.sort((a, b) => a.unixtimestamp - b.unixtimestamp);
 
-      videoStore[exam_submission] = videoList.map((video) => video.videourl);
-      
+      mergeVideoChunks(exam_submission, data.message.videos);
+      videoCursors[exam_submission] = data.message.last;
+
       // Check connection status
-      if (videoStore[exam_submission].length > 0) {
-        const lastVideoUrl = videoStore[exam_submission][videoStore[exam_submission].length - 1];
-        const disconnected = videoDisconnected(lastVideoUrl);
-        const offlineOverlay = document.getElementById(`offline-overlay-${exam_submission}`);
-        
-        if (disconnected && offlineOverlay) {
-          offlineOverlay.classList.add("show");
-          updateMessageCardStatus(exam_submission, "offline");
-        } else if (offlineOverlay) {
-          offlineOverlay.classList.remove("show");
-          updateMessageCardStatus(exam_submission, "started");
-        }
-      }
+      updateConnectionStatus(exam_submission);
       
       // Play the latest video
       if (videoStore[exam_submission] && videoStore[exam_submission].length > 0) {
@@ -1,13 +1,16 @@
 from datetime import datetime, timedelta
 import frappe
-from frappe.utils import now
+from frappe.utils import now_datetime
 
 from frappe import _
 from frappe.utils.data import markdown
-from exampro.exam_pro.api.utils import submit_candidate_pending_exams
 
+from exampro.exam_pro.api.candidate_exams import get_candidate_live_exam
+from exampro.exam_pro.api.schedulewindow import calculate_end_time, get_window_status, \
+	window_from_row
+from exampro.exam_pro.doctype.exam_settings.exam_settings import get_exam_settings
 from exampro.exam_pro.doctype.exam_submission.exam_submission import \
-	get_current_qs
+	get_current_qs, get_video_recording_settings
 
 # ACTIVE_EXAM_CODE_CACHE = "ACTIVEEXAMCODECACHE"
 
@@ -19,87 +22,46 @@ def get_live_exam(member=None):
 	Function returns only one live/upcoming exam details
 	even if multiple entries are there.
 	"""
-	exam_details = {}
-
-	submissions = frappe.get_all(
-		"Exam Submission",
-		{
-			"candidate": member or frappe.session.user,
-			"status": ["in", ["Registered", "Started"]]
-		},[
-			"name",
-			"exam_schedule",
-			"status",
-			"exam_started_time",
-			"exam_submitted_time",
-			"additional_time_given"
-	])
-	for submission in submissions:
-		schedule = frappe.get_doc("Exam Schedule", submission["exam_schedule"])
-		exam = frappe.get_doc("Exam", schedule.exam)
-
-		# end time is schedule start time + duration + additional time given
-		end_time = schedule.start_date_time + timedelta(minutes=schedule.duration) + \
-			timedelta(minutes=submission["additional_time_given"])
-		if schedule.schedule_type == "Flexible":
-			# For flexible schedules, we consider the end time as start time + duration + 5 min buffer
-			end_time += timedelta(days=schedule.schedule_expire_in_days)
-
-		exam_details = {
-			"exam_submission": submission["name"],
-			"exam": schedule.exam,
-			"exam_schedule": submission["exam_schedule"],
-			"start_time": schedule.start_date_time,
-			"end_time": "",
-			"additional_time_given": submission["additional_time_given"],
-			"submission_status": submission["status"],
-			"duration": schedule.duration,
-			"enable_calculator": exam.enable_calculator,
-			"is_live": False,
-			"enable_video_proctoring": exam.enable_video_proctoring,
-			"enable_chat": exam.enable_chat,
-			"schedule_status": schedule.get_status(),
-			"schedule_type": schedule.schedule_type,
-		}
-		if submission["status"] == "Started" and schedule.schedule_type == "Fixed":
-			exam_details["end_time"] = end_time
-		elif submission["status"] == "Started" and schedule.schedule_type == "Flexible":
-			# for flexible exams, exam started time + duration + additional time given
-			exam_details["end_time"] = submission["exam_started_time"] + \
-				timedelta(minutes=schedule.duration) + \
-				timedelta(minutes=submission["additional_time_given"])
-
-		# make datetime in isoformat
-		for key,val in exam_details.items():
-			if type(val) == datetime:
-				exam_details[key] = val.isoformat()
-
-		# checks if current time is between schedule start and end time
-		# ongoing exams can be in Not staryed, started or submitted states
-		tnow = datetime.strptime(now(), '%Y-%m-%d %H:%M:%S.%f')
-		if submission["status"] == "Started":
-			exam_details["is_live"] = True
-			return exam_details
-		elif schedule.start_date_time <= tnow <= end_time and submission["status"] in ["Registered", "Started"] and schedule.schedule_type == "Fixed":
-			exam_details["is_live"] = True
-			return exam_details
-		elif schedule.start_date_time <= tnow <= end_time and submission["status"] in ["Registered", "Started"] and schedule.schedule_type == "Flexible":
-			exam_details["is_live"] = True
-			return exam_details
-		if schedule.start_date_time <= tnow <= end_time and submission["status"] == "Submitted":
-			exam_details["is_live"] = False
-			return exam_details
-		elif tnow <= schedule.start_date_time:
-			exam_details["is_live"] = False
-			return exam_details
-		elif tnow > end_time:
-			# if time is over, submit if applicable
-			if submission["status"] != "Submitted":
-				doc = frappe.get_doc("Exam Submission", submission["name"])
-				doc.status == "Submitted"
-				doc.save(ignore_permissions=True)
-
-			return exam_details
+	row = get_candidate_live_exam(member or frappe.session.user)
+	if not row:
+		return {}
+
+	window = window_from_row(row)
+	tnow = now_datetime()
+	# end time is schedule end time + additional time given
+	end_time = window["end"] + timedelta(minutes=row["additional_time_given"] or 0)
+
+	exam_details = {
+		"exam_submission": row["name"],
+		"exam": row["exam"],
+		"exam_title": row["exam_title"],
+		"instructions": row["instructions"],
+		"exam_schedule": row["exam_schedule"],
+		"start_time": window["start"],
+		"end_time": "",
+		"additional_time_given": row["additional_time_given"],
+		"submission_status": row["status"],
+		"duration": window["duration"],
+		"enable_calculator": row["enable_calculator"],
+		"is_live": False,
+		"enable_video_proctoring": row["enable_video_proctoring"],
+		"enable_chat": row["enable_chat"],
+		"schedule_status": get_window_status(window, current_time=tnow),
+		"schedule_type": window["schedule_type"],
+	}
+	if row["status"] == "Started":
+		exam_details["end_time"] = calculate_end_time(
+			window, row["exam_started_time"], row["additional_time_given"]
+		)
+
+	# started exams, or registered ones whose window is open, are live
+	if row["status"] == "Started" or window["start"] <= tnow <= end_time:
+		exam_details["is_live"] = True
+
+	# make datetime in isoformat
+	for key,val in exam_details.items():
+		if type(val) == datetime:
+			exam_details[key] = val.isoformat()
 
 	return exam_details
 
@@ -111,7 +73,6 @@ def get_context(context):
 		frappe.local.flags.redirect_location = "/login"
 		raise frappe.Redirect
 
-	submit_candidate_pending_exams()
 	exam_details = get_live_exam(frappe.session.user)
 	context.page_context = {}
 
@@ -133,17 +94,18 @@ def get_context(context):
 	
 	elif exam_details["is_live"]:
 		context.alert = {}
-		exam = frappe.db.get_value(
-			"Exam", exam_details["exam"], ["name","title", "instructions"], as_dict=True
-		)
-		for key, value in exam_details.items():
-			exam[key] = value
+		exam = frappe._dict(exam_details)
+		exam["name"] = exam_details["exam"]
+		exam["title"] = exam_details["exam_title"]
 
-		instructions = markdown(exam["instructions"])
+		instructions = markdown(exam["instructions"] or "")
 		if instructions.strip() == "<p></p>" or instructions.strip() == "":
 			instructions = ""
 		exam["instructions"] = instructions if instructions else ""
 		exam["current_qs"] = 1
+		# webcam chunks go straight to the bucket if enabled
+		exam["direct_video_upload"] = get_exam_settings().direct_video_upload
+		exam["video_recording"] = get_video_recording_settings()
 		# return the last question requested in this exam, if applicable
 		if exam["submission_status"] == "Started":
 			_, current_qs_no = get_current_qs(exam_details["exam_submission"]) 
@@ -2,7 +2,6 @@ import frappe
 import base64
 from frappe import _
 
-from exampro.exam_pro.api.utils import submit_candidate_pending_exams
 
 def get_context(context):
     """
@@ -30,8 +29,6 @@ def get_context(context):
             user.save(ignore_permissions=True)
             frappe.db.commit()    
 
-    submit_candidate_pending_exams()
-    
     try:
         # Decode the base64 invite code
         schedule_name = base64.b64decode(invite_code).decode('utf-8')
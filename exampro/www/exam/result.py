@@ -4,7 +4,7 @@ import frappe
 from frappe import _
 
 from exampro.exam_pro.api.utils import (redirect_to_exams_list)
-from exampro.exam_pro.doctype.exam_schedule.exam_schedule import get_schedule_end_time
+from exampro.exam_pro.api.schedulewindow import get_schedule_end_time
 
 
 def get_context(context):
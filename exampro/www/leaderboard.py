@@ -4,6 +4,8 @@
 import frappe
 from frappe import _
 
+from exampro.exam_pro.api.leaderboard import get_leaderboard
+
 def get_context(context):
     """Context for the HTML page with submission-specific routing"""
     
@@ -78,13 +80,14 @@ def get_context(context):
         exam_name, 
         exam_doc.leaderboard, 
         exam_doc.leaderboard_rows or 10,
-        user_submission_doc.exam_schedule if exam_doc.leaderboard == "Schedule Level" else None
+        user_submission_doc.exam_schedule if exam_doc.leaderboard == "Schedule Level" else None,
+        submission=submission_id
     )
     context.leaderboard_data = leaderboard_data["data"]
     context.stats = leaderboard_data["stats"]
     
-    # Find user's rank
-    context.user_rank = find_user_rank(leaderboard_data["data"], frappe.session.user)
+    # User's rank, for any passed submission and not only the top rows
+    context.user_rank = leaderboard_data["user_rank"]
         
     # except Exception as e:
     #     frappe.log_error(f"Error loading leaderboard data: {str(e)}")
@@ -93,30 +96,20 @@ def get_context(context):
     
     return context
 
-def find_user_rank(leaderboard_data, user):
-    """Find the current user's rank in the leaderboard"""
-    for index, submission in enumerate(leaderboard_data, 1):
-        if submission.get("candidate") == user:
-            return index
-    return None
-
-def get_leaderboard_data_internal(exam, leaderboard_type, limit=10, schedule=None):
+def get_leaderboard_data_internal(exam, leaderboard_type, limit=10, schedule=None, submission=None):
     """Internal function to get leaderboard data"""
     
-    # Build filters based on leaderboard type
-    filters = {
-        "exam": exam,
-        "status": "Submitted",
-        "result_status": "Passed"
-    }
-    
+    # Pick the leaderboard based on leaderboard type
     if leaderboard_type == "Schedule Level" and schedule:
-        filters["exam_schedule"] = schedule
+        board = get_leaderboard("exam_schedule", schedule, limit, submission=submission)
+    else:
+        board = get_leaderboard("exam", exam, limit, submission=submission)
     
-    # Get submissions with candidate details
-    submissions = frappe.get_all(
+    # Get submissions with candidate details, in leaderboard order
+    top = [name for name, _ in board["top"]]
+    rows = frappe.get_all(
         "Exam Submission",
-        filters=filters,
+        filters={"name": ["in", top]},
         fields=[
             "name",
             "candidate",
@@ -126,55 +119,46 @@ def get_leaderboard_data_internal(exam, leaderboard_type, limit=10, schedule=Non
             "exam_started_time",
             "exam_submitted_time",
             "exam_schedule"
-        ],
-        order_by="total_marks desc, modified asc",
-        limit=int(limit)
-    )
+        ]
+    ) if top else []
+    rows = {row["name"]: row for row in rows}
+    submissions = [rows[name] for name in top if name in rows]
     
     # Get exam max marks for display
-    exam_doc = frappe.get_doc("Exam", exam)
-    max_marks = exam_doc.total_marks or 0
+    max_marks = frappe.get_cached_value("Exam", exam, "total_marks") or 0
     
     # Add max marks to each submission and calculate percentage
-    for submission in submissions:
-        submission["max_marks"] = max_marks
+    for submission_row in submissions:
+        submission_row["max_marks"] = max_marks
         
         # Calculate percentage from total_marks and max_marks
-        if submission.get("total_marks") and max_marks:
-            submission["percentage"] = (submission["total_marks"] / max_marks) * 100
+        if submission_row.get("total_marks") and max_marks:
+            submission_row["percentage"] = (submission_row["total_marks"] / max_marks) * 100
         else:
-            submission["percentage"] = 0.0
+            submission_row["percentage"] = 0.0
         
         # Calculate completion time as exam_submitted_time - exam_started_time
-        if submission.get("exam_submitted_time") and submission.get("exam_started_time"):
+        if submission_row.get("exam_submitted_time") and submission_row.get("exam_started_time"):
             time_diff = frappe.utils.time_diff_in_seconds(
-                submission["exam_submitted_time"],
-                submission["exam_started_time"]
+                submission_row["exam_submitted_time"],
+                submission_row["exam_started_time"]
             )
             minutes = int(time_diff // 60)
             seconds = int(time_diff % 60)
-            submission["completion_time"] = f"{minutes}m {seconds}s"
+            submission_row["completion_time"] = f"{minutes}m {seconds}s"
         else:
-            submission["completion_time"] = "N/A"
+            submission_row["completion_time"] = "N/A"
 
-    # Calculate statistics
-    stats = calculate_stats(filters, exam_doc.pass_percentage or 50)
     return {
         "data": submissions,
-        "stats": stats
+        "stats": calculate_stats(board, max_marks),
+        "user_rank": board["rank"]
     }
 
-def calculate_stats(filters, pass_percentage):
-    """Calculate leaderboard statistics"""
-    
-    # Get all submissions matching filters
-    all_submissions = frappe.get_all(
-        "Exam Submission",
-        filters=filters,
-        fields=["total_marks", "result_status"]
-    )
+def calculate_stats(board, max_marks):
+    """Calculate leaderboard statistics from the precomputed aggregates"""
     
-    if not all_submissions:
+    if not board["count"]:
         return {
             "total_participants": 0,
             "average_score": 0,
@@ -182,26 +166,15 @@ def calculate_stats(filters, pass_percentage):
             "pass_rate": 0
         }
     
-    # Get exam max marks for percentage calculation
-    exam = filters.get("exam")
-    max_marks = frappe.get_value("Exam", exam, "total_marks") or 1  # Avoid division by zero
-    
-    # Calculate statistics
-    total_participants = len(all_submissions)
-    
-    # Calculate percentages from total_marks
-    percentages = [(s.get("total_marks") or 0) / max_marks * 100 for s in all_submissions]
-    
-    average_score = sum(percentages) / total_participants if total_participants > 0 else 0
-    highest_score = max(percentages) if percentages else 0
-    
-    # Calculate pass rate
-    passed_count = len([s for s in all_submissions if s.get("result_status") == "Passed"])
-    pass_rate = (passed_count / total_participants * 100) if total_participants > 0 else 0
+    max_marks = max_marks or 1  # Avoid division by zero
+    total_participants = board["count"]
+    average_score = board["total_marks"] / total_participants / max_marks * 100
+    highest_score = board["top"][0][1] / max_marks * 100 if board["top"] else 0
     
+    # leaderboard has only passed submissions
     return {
         "total_participants": total_participants,
         "average_score": average_score,
         "highest_score": highest_score,
-        "pass_rate": pass_rate
-    }
\ No newline at end of file
+        "pass_rate": 100
+    }
@@ -1,9 +1,27 @@
-from datetime import datetime, timedelta
 from frappe.utils import now
 
 import frappe
 from frappe import _
 
+# proctor feed cache
+# > PROCTOR_FEED:<proctor> holds the sidebar feed for a couple of seconds so
+#   many open tabs and quick refreshes share one query
+PROCTOR_FEED_CACHE = "proctor_feed"
+PROCTOR_FEED_TTL = 2
+
+# submissions whose exam window is open right now,
+# ie. schedule start time <= now <= start time + duration + additional time given
+LIVE_SUBMISSION_CONDITION = """
+	sub.assigned_proctor = %(proctor)s
+	AND sub.status NOT IN ('Registration Cancelled', 'Aborted')
+	AND sch.start_date_time <= %(now)s
+	AND DATE_ADD(
+		sch.start_date_time,
+		INTERVAL (IFNULL(sch.duration, 0) + IFNULL(sub.additional_time_given, 0)) MINUTE
+	) >= %(now)s
+"""
+
+
 def get_proctor_live_exams(proctor=None, skip_submitted=False):
 	"""
 	Get upcoming/ongoing exam of a proctor.
@@ -14,65 +32,67 @@ def get_proctor_live_exams(proctor=None, skip_submitted=False):
 	"""
 	res = {"live_submissions":[], "pending_candidates": []}
 
-	submissions = frappe.get_all(
-		"Exam Submission",
-		{"assigned_proctor": proctor or frappe.session.user},[
-			"name",
-			"candidate_name",
-			"exam_schedule",
-			"status",
-			"exam_started_time",
-			"exam_submitted_time",
-			"additional_time_given"
-	])
+	submissions = frappe.db.sql("""
+		SELECT sub.name, sub.candidate_name, sub.status
+		FROM `tabExam Submission` sub
+		INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+		WHERE {condition}
+		ORDER BY sub.creation
+	""".format(condition=LIVE_SUBMISSION_CONDITION), {
+		"proctor": proctor or frappe.session.user,
+		"now": now()
+	}, as_dict=True)
+
 	for submission in submissions:
-		if submission["status"] in ["Registration Cancelled", "Aborted"]:
-			continue
 		if skip_submitted and submission["status"] == "Submitted":
 			continue
 
-		sched = frappe.get_doc("Exam Schedule", submission["exam_schedule"])
-		if sched.get_status(additional_time=submission["additional_time_given"]) == "Completed":
-			continue
-
-		# end time is schedule start time + duration + additional time given
-		end_time = sched.start_date_time + timedelta(minutes=sched.duration) + \
-			timedelta(minutes=submission["additional_time_given"])
-
-		# checks if current time is between schedule start and end time
 		# ongoing exams can be in Not staryed, started or submitted states
-		tnow = datetime.strptime(now(), '%Y-%m-%d %H:%M:%S.%f')
-		if sched.start_date_time <= tnow <= end_time:
-			userdata = {
-				"name": submission["name"],
-				"candidate_name": submission["candidate_name"],
-				"status": submission["status"]
-			}
-			if submission["status"] == "Started":
-				# if tracker exists, candidate started the exam
-				res["live_submissions"].append(userdata)
-			else:
-				res["pending_candidates"].append(userdata)
+		userdata = {
+			"name": submission["name"],
+			"candidate_name": submission["candidate_name"],
+			"status": submission["status"]
+		}
+		if submission["status"] == "Started":
+			# if tracker exists, candidate started the exam
+			res["live_submissions"].append(userdata)
+		else:
+			res["pending_candidates"].append(userdata)
 
 	return res
 
+def get_proctor_feed(proctor):
+	"""
+	Live submissions of a proctor with the latest message of each, in one query.
+	"""
+	return frappe.db.sql("""
+		SELECT sub.name AS exam_submission, sub.candidate_name, sub.status, msg.message
+		FROM `tabExam Submission` sub
+		INNER JOIN `tabExam Schedule` sch ON sch.name = sub.exam_schedule
+		LEFT JOIN `tabExam Messages` msg ON msg.name = (
+			SELECT latest.name FROM `tabExam Messages` latest
+			WHERE latest.exam_submission = sub.name
+			ORDER BY latest.creation DESC
+			LIMIT 1
+		)
+		WHERE {condition} AND sub.status = 'Started'
+		ORDER BY sub.creation
+	""".format(condition=LIVE_SUBMISSION_CONDITION), {
+		"proctor": proctor,
+		"now": now()
+	}, as_dict=True)
+
 @frappe.whitelist()
 def get_latest_messages(proctor=None):
 	"""Get latest messages from all candidates being proctored by the current proctor"""
-	result = []
-	sub = get_proctor_live_exams(proctor)["live_submissions"]
-	if not sub:
+	proctor = proctor or frappe.session.user
+	cache_key = "{}:{}".format(PROCTOR_FEED_CACHE, proctor)
+	result = frappe.cache().get_value(cache_key)
+	if result is not None:
 		return result
-	
-	for submission in sub:
-		latest_msg = frappe.get_all(
-			"Exam Messages",
-			filters={"exam_submission": submission["name"]},
-			fields=["message", "creation", "from"],
-			order_by="creation desc",
-			limit=1
-		)
 
+	result = []
+	for submission in get_proctor_feed(proctor):
 		msg_text = "Exam not started"
 		if submission["status"] == "Started":
 			msg_text = "Exam started"
@@ -80,16 +100,18 @@ def get_latest_messages(proctor=None):
 			msg_text = "Exam terminated"
 		elif submission["status"] == "Submitted":
 			msg_text = "Exam submitted. Schedule ongoing."
-		if latest_msg:
-			msg_text = latest_msg[0].message
+		if submission["message"]:
+			msg_text = submission["message"]
 
 		result.append({
-			"exam_submission": submission["name"],
+			"exam_submission": submission["exam_submission"],
 			"candidate_name": submission["candidate_name"],
 			"message": msg_text,
 			"status": submission["status"]
 		})
 
+	frappe.cache().set_value(cache_key, result, expires_in_sec=PROCTOR_FEED_TTL)
+
 	return result
 
 def get_context(context):